@@ -16,6 +16,20 @@ import srctools.logger
 
 LOGGER = srctools.logger.get_logger(__name__)
 
+# Values for GEN_OPTS which are set if not present.
+DEFAULT_SETTINGS = {
+    'Directories': {
+        'package': 'packages/',
+    },
+    'General': {
+        # A token used to indicate the time the current cache/ was extracted.
+        # This tells us whether to copy it to the game folder.
+        'cache_time': '0',
+        # We need this value to detect just removing a package.
+        'cache_pack_count': '0',
+    },
+}
+
 
 def get_package_locs() -> Iterator[Path]:
     """Return all the package search locations from the config."""
@@ -29,7 +29,7 @@ if __name__ == '__main__':
 
     if len(sys.argv) > 1:
         log_name = app_name = sys.argv[1].lower()
-        if app_name not in ('backup', 'compilepane'):
+        if app_name not in ('backup', 'compilepane', 'export'):
             log_name = 'bee2'
     else:
         log_name = app_name = 'bee2'
@@ -69,6 +69,9 @@ if __name__ == '__main__':
         from app import CompilerPane
         CompilerPane.init_application()
         TK_ROOT.mainloop()
+    elif app_name == 'export':
+        from app import export_cli
+        sys.exit(export_cli.main(sys.argv[2:]))
     elif app_name.startswith('test_'):
         from app import BEE2
         import importlib
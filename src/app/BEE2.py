@@ -8,7 +8,7 @@ from outcome import Outcome, Error
 from srctools import Property
 import trio
 
-from BEE2_config import GEN_OPTS
+from BEE2_config import GEN_OPTS, DEFAULT_SETTINGS
 from app import (
     TK_ROOT, sound, img, gameMan, music_conf,
     UI, logWindow,
@@ -26,19 +26,6 @@ import srctools.logger
 LOGGER = srctools.logger.get_logger('BEE2')
 APP_NURSERY: trio.Nursery
 
-DEFAULT_SETTINGS = {
-    'Directories': {
-        'package': 'packages/',
-    },
-    'General': {
-        # A token used to indicate the time the current cache/ was extracted.
-        # This tells us whether to copy it to the game folder.
-        'cache_time': '0',
-        # We need this value to detect just removing a package.
-        'cache_pack_count': '0',
-    },
-}
-
 
 async def init_app() -> None:
     """Initialise the application."""
@@ -48,6 +48,8 @@ COMPILE_DEFAULTS: dict[str, dict[str, str]] = {
         'packfile_dump_dir': '',
         'packfile_dump_enable': '0',
         'packfile_auto_enable': '1',
+        'compile_cache_size': '8',
+        'compile_metrics_history': '0',
     },
     'Counts': {
         'brush': '0',
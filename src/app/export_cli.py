@@ -0,0 +1,478 @@
+"""Export into games from the command line, without showing the UI.
+
+This loads packages, applies the selections from the config, a palette and
+other options, then exports to one or more games. Progress is printed to
+stdout. Run with ``BEE2 export --help`` for the options.
+
+Exit codes:
+    0: All games were exported successfully.
+    1: At least one export failed.
+    2: The arguments were invalid.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from contextlib import ExitStack
+from pathlib import Path
+import argparse
+import functools
+import itertools
+
+from srctools import Property, KeyValError
+import srctools.logger
+import trio
+
+from BEE2_config import ConfigFile, GEN_OPTS, DEFAULT_SETTINGS
+from app import backup, gameMan, img
+from app.StyleVarPane import styleOptions
+from config.gen_opts import GenOptions
+from config.last_sel import LastSelected
+from config.signage import Layout
+from config.stylevar import State as StyleVarState
+from consts import MusicChannel
+import app
+import BEE2_config
+import config
+import loadScreen
+import packages
+import utils
+
+
+LOGGER = srctools.logger.get_logger(__name__)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BAD_ARGS = 2
+
+# Percentage between each progress message.
+PROGRESS_INTERVAL = 10
+
+# The save ID used for the selector windows, the default if not set, and whether
+# <NONE> is allowed. This matches the windows in UI and music_conf.
+SELECTOR_CONF: Dict[Type[packages.PakObject], Tuple[str, str, bool]] = {
+    packages.Skybox: ('skyboxes', 'BEE2_CLEAN', False),
+    packages.QuotePack: ('voicelines', 'BEE2_GLADOS_CLEAN', True),
+    packages.Elevator: ('elevators', '<NONE>', True),
+}
+MUSIC_CONF: Dict[MusicChannel, Tuple[str, str]] = {
+    MusicChannel.BASE: ('music_base', 'VALVE_PETI'),
+    MusicChannel.TBEAM: ('music_tbeam', '<NONE>'),
+    MusicChannel.BOUNCE: ('music_bounce', '<NONE>'),
+    MusicChannel.SPEED: ('music_speed', '<NONE>'),
+}
+
+
+class ConsoleScreen(loadScreen.LoadScreen):
+    """A loading screen which prints progress to stdout, instead of showing a window."""
+    def __init__(
+        self,
+        *stages: Tuple[str, str],
+        title_text: str,
+        prefix: str = '',
+    ) -> None:
+        self.prefix = prefix
+        self.titles = {st_id: title or st_id for st_id, title in stages}
+        self.lengths: Dict[str, int] = {}
+        self.progress: Dict[str, int] = {}
+        super().__init__(*stages, title_text=title_text)
+
+    def _print(self, message: str) -> None:
+        """Print a message with our prefix."""
+        if self.prefix:
+            print(f'[{self.prefix}] {message}', flush=True)
+        else:
+            print(message, flush=True)
+
+    def _send_msg(self, command: str, *args: Any) -> None:
+        """Instead of sending to the daemon, print the progress."""
+        if command == 'set_length':
+            stage, num = args
+            self.lengths[stage] = num
+            self.progress[stage] = 0
+        elif command == 'step':
+            [stage] = args
+            length = self.lengths.get(stage, 0)
+            old = self.progress.get(stage, 0)
+            self.progress[stage] = cur = old + 1
+            if length <= 0 or cur > length:
+                return
+            if cur == length or (
+                cur * 100 // length // PROGRESS_INTERVAL
+                != old * 100 // length // PROGRESS_INTERVAL
+            ):
+                self._print(f'{self.titles[stage]}: {cur}/{length} ({cur * 100 // length}%)')
+        elif command == 'skip_stage':
+            [stage] = args
+            self._print(f'{self.titles[stage]}: skipped')
+        elif command == 'reset':
+            self.lengths.clear()
+            self.progress.clear()
+
+
+def make_export_screen(game: gameMan.Game) -> ConsoleScreen:
+    """Create a screen with the same stages as gameMan.export_screen."""
+    return ConsoleScreen(
+        ('BACK', 'Backup Original Files'),
+        (backup.AUTO_BACKUP_STAGE, 'Backup Puzzles'),
+        ('EXP', 'Export Configuration'),
+        ('COMP', 'Copy Compiler'),
+        ('RES', 'Copy Resources'),
+        ('MUS', 'Copy Music'),
+        title_text='Exporting',
+        prefix=game.name,
+    )
+
+
+def parse_palette(path: Path) -> Tuple[List[Tuple[str, int]], Optional[config.Config]]:
+    """Read the item positions and settings from a palette file.
+
+    Unlike paletteLoader.Palette.parse(), this never resaves the file into
+    the palettes folder.
+    """
+    with path.open(encoding='utf8') as f:
+        props = Property.parse(f, str(path))
+    items = [
+        (item.real_name, int(item.value))
+        for item in props.find_children('Items')
+    ]
+    try:
+        settings_conf = props.find_key('Settings')
+    except LookupError:
+        return items, None
+    settings, _ = config.APP.parse_kv1(settings_conf)
+    return items, settings
+
+
+def selected_id(
+    packset: packages.PackagesSet,
+    obj_type: Type[packages.PakObject],
+    save_id: str,
+    default_id: str,
+    has_none: bool,
+) -> Optional[str]:
+    """Determine the selected object, the same way as the selector window does."""
+    state = config.APP.get_cur_conf(LastSelected, save_id, LastSelected(default_id))
+    if state.id is None or state.id.casefold() == '<none>':
+        if has_none:
+            return None
+        state = LastSelected(default_id)
+    try:
+        return packset.obj_by_id(obj_type, state.id).id
+    except KeyError:
+        LOGGER.warning('Unknown {} "{}"!', obj_type.__name__, state.id)
+    if has_none:
+        return None
+    return packset.obj_by_id(obj_type, default_id).id
+
+
+def music_selection(
+    packset: packages.PackagesSet,
+) -> Dict[MusicChannel, Optional[packages.Music]]:
+    """Determine the music to export, matching music_conf.export_data()."""
+    collapsed = config.APP.get_cur_conf(GenOptions).music_collapsed
+    base_id = selected_id(packset, packages.Music, *MUSIC_CONF[MusicChannel.BASE], True)
+    base_track = packset.obj_by_id(packages.Music, base_id) if base_id is not None else None
+    data: Dict[MusicChannel, Optional[packages.Music]] = {MusicChannel.BASE: base_track}
+    for channel, (save_id, default_id) in MUSIC_CONF.items():
+        if channel is MusicChannel.BASE:
+            continue
+        if collapsed:
+            mus_id = base_track.get_suggestion(channel) if base_track is not None else None
+        else:
+            mus_id = selected_id(packset, packages.Music, save_id, default_id, True)
+        data[channel] = packset.obj_by_id(packages.Music, mus_id) if mus_id is not None else None
+    return data
+
+
+def build_selected(
+    packset: packages.PackagesSet,
+    style: packages.Style,
+    palette: List[Tuple[str, int]],
+    item_opts: ConfigFile,
+) -> Dict[Type[packages.PakObject], Any]:
+    """Build the selected objects for export, matching UI.export_editoritems().
+
+    This needs to be called for each game, since some exports modify the values.
+    """
+    item_versions = {}
+    for item in packset.all_obj(packages.Item):
+        ver_id = item_opts.get_val(item.id, 'sel_version', item.def_ver.id)
+        if ver_id not in item.versions:
+            LOGGER.warning('Version ID {} is not valid for item {}', ver_id, item.id)
+            ver_id = item.def_ver.id
+        item_versions[item.id] = ver_id
+
+    item_properties = {
+        it_id: {
+            key[5:]: value
+            for key, value in section.items()
+            if key.startswith('prop_')
+        }
+        for it_id, section in item_opts.items()
+    }
+
+    stylevars = {}
+    for var in itertools.chain(packset.all_obj(packages.StyleVar), styleOptions):
+        if var.applies_to_style(style):
+            default = StyleVarState(var.default)
+            stylevars[var.id] = config.APP.get_cur_conf(StyleVarState, var.id, default).value
+
+    signs = config.APP.get_cur_conf(Layout, default=Layout()).signs
+
+    selected: Dict[Type[packages.PakObject], Any] = {
+        obj_type: selected_id(packset, obj_type, *conf)
+        for obj_type, conf in SELECTOR_CONF.items()
+    }
+    selected[packages.Music] = music_selection(packset)
+    selected[packages.Item] = (palette, item_versions, item_properties)
+    selected[packages.StyleVar] = stylevars
+    selected[packages.Signage] = [
+        (str(ind), sign_id)
+        for ind, sign_id in signs.items()
+        if sign_id
+    ]
+    return selected
+
+
+async def load_packages(packset: packages.PackagesSet) -> bool:
+    """Load all packages, and wait for every object type to be parsed.
+
+    If required packages are missing, this prints the error and returns False.
+    """
+    loader = ConsoleScreen(
+        ('PAK', 'Packages'),
+        ('OBJ', 'Loading Objects'),
+        title_text='Loading',
+    )
+    async with trio.open_nursery() as nursery:
+        app._APP_NURSERY = nursery
+        try:
+            await packages.load_packages(
+                packset,
+                list(BEE2_config.get_package_locs()),
+                loader=loader,
+                has_mel_music=gameMan.MUSIC_MEL_VPK is not None,
+                has_tag_music=gameMan.MUSIC_TAG_LOC is not None,
+                interactive=False,
+            )
+        except packages.NoPackagesError as exc:
+            print(exc, flush=True)
+            success = False
+        else:
+            for obj_type in packages.OBJ_TYPES.values():
+                await packset.ready(obj_type).wait()
+            success = True
+        # Stop anything else started in the background.
+        nursery.cancel_scope.cancel()
+    app._APP_NURSERY = None
+    return success
+
+
+def export_game(
+    game: gameMan.Game,
+    style: packages.Style,
+    selected: Dict[Type[packages.PakObject], Any],
+    should_refresh: bool,
+) -> bool:
+    """Export to a single game. This is run in a thread."""
+    print(f'[{game.name}] Exporting "{style.id}"...', flush=True)
+    try:
+        success, vpk_success = game.export(
+            style, selected,
+            should_refresh=should_refresh,
+            screen=make_export_screen(game),
+            interactive=False,
+        )
+    except Exception:
+        LOGGER.exception('Exporting to "{}" failed:', game.name)
+        success = vpk_success = False
+    if not success:
+        print(f'[{game.name}] Export failed, see the log for details.', flush=True)
+    elif not vpk_success:
+        print(
+            f'[{game.name}] Warning: VPK files were not exported, quit Portal 2 '
+            'and Hammer to ensure editor wall previews are changed.',
+            flush=True,
+        )
+    else:
+        print(f'[{game.name}] Export complete.', flush=True)
+    return success
+
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='BEE2 export',
+        description='Export items and a style into games, without the UI.',
+    )
+    parser.add_argument(
+        '-g', '--game', action='append', default=[], dest='games', metavar='NAME',
+        help='The name of a game to export to. Can be repeated. '
+             'Defaults to the last selected game.',
+    )
+    parser.add_argument(
+        '-a', '--all-games', action='store_true',
+        help='Export to all configured games.',
+    )
+    parser.add_argument(
+        '-p', '--palette', type=Path,
+        help='A palette file to use for the item positions. Any settings '
+             'stored in the palette are also applied.',
+    )
+    parser.add_argument(
+        '-s', '--style',
+        help='The ID of the style to export, instead of the last selected one.',
+    )
+    parser.add_argument(
+        '-c', '--config', type=Path,
+        help='A config file in the same format as config/config.vdf, used '
+             'to override the saved settings.',
+    )
+    refresh = parser.add_mutually_exclusive_group()
+    refresh.add_argument(
+        '--refresh', action='store_true', default=None,
+        help='Copy resources into the game, even if preserving them is enabled.',
+    )
+    refresh.add_argument(
+        '--no-refresh', action='store_false', dest='refresh',
+        help='Do not copy resources into the game.',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='The number of games to export to at once.',
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1!')
+    if args.all_games and args.games:
+        parser.error('--game cannot be used with --all-games!')
+    return args
+
+
+def find_games(args: argparse.Namespace) -> List[gameMan.Game]:
+    """Find the games to export to.
+
+    If a name is not found, a KeyError is raised.
+    """
+    if args.all_games:
+        return list(gameMan.all_games)
+    if not args.games:
+        assert gameMan.selected_game is not None
+        return [gameMan.selected_game]
+    by_name = {game.name.casefold(): game for game in gameMan.all_games}
+    return [by_name[name.casefold()] for name in args.games]
+
+
+async def export_main(args: argparse.Namespace) -> int:
+    """Load packages and perform the export."""
+    GEN_OPTS.load()
+    GEN_OPTS.set_defaults(DEFAULT_SETTINGS)
+    config.APP.read_file()
+    if args.config is not None:
+        try:
+            with args.config.open(encoding='utf8') as f:
+                conf, _ = config.APP.parse_kv1(Property.parse(f, str(args.config)))
+        except (OSError, KeyValError, ValueError) as exc:
+            print(f'Could not read config "{args.config}": {exc}')
+            return EXIT_BAD_ARGS
+        config.APP.merge_conf(conf)
+
+    palette: List[Tuple[str, int]] = []
+    if args.palette is not None:
+        try:
+            palette, pal_settings = parse_palette(args.palette)
+        except (OSError, KeyValError, ValueError) as exc:
+            print(f'Could not read palette "{args.palette}": {exc}')
+            return EXIT_BAD_ARGS
+        if pal_settings is not None:
+            config.APP.merge_conf(pal_settings)
+    if args.style is not None:
+        config.APP.store_conf(LastSelected(args.style), 'styles')
+
+    try:
+        gen_conf = config.APP.get_cur_conf(GenOptions)
+    except KeyError:
+        gen_conf = GenOptions()
+        config.APP.store_conf(gen_conf)
+    utils.DEV_MODE = gen_conf.dev_mode
+
+    if not any(section != 'DEFAULT' for section in gameMan.CONFIG):
+        print('No games are configured, add one using the BEE2 first.')
+        return EXIT_BAD_ARGS
+    gameMan.load()
+    try:
+        last_game = config.APP.get_cur_conf(LastSelected, 'game')
+    except KeyError:
+        pass
+    else:
+        gameMan.set_game_by_name(last_game.id)
+
+    try:
+        games = find_games(args)
+    except KeyError as exc:
+        print(f'Unknown game "{exc.args[0]}"! Valid games:')
+        for game in gameMan.all_games:
+            print(f' - {game.name}')
+        return EXIT_BAD_ARGS
+
+    gameMan.scan_music_locs()
+    packset = packages.LOADED
+    if not await load_packages(packset):
+        return EXIT_FAILED
+    img.load_filesystems(packages.PACKAGE_SYS)
+    gameMan.load_filesystems(packages.PACKAGE_SYS.values())
+
+    style_id = config.APP.get_cur_conf(LastSelected, 'styles', LastSelected('BEE2_CLEAN')).id
+    try:
+        style = packset.obj_by_id(packages.Style, style_id or 'BEE2_CLEAN')
+    except KeyError:
+        print(f'Unknown style "{style_id}"!')
+        return EXIT_BAD_ARGS
+
+    if args.palette is not None:
+        known_items = {item.id.casefold() for item in packset.all_obj(packages.Item)}
+        for item_id, _ in palette:
+            if item_id.casefold() not in known_items:
+                LOGGER.warning('Unknown item "{}" in palette!', item_id)
+    else:
+        print('No palette provided, the palette will be empty.')
+
+    should_refresh = not gen_conf.preserve_resources if args.refresh is None else args.refresh
+    item_opts = ConfigFile('item_configs.cfg')
+    results: Dict[str, bool] = {}
+    limiter = trio.CapacityLimiter(args.jobs)
+
+    async def run(game: gameMan.Game) -> None:
+        """Export to this game in a background thread."""
+        results[game.name] = await trio.to_thread.run_sync(
+            export_game,
+            game, style,
+            build_selected(packset, style, palette, item_opts),
+            should_refresh,
+            limiter=limiter,
+        )
+
+    # Keep the package filesystems open during the exports, so concurrent
+    # exports don't close files being used by another.
+    with ExitStack() as stack:
+        for fsys in packages.PACKAGE_SYS.values():
+            stack.enter_context(fsys)
+        async with trio.open_nursery() as nursery:
+            for game in games:
+                nursery.start_soon(run, game)
+
+    failed = [name for name, success in results.items() if not success]
+    if failed:
+        print(f'Export failed for: {", ".join(failed)}')
+        return EXIT_FAILED
+    print(f'Exported to {len(results)} game(s).')
+    return EXIT_OK
+
+
+def main(argv: Sequence[str]) -> int:
+    """Run the export from the command line, returning the exit code."""
+    args = parse_args(argv)
+    LOGGER.info('Exporting with arguments: {}', args)
+    try:
+        return trio.run(functools.partial(export_main, args))
+    finally:
+        loadScreen.shutdown()
@@ -22,6 +22,7 @@ import io
 import pickle
 import pickletools
 import copy
+import threading
 import webbrowser
 from atomicwrites import atomic_write
 
@@ -35,7 +36,7 @@ import srctools.logger
 import srctools.fgd
 
 from BEE2_config import ConfigFile
-from app import backup, tk_tools, resource_gen, TK_ROOT, DEV_MODE, background_run
+from app import backup, tk_tools, resource_gen, TK_ROOT, background_run
 from config.gen_opts import GenOptions
 from localisation import gettext
 import loadScreen
@@ -59,6 +60,9 @@ EVENT_BUS = event.EventBus()
 TRANS_DATA: dict[str, str] = {}
 
 CONFIG = ConfigFile('games.cfg')
+# Games may be exported concurrently from the command line, so updating the
+# config needs to be done one at a time.
+_CONFIG_LOCK = threading.Lock()
 
 FILES_TO_BACKUP = [
     ('Editoritems', 'portal2_dlc2/scripts/editoritems', '.txt'),
@@ -525,13 +529,13 @@ class Game:
             packages.LOADED.packages.items()
         )
 
-    def refresh_cache(self, already_copied: set[str]) -> None:
+    def refresh_cache(self, already_copied: set[str], screen: loadScreen.LoadScreen) -> None:
         """Copy over the resource files into this game.
 
         already_copied is passed from copy_mod_music(), to
         indicate which files should remain. It is the full path to the files.
         """
-        screen_func = export_screen.step
+        screen_func = screen.step
 
         with res_system:
             for file in res_system.walk_folder_repeat():
@@ -583,8 +587,9 @@ class Game:
         self.mod_times.clear()
         for pack_id, pack in packages.LOADED.packages.items():
             self.mod_times[pack_id.casefold()] = pack.get_modtime()
-        self.save()
-        CONFIG.save_check()
+        with _CONFIG_LOCK:
+            self.save()
+            CONFIG.save_check()
 
     def clear_cache(self) -> None:
         """Remove all resources from the game."""
@@ -604,6 +609,8 @@ class Game:
         style: packages.Style,
         selected_objects: dict[Type[packages.PakObject], Any],
         should_refresh=False,
+        screen: Optional[loadScreen.LoadScreen] = None,
+        interactive: bool = True,
     ) -> tuple[bool, bool]:
         """Generate the editoritems.txt and vbsp_config.
 
@@ -611,7 +618,13 @@ class Game:
         - For each object type, run its .export() function with the given
         - item.
         - Styles are a special case.
+
+        Progress is shown on the screen, defaulting to export_screen. If
+        interactive is false, errors are only logged instead of showing a
+        messagebox. This allows exporting without the UI, from another thread.
         """
+        if screen is None:
+            screen = export_screen
 
         LOGGER.info('-' * 20)
         LOGGER.info('Exporting Items and Style for "{}"!', self.name)
@@ -624,7 +637,7 @@ class Game:
             LOGGER.info('{} = {}', obj_type, selected)
 
         # VBSP, VRAD, editoritems
-        export_screen.set_length('BACK', len(FILES_TO_BACKUP))
+        screen.set_length('BACK', len(FILES_TO_BACKUP))
         # files in compiler/
         try:
             num_compiler_files = sum(1 for file in utils.install_path('compiler').rglob('*'))
@@ -637,9 +650,9 @@ class Game:
 
         if num_compiler_files == 0:
             LOGGER.warning('No compiler files!')
-            export_screen.skip_stage('COMP')
+            screen.skip_stage('COMP')
         else:
-            export_screen.set_length('COMP', num_compiler_files)
+            screen.set_length('COMP', num_compiler_files)
 
         LOGGER.info('Should refresh: {}', should_refresh)
         if should_refresh:
@@ -659,22 +672,22 @@ class Game:
         # FGD file
         # Gameinfo
         # Misc resources
-        export_screen.set_length('EXP', len(packages.OBJ_TYPES) + 8)
+        screen.set_length('EXP', len(packages.OBJ_TYPES) + 8)
 
         # Do this before setting music and resources,
         # those can take time to compute.
-        export_screen.show()
+        screen.show()
         try:
 
             if should_refresh:
                 # Count the files.
-                export_screen.set_length(
+                screen.set_length(
                     'RES',
                     sum(1 for _ in res_system.walk_folder_repeat()),
                 )
             else:
-                export_screen.skip_stage('RES')
-                export_screen.skip_stage('MUS')
+                screen.skip_stage('RES')
+                screen.skip_stage('MUS')
 
             # Make the folders we need to copy files to, if desired.
             os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
@@ -687,7 +700,7 @@ class Game:
             renderables = style.renderables.copy()
             resources: dict[str, bytes] = {}
 
-            export_screen.step('EXP', 'style-conf')
+            screen.step('EXP', 'style-conf')
 
             vpk_success = True
 
@@ -713,13 +726,16 @@ class Game:
                     # Raised by StyleVPK to indicate it failed to copy.
                     vpk_success = False
 
-                export_screen.step('EXP', obj_type.__name__)
+                screen.step('EXP', obj_type.__name__)
 
             packages.template_brush.write_templates(self)
-            export_screen.step('EXP', 'template_brush')
+            screen.step('EXP', 'template_brush')
 
             vbsp_config.set_key(('Options', 'Game_ID'), self.steamID)
-            vbsp_config.set_key(('Options', 'dev_mode'), srctools.bool_as_int(DEV_MODE.get()))
+            vbsp_config.set_key(
+                ('Options', 'dev_mode'),
+                srctools.bool_as_int(config.APP.get_cur_conf(GenOptions).dev_mode),
+            )
 
             # If there are multiple of these blocks, merge them together.
             # They will end up in this order.
@@ -768,8 +784,9 @@ class Game:
                         except FileNotFoundError:
                             pass
 
-                        export_screen.reset()
-                        if messagebox.askokcancel(
+                        screen.reset()
+                        LOGGER.error('Compiler file {} missing, verify the game cache!', file + ext)
+                        if interactive and messagebox.askokcancel(
                             title=gettext('BEE2 - Export Failed!'),
                             message=gettext(
                                 'Compiler file {file} missing. '
@@ -787,10 +804,10 @@ class Game:
                 if should_backup:
                     LOGGER.info('Backing up original {}!', name)
                     shutil.copy(item_path, backup_path)
-                export_screen.step('BACK', name)
+                screen.step('BACK', name)
 
             # Backup puzzles, if desired
-            backup.auto_backup(selected_game, export_screen)
+            backup.auto_backup(self, screen)
 
             # Special-case: implement the UnlockDefault stlylevar here,
             # so all items are modified.
@@ -808,32 +825,32 @@ class Game:
 
             LOGGER.info('Editing Gameinfo...')
             self.edit_gameinfo(True)
-            export_screen.step('EXP', 'gameinfo')
+            screen.step('EXP', 'gameinfo')
 
             if not config.APP.get_cur_conf(GenOptions).preserve_resources:
                 LOGGER.info('Adding ents to FGD.')
                 self.edit_fgd(True)
-            export_screen.step('EXP', 'fgd')
+            screen.step('EXP', 'fgd')
 
             # atomicwrites writes to a temporary file, then renames in one step.
             # This ensures editoritems won't be half-written.
             LOGGER.info('Writing Editoritems script...')
             with atomic_write(self.abs_path('portal2_dlc2/scripts/editoritems.txt'), overwrite=True, encoding='utf8') as editor_file:
                 editoritems.Item.export(editor_file, all_items, renderables, id_filenames=False)
-            export_screen.step('EXP', 'editoritems')
+            screen.step('EXP', 'editoritems')
 
             LOGGER.info('Writing Editoritems database...')
             with open(self.abs_path('bin/bee2/editor.bin'), 'wb') as inst_file:
                 pick = pickletools.optimize(pickle.dumps(all_items))
                 inst_file.write(pick)
-            export_screen.step('EXP', 'editoritems_db')
+            screen.step('EXP', 'editoritems_db')
 
             LOGGER.info('Writing VBSP Config!')
             os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
             with open(self.abs_path('bin/bee2/vbsp_config.cfg'), 'w', encoding='utf8') as vbsp_file:
                 for line in vbsp_config.export():
                     vbsp_file.write(line)
-            export_screen.step('EXP', 'vbsp_config')
+            screen.step('EXP', 'vbsp_config')
 
             if num_compiler_files > 0:
                 LOGGER.info('Copying Custom Compiler!')
@@ -861,34 +878,39 @@ class Game:
                     except PermissionError:
                         # We might not have permissions, if the compiler is currently
                         # running.
-                        export_screen.reset()
-                        messagebox.showerror(
-                            title=gettext('BEE2 - Export Failed!'),
-                            message=gettext(
-                                'Copying compiler file {file} failed. '
-                                'Ensure {game} is not running.'
-                            ).format(
-                                file=comp_file,
-                                game=self.name,
-                            ),
-                            master=TK_ROOT,
+                        screen.reset()
+                        LOGGER.error(
+                            'Copying compiler file {} failed, is {} running?',
+                            comp_file, self.name,
                         )
+                        if interactive:
+                            messagebox.showerror(
+                                title=gettext('BEE2 - Export Failed!'),
+                                message=gettext(
+                                    'Copying compiler file {file} failed. '
+                                    'Ensure {game} is not running.'
+                                ).format(
+                                    file=comp_file,
+                                    game=self.name,
+                                ),
+                                master=TK_ROOT,
+                            )
                         return False, vpk_success
-                    export_screen.step('COMP', str(comp_file))
+                    screen.step('COMP', str(comp_file))
 
             if should_refresh:
                 LOGGER.info('Copying Resources!')
-                music_files = self.copy_mod_music()
-                self.refresh_cache(music_files)
+                music_files = self.copy_mod_music(screen)
+                self.refresh_cache(music_files, screen)
 
             LOGGER.info('Optimizing editor models...')
             self.clean_editor_models(all_items)
-            export_screen.step('EXP', 'editor_models')
+            screen.step('EXP', 'editor_models')
 
             LOGGER.info('Writing fizzler sides...')
             self.generate_fizzler_sides(vbsp_config)
             resource_gen.make_cube_colourizer_legend(Path(self.abs_path('bee2')))
-            export_screen.step('EXP', 'fizzler_sides')
+            screen.step('EXP', 'fizzler_sides')
 
             # Write generated resources, after the regular ones have been copied.
             for filename, data in resources.items():
@@ -906,7 +928,7 @@ class Game:
                 with open(self.abs_path('sdk_content/maps/instances/bee2/tag_coop_gun.vmf'), 'w') as f2:
                     TAG_COOP_INST_VMF.export(f2)
 
-            export_screen.reset()  # Hide loading screen, we're done
+            screen.reset()  # Hide loading screen, we're done
             return True, vpk_success
         except loadScreen.Cancelled:
             return False, False
@@ -998,7 +1020,7 @@ class Game:
         """Try and launch the game."""
         webbrowser.open('steam://rungameid/' + str(self.steamID))
 
-    def copy_mod_music(self) -> set[str]:
+    def copy_mod_music(self, screen: loadScreen.LoadScreen) -> set[str]:
         """Copy music files from Tag and PS:Mel.
 
         This returns a list of all the paths it copied to.
@@ -1021,7 +1043,7 @@ class Game:
         if MUSIC_MEL_VPK is not None:
             file_count += len(MEL_MUSIC_NAMES)
 
-        export_screen.set_length('MUS', file_count)
+        screen.set_length('MUS', file_count)
 
         # We know that it's very unlikely Tag or Mel's going to update
         # the music files. So we can check to see if they already exist,
@@ -1038,7 +1060,7 @@ class Game:
                 if os.path.isfile(src_loc) and not os.path.exists(dest_loc):
                     shutil.copy(src_loc, dest_loc)
                 copied_files.add(dest_loc.casefold())
-                export_screen.step('MUS')
+                screen.step('MUS')
 
         if MUSIC_MEL_VPK is not None:
             os.makedirs(mel_dest, exist_ok=True)
@@ -1048,7 +1070,7 @@ class Game:
                     with open(dest_loc, 'wb') as dest:
                         dest.write(MUSIC_MEL_VPK['sound/music', filename].read())
                 copied_files.add(dest_loc.casefold())
-                export_screen.step('MUS')
+                screen.step('MUS')
 
         return copied_files
 
@@ -1281,9 +1303,10 @@ def app_in_game_error() -> None:
 
 
 def save() -> None:
-    for gm in all_games:
-        gm.save()
-    CONFIG.save_check()
+    with _CONFIG_LOCK:
+        for gm in all_games:
+            gm.save()
+        CONFIG.save_check()
 
 
 def load() -> None:
@@ -3,31 +3,43 @@
 
 Handles are automatically deduplicated, and intiaially only contain the 
 filename/options, so are cheap to create. Once applied to a UI widget, 
-they are loaded in the background, then unloaded if removed from all widgets.
+they are loaded in the background. Loaded images are kept within a memory
+budget, discarding the least recently used once it is exceeded. Resized
+images from files are also cached on disk, so they don't need to be decoded
+again. Files are decoded in a pool of worker processes, with images visible
+on screen loaded first.
 """
 from __future__ import annotations
 
 from pathlib import Path
 from typing import Any, ClassVar, Iterator, Literal, TypeVar, Union, Type, cast
 from typing_extensions import TypeAlias, Final
+from collections import OrderedDict
 from collections.abc import Sequence, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from weakref import ref as WeakRef
 from tkinter import ttk
 import tkinter as tk
 import itertools
 import logging
 import functools
+import hashlib
+import os
+import threading
+import time
 
 from PIL import ImageFont, ImageTk, Image, ImageDraw
 import attrs
 import trio
 
 from srctools import Vec, Property
-from srctools.vtf import VTFFlags, VTF
-from srctools.filesys import FileSystem, RawFileSystem, FileSystemChain
+from srctools.filesys import File, FileSystem, RawFileSystem, FileSystemChain
 import srctools.logger
 
 from app import TK_ROOT
+from BEE2_config import GEN_OPTS
+import img_decode
 import utils
 
 # Widgets with an image attribute that can be set.
@@ -56,8 +68,18 @@ _wid_tk: dict[WidgetWeakRef, Handle] = {}
 
 # TK images have unique IDs, so preserve discarded image objects.
 _unused_tk_img: dict[tuple[int, int], list[tk.PhotoImage]] = {}
+# The default memory budget for loaded images, in megabytes.
+IMAGE_CACHE_BUDGET = 256
+# The minimum time between scans for images to evict, in seconds.
+EVICT_INTERVAL = 0.25
 
 LOGGER = srctools.logger.get_logger('img')
+# Resized images are saved here, named by a hash of the file and options.
+THUMB_CACHE_DIR = utils.conf_location('cache/images/')
+# Increment to discard previously cached images.
+THUMB_CACHE_VERSION = 1
+# The total size of the images to keep, in bytes.
+THUMB_CACHE_SIZE = 64 * 1024 * 1024
 FSYS_BUILTIN = RawFileSystem(str(utils.install_path('images')))
 PACK_SYSTEMS: dict[str, FileSystem] = {}
 
@@ -106,9 +128,23 @@ _load_handles: dict[tuple[int, int], ImgIcon] = {}
 
 # Once initialised, schedule here.
 _load_nursery: trio.Nursery | None = None
-# Load calls occurring before init. This is done so apply() can be called during import etc,
+# Handles waiting to be loaded, in order of priority.
+# Requests before init() are also queued, so apply() can be called during import etc,
 # and it'll be deferred till later.
-_early_loads: set[Handle] = set()
+_load_queue: utils.PriorityQueue[Handle] = utils.PriorityQueue(lambda handle: handle._priority())
+# Loader tasks wait here for handles to be queued.
+_load_lot = trio.lowlevel.ParkingLot()
+# Decodes image files, if enabled.
+_decode_pool: ProcessPoolExecutor | None = None
+# The number of images loaded at once if the pool is disabled.
+LOAD_TASKS = 8
+# Load priorities, lower is loaded first.
+PRIORITY_VISIBLE: Final = 0
+PRIORITY_SCROLLED: Final = 1
+PRIORITY_HIDDEN: Final = 2
+# Windows are shown and scrolled after images are applied, so while images are
+# queued, recompute priorities this often.
+REPRIORITISE_INTERVAL = 0.25
 
 
 def tuple_size(size: tuple[int, int] | int) -> tuple[int, int]:
@@ -131,6 +167,8 @@ def _get_tk_img(width: int, height: int) -> ImageTk.PhotoImage:
         img = img_list.pop()
     except IndexError:
         img = ImageTk.PhotoImage('RGBA', (width, height))
+    else:
+        _CACHE.spare_bytes -= _tk_size(img)
     return img
 
 
@@ -140,6 +178,132 @@ def _discard_tk_img(img: ImageTk.PhotoImage | None) -> None:
         # Use setdefault and append so each step is atomic.
         img_list = _unused_tk_img.setdefault((img.width(), img.height()), [])
         img_list.append(img)
+        _CACHE.spare_bytes += _tk_size(img)
+
+
+def _tk_size(img: ImageTk.PhotoImage) -> int:
+    """Estimate the memory used by a Tk image. These are stored as 32-bit colour."""
+    return img.width() * img.height() * 4
+
+
+def _pil_size(img: Image.Image) -> int:
+    """Estimate the memory used by a PIL image."""
+    return img.width * img.height * len(img.getbands())
+
+
+class ImageCache:
+    """Tracks the memory used by loaded images.
+
+    Once the budget is exceeded, the least recently used images are discarded.
+    Unused handles lose both images, handles still in use only lose the PIL
+    image if the Tk image is present, since that can be recreated if needed.
+    Force-loaded handles are never evicted.
+
+    Handles with nothing to discard are set aside, until their images change
+    or they are no longer used. That way each scan only checks handles which
+    might be evicted. Scans are done at most once every interval.
+    """
+    def __init__(self, budget: int, interval: float = 0.0) -> None:
+        self.budget = budget
+        self.interval = interval
+        # Handles with images loaded, and their size. Least recently used first.
+        self._handles: OrderedDict[Handle, int] = OrderedDict()
+        # Loaded handles which had nothing to discard when last checked.
+        self._pinned: dict[Handle, int] = {}
+        # PIL images are loaded in background threads.
+        self._lock = threading.Lock()
+        self._last_evict = float('-inf')
+        self.loaded_bytes = 0
+        # The size of Tk images kept for reuse.
+        self.spare_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def update(self, handle: Handle) -> None:
+        """Record the current size of a handle, and mark it as recently used."""
+        size = 0
+        # Grab local copies, these may be discarded by other threads.
+        pil = handle._cached_pil
+        tk_img = handle._cached_tk
+        if pil is not None:
+            size += _pil_size(pil)
+        if tk_img is not None:
+            size += _tk_size(tk_img)
+        with self._lock:
+            self.loaded_bytes -= self._handles.pop(handle, 0) + self._pinned.pop(handle, 0)
+            if size:
+                self._handles[handle] = size
+                self.loaded_bytes += size
+
+    def touch(self, handle: Handle) -> None:
+        """Mark a handle as recently used."""
+        with self._lock:
+            self.hits += 1
+            if handle in self._handles:
+                self._handles.move_to_end(handle)
+
+    def release(self, handle: Handle) -> None:
+        """Indicate a handle is no longer used, so it may now be evicted."""
+        with self._lock:
+            try:
+                self._handles[handle] = self._pinned.pop(handle)
+            except KeyError:
+                pass
+
+    def evict(self) -> None:
+        """Discard images until we're under budget.
+
+        This must be called from the main thread, since it may delete Tk images.
+        """
+        if self.loaded_bytes + self.spare_bytes <= self.budget:
+            return
+        now = time.monotonic()
+        if now - self._last_evict < self.interval:
+            return
+        self._last_evict = now
+        # First, free the recycled Tk images.
+        _unused_tk_img.clear()
+        self.spare_bytes = 0
+        # Each handle is either evicted entirely or set aside, so this finishes.
+        while self.loaded_bytes > self.budget:
+            with self._lock:
+                try:
+                    handle = next(iter(self._handles))
+                except StopIteration:
+                    break
+            if handle._force_loaded or handle._loading:
+                pass
+            elif not handle._users:
+                handle._cached_tk = handle._cached_pil = None
+                self.evictions += 1
+                self.update(handle)
+                continue
+            elif handle._cached_tk is not None and handle._cached_pil is not None:
+                handle._cached_pil = None
+                self.evictions += 1
+                self.update(handle)
+            # Nothing more can be discarded from this until it changes.
+            with self._lock:
+                try:
+                    self._pinned[handle] = self._handles.pop(handle)
+                except KeyError:
+                    pass
+
+    def stats(self) -> dict[str, int]:
+        """Return statistics about the cache's usage."""
+        return {
+            'handles': len(self._handles) + len(self._pinned),
+            'loaded_bytes': self.loaded_bytes,
+            'spare_bytes': self.spare_bytes,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+_CACHE = ImageCache(IMAGE_CACHE_BUDGET * 1024 * 1024, EVICT_INTERVAL)
 
 
 # Special paths which map to various images.
@@ -152,6 +316,84 @@ PATH_BLACK = utils.PackagePath('<color>', '000')
 PATH_WHITE = utils.PackagePath('<color>', 'fff')
 
 
+def _thumb_cache_path(
+    img_file: File,
+    uri: utils.PackagePath,
+    width: int, height: int,
+    resize_algo: int,
+) -> Path | None:
+    """Return where a resized copy of this file is cached, or None if it can't be."""
+    if width <= 0 or height <= 0:
+        return None  # Not resized, there's little benefit.
+    file_key = img_file.cache_key()
+    if file_key == -1:
+        return None
+    key = repr((
+        THUMB_CACHE_VERSION, uri.package,
+        img_file.sys.path, img_file.path, file_key,
+        width, height, resize_algo,
+    ))
+    return THUMB_CACHE_DIR / (hashlib.sha1(key.encode('utf8')).hexdigest() + '.png')
+
+
+def _fetch_thumb(cache_path: Path) -> Image.Image | None:
+    """Load a cached image, if present."""
+    try:
+        image = Image.open(cache_path)
+        image.load()
+    except FileNotFoundError:
+        return None
+    except Exception:
+        LOGGER.warning('Could not read cached image "{}":', cache_path, exc_info=True)
+        return None
+    # Mark this as recently used, so it survives eviction.
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return image
+
+
+def _store_thumb(cache_path: Path, image: Image.Image) -> None:
+    """Save a resized image to the cache."""
+    # Multiple threads may be loading the same image, so write to a unique file first.
+    temp = cache_path.with_suffix(f'.{os.getpid()}_{id(image)}.tmp')
+    try:
+        # Favour speed over size, these are small.
+        image.save(temp, 'png', compress_level=1)
+        os.replace(temp, cache_path)
+    except OSError:
+        LOGGER.warning('Could not cache image "{}":', cache_path, exc_info=True)
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+
+
+def evict_thumbs(max_size: int) -> None:
+    """Remove the least recently used images, until the cache is smaller than max_size bytes."""
+    entries: list[tuple[float, int, Path]] = []
+    for path in THUMB_CACHE_DIR.glob('*.png'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+    total = 0
+    removed = 0
+    for _, size, path in entries:
+        total += size
+        if total > max_size:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+    if removed:
+        LOGGER.debug('Evicted {} cached images.', removed)
+
+
 def _load_file(
     fsys: FileSystem,
     uri: utils.PackagePath,
@@ -194,27 +436,16 @@ def _load_file(
         LOGGER.error('"{}" does not exist!', uri)
         return Handle.error(width, height).get_pil()
 
+    cache_path = _thumb_cache_path(img_file, uri, width, height, resize_algo)
+    if cache_path is not None:
+        cached = _fetch_thumb(cache_path)
+        if cached is not None:
+            return cached
+
     try:
         with img_file.open_bin() as file:
-            if ext.casefold() == 'vtf':
-                vtf = VTF.read(file)
-                mipmap = 0
-                # If resizing, pick the mipmap equal to or slightly larger than
-                # the desired size. With powers of two, most cases we don't
-                # need to resize at all.
-                if width > 0 and height > 0 and VTFFlags.NO_MIP not in vtf.flags:
-                    for mipmap in range(vtf.mipmap_count):
-                        mip_width = max(vtf.width >> mipmap, 1)
-                        mip_height = max(vtf.height >> mipmap, 1)
-                        if mip_width < width or mip_height < height:
-                            mipmap = max(0, mipmap - 1)
-                            break
-                image = vtf.get(mipmap=mipmap).to_PIL()
-            else:
-                image = Image.open(file)
-                image.load()
-                if image.mode != 'RGBA':
-                    image = image.convert('RGBA')
+            data = file.read()
+        image = _decode(data, ext, width, height, resize_algo)
     except Exception:
         LOGGER.warning(
             'Could not parse image file {}:',
@@ -223,11 +454,37 @@ def _load_file(
         )
         return Handle.error(width, height).get_pil()
 
-    if width > 0 and height > 0 and (width, height) != image.size:
-        image = image.resize((width, height), resample=resize_algo)
+    if cache_path is not None:
+        _store_thumb(cache_path, image)
     return image
 
 
+def _decode(data: bytes, ext: str, width: int, height: int, resize_algo: int) -> Image.Image:
+    """Decode an image file, using the process pool if available."""
+    global _decode_pool
+    pool = _decode_pool
+    if pool is not None:
+        try:
+            future = pool.submit(
+                img_decode.decode_raw,
+                data, ext, width, height, resize_algo,
+            )
+        except (BrokenProcessPool, RuntimeError):  # RuntimeError if shut down.
+            LOGGER.warning('Image decoding pool failed:', exc_info=True)
+            _decode_pool = None
+        else:
+            # Errors decoding the image itself are handled by the caller, only
+            # give up on the pool if it died.
+            try:
+                mode, size, pixels = future.result()
+            except BrokenProcessPool:
+                LOGGER.warning('Image decoding pool failed:', exc_info=True)
+                _decode_pool = None
+            else:
+                return Image.frombytes(mode, size, pixels)
+    return img_decode.decode(data, ext, width, height, resize_algo)
+
+
 @attrs.define(eq=False)
 class Handle:
     """Represents an image that may be reloaded as required.
@@ -246,8 +503,6 @@ class Handle:
     _force_loaded: bool = attrs.field(init=False, default=False)
     # If true, this is in the queue to load.
     _loading: bool = attrs.field(init=False, default=False)
-    # When no users are present, schedule cleaning up the handle's data to reuse.
-    _cancel_cleanup: trio.CancelScope = attrs.field(init=False, factory=trio.CancelScope, repr=False)
 
     # Determines whether `get_pil()` and `get_tk()` can be called directly.
     allow_raw: ClassVar[bool] = False
@@ -492,11 +747,6 @@ class Handle:
         if self.allow_raw:
             # Force load, so it's always ready.
             self._force_loaded = True
-        elif not self._users and _load_nursery is not None:
-            # Loading something unused, schedule it to be cleaned soon.
-            self._cancel_cleanup.cancel()
-            self._cancel_cleanup = trio.CancelScope()
-            _load_nursery.start_soon(self._cleanup_task, self._cancel_cleanup)
         return self._load_pil()
 
     def get_tk(self) -> ImageTk.PhotoImage:
@@ -512,13 +762,20 @@ class Handle:
 
     def _load_pil(self) -> Image.Image:
         """Load the PIL image if required, then return it."""
-        if self._cached_pil is None:
-            self._cached_pil = self._make_image()
-        return self._cached_pil
+        # The cache may discard this at any time, so use a local.
+        image = self._cached_pil
+        if image is None:
+            image = self._cached_pil = self._make_image()
+            _CACHE.misses += 1
+            _CACHE.update(self)
+        else:
+            _CACHE.touch(self)
+        return image
 
     def _load_tk(self) -> ImageTk.PhotoImage:
         """Load the TK image if required, then return it."""
-        if self._cached_tk is None:
+        tk_img = self._cached_tk
+        if tk_img is None:
             # LOGGER.debug('Loading {}', self)
             res = self._load_pil()
             # Except for builtin types (icons), composite onto the PeTI BG.
@@ -526,9 +783,12 @@ class Handle:
                 bg = Image.new('RGBA', res.size, PETI_ITEM_BG)
                 bg.alpha_composite(res)
                 res = bg.convert('RGB')
-            self._cached_tk = _get_tk_img(res.width, res.height)
-            self._cached_tk.paste(res)
-        return self._cached_tk
+            tk_img = self._cached_tk = _get_tk_img(res.width, res.height)
+            tk_img.paste(res)
+            _CACHE.update(self)
+        else:
+            _CACHE.touch(self)
+        return tk_img
 
     def _decref(self, ref: 'WidgetWeakRef | Handle') -> None:
         """A label was no longer set to this handle."""
@@ -537,21 +797,16 @@ class Handle:
         self._users.discard(ref)
         for child in self._children():
             child._decref(self)
-        if _load_nursery is None:
-            return  # Not loaded, can't unload.
-        if not self._users and (self._cached_tk is not None or self._cached_pil is not None):
-            # Schedule this handle to be cleaned up, and store a cancel scope so that
-            # can be aborted.
-            self._cancel_cleanup = trio.CancelScope()
-            _load_nursery.start_soon(self._cleanup_task, self._cancel_cleanup)
+        # Now unused, this can be evicted if we're over budget.
+        if not self._users:
+            _CACHE.release(self)
+            _CACHE.evict()
 
     def _incref(self, ref: 'WidgetWeakRef | Handle') -> None:
         """Add a label to the list of those controlled by us."""
         if self._force_loaded:
             return
         self._users.add(ref)
-        # Abort cleaning up if we were planning to.
-        self._cancel_cleanup.cancel()
         for child in self._children():
             child._incref(self)
 
@@ -567,14 +822,32 @@ class Handle:
             return self._cached_tk
         if self._loading is False:
             self._loading = True
-            if _load_nursery is None:
-                _early_loads.add(self)
-            else:
-                _load_nursery.start_soon(self._load_task)
+            _load_queue.push(self)
+            _load_lot.unpark()
         return Handle.ico_loading(self.width, self.height).get_tk()
 
+    def _priority(self) -> int:
+        """Determine how soon this should be loaded, based on where it is visible."""
+        priority = PRIORITY_HIDDEN
+        for label_ref in self._users:
+            if isinstance(label_ref, WeakRef):
+                label: tkImgWidgets | None = label_ref()
+                if label is not None:
+                    priority = min(priority, _widget_priority(label))
+            else:  # A parent handle.
+                priority = min(priority, label_ref._priority())
+            if priority == PRIORITY_VISIBLE:
+                break
+        return priority
+
     async def _load_task(self) -> None:
         """Scheduled to load images then apply to the labels."""
+        if not self._users:
+            # No longer used by anything, skip loading. If requested again
+            # it'll be requeued.
+            self._loading = False
+            _CACHE.release(self)
+            return
         await trio.to_thread.run_sync(self._load_pil)
         self._loading = False
         tk_ico = self._load_tk()
@@ -589,15 +862,7 @@ class Handle:
                         # the Python object still exists. Ignore, should be
                         # cleaned up shortly.
                         pass
-
-    async def _cleanup_task(self, scope: trio.CancelScope) -> None:
-        """Wait for the time to elapse, then clear the contents."""
-        with scope:
-            await trio.sleep(5)
-        # We weren't cancelled and are empty, cleanup.
-        if not scope.cancel_called and self._loading is not None and not self._users:
-            _discard_tk_img(self._cached_tk)
-            self._cached_tk = self._cached_pil = None
+        _CACHE.evict()
 
 
 @attrs.define(eq=False)
@@ -875,17 +1140,84 @@ async def _spin_load_icons() -> None:
         await trio.sleep(0.125)
         for handle in _load_handles.values():
             handle.icon_name = load_name
-            handle._cached_pil = None
             if handle._cached_tk is not None:
-                # This updates the TK widget directly.
-                handle._cached_tk.paste(handle._load_pil())
+                # This updates the TK widget directly. Skip the cache, these
+                # are the same size each time.
+                handle._cached_pil = handle._make_image()
+                handle._cached_tk.paste(handle._cached_pil)
+            else:
+                handle._cached_pil = None
+
+
+def _widget_priority(widget: tk.Misc) -> int:
+    """Determine the load priority for a widget, based on whether it is on screen."""
+    try:
+        if not widget.winfo_viewable():
+            return PRIORITY_HIDDEN
+        # Widgets scrolled out of the window are still "viewable", check if
+        # it's inside the bounds of the window.
+        top = widget.winfo_toplevel()
+        x = widget.winfo_rootx() - top.winfo_rootx()
+        y = widget.winfo_rooty() - top.winfo_rooty()
+    except tk.TclError:  # Destroyed.
+        return PRIORITY_HIDDEN
+    if (
+        -widget.winfo_width() < x < top.winfo_width() and
+        -widget.winfo_height() < y < top.winfo_height()
+    ):
+        return PRIORITY_VISIBLE
+    else:
+        return PRIORITY_SCROLLED
+
+
+async def _reprioritise() -> None:
+    """While handles are queued, periodically recompute their priority."""
+    while True:
+        await trio.sleep(REPRIORITISE_INTERVAL)
+        if _load_queue:
+            _load_queue.reprioritise()
+
+
+async def _load_worker() -> None:
+    """Load queued handles, highest priority first."""
+    while True:
+        while not _load_queue:
+            await _load_lot.park()
+        await _load_queue.pop()._load_task()
+
+
+async def _evict_images() -> None:
+    """Evictions are rate-limited, so periodically catch up after a burst of loads."""
+    while True:
+        await trio.sleep(EVICT_INTERVAL)
+        _CACHE.evict()
+
+
+async def _log_cache_stats() -> None:
+    """In dev mode, periodically log the memory used by images."""
+    last: dict[str, int] = {}
+    while True:
+        await trio.sleep(30)
+        stats = _CACHE.stats()
+        if utils.DEV_MODE and stats != last:
+            LOGGER.info(
+                'Image cache: {} handles, {:.1f}/{:.0f}MB loaded, {:.1f}MB spare Tk images, '
+                '{} hits, {} misses, {} evictions',
+                stats['handles'],
+                stats['loaded_bytes'] / 1024 / 1024,
+                stats['budget'] / 1024 / 1024,
+                stats['spare_bytes'] / 1024 / 1024,
+                stats['hits'], stats['misses'], stats['evictions'],
+            )
+        last = stats
 
 
 # noinspection PyProtectedMember
-async def init(filesystems: Mapping[str, FileSystem]) -> None:
-    """Load in the filesystems used in package and start the background loading."""
-    global _load_nursery
+def load_filesystems(filesystems: Mapping[str, FileSystem]) -> None:
+    """Load in the filesystems used in package.
 
+    Without init(), images are then only loaded when get_pil() is called.
+    """
     PACK_SYSTEMS.clear()
     for pak_id, sys in filesystems.items():
         PACK_SYSTEMS[pak_id] = FileSystemChain(
@@ -894,14 +1226,42 @@ async def init(filesystems: Mapping[str, FileSystem]) -> None:
             (sys, 'resources/materials/models/props_map_editor/'),
         )
 
-    async with trio.open_nursery() as _load_nursery:
-        LOGGER.debug('Early loads: {}', _early_loads)
-        while _early_loads:
-            handle = _early_loads.pop()
-            if handle._users:
-                _load_nursery.start_soon(Handle._load_task, handle)
-        _load_nursery.start_soon(_spin_load_icons)
-        await trio.sleep_forever()
+
+async def init(filesystems: Mapping[str, FileSystem]) -> None:
+    """Load in the filesystems used in package and start the background loading."""
+    global _load_nursery, _decode_pool
+
+    load_filesystems(filesystems)
+    _CACHE.budget = GEN_OPTS.get_int('General', 'image_cache_mb', IMAGE_CACHE_BUDGET) * 1024 * 1024
+    # Zero disables the pool.
+    proc_count = GEN_OPTS.get_int('General', 'image_load_processes', min(4, (os.cpu_count() or 1) - 1))
+    if proc_count > 0:
+        LOGGER.info('Decoding images with {} processes.', proc_count)
+        _decode_pool = pool = ProcessPoolExecutor(proc_count)
+    else:
+        pool = None
+    # Keep the processes busy while the results are being sent back.
+    task_count = max(LOAD_TASKS, 2 * proc_count)
+    try:
+        async with trio.open_nursery() as _load_nursery:
+            LOGGER.debug('Early loads: {}', len(_load_queue))
+            # Windows may have been shown since these were requested.
+            _load_queue.reprioritise()
+            _load_nursery.start_soon(_reprioritise)
+            for _ in range(task_count):
+                _load_nursery.start_soon(_load_worker)
+            _load_nursery.start_soon(_spin_load_icons)
+            _load_nursery.start_soon(_evict_images)
+            _load_nursery.start_soon(_log_cache_stats)
+            _load_nursery.start_soon(functools.partial(
+                trio.to_thread.run_sync, evict_thumbs, THUMB_CACHE_SIZE,
+                cancellable=True,
+            ))
+            await trio.sleep_forever()
+    finally:
+        _decode_pool = None
+        if pool is not None:
+            pool.shutdown(wait=False)
 
 
 # noinspection PyProtectedMember
@@ -918,6 +1278,7 @@ def refresh_all() -> None:
         if not handle._loading:
             _discard_tk_img(handle._cached_tk)
             handle._cached_tk = handle._cached_pil = None
+            _CACHE.update(handle)
             loading = handle._request_load()
             done += 1
             for label_ref in handle._users:
@@ -0,0 +1,4 @@
+"""Benchmarks for the compiler and application.
+
+These are run directly, and are not part of the test suite.
+"""
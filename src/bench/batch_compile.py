@@ -0,0 +1,261 @@
+"""Convert a corpus of PeTI maps with the exported compiler configuration.
+
+Run from src/ with ``python -m bench.batch_compile``, passing the Portal 2
+folder the palette was exported to and the maps (or folders of maps) to
+convert. The configuration is parsed once, then each map is converted in a
+process pool. A summary of timings, counts and errors for every map is
+written as JSON, and a previous summary can be passed to compare against.
+
+Converting a map modifies a lot of global state, so each process is only
+used for a single map. Where possible, workers are forked from this process
+after the configuration has been parsed so they start warm. Otherwise each
+worker has to parse the configuration itself.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+
+
+# Increment if the result format changes incompatibly.
+FORMAT_VERSION = 1
+# Time changes smaller than this are not reported when comparing.
+TIME_THRESHOLD = 0.1
+
+# The results of vbsp.load_settings(), in each worker process.
+_STATE: Optional[Tuple[Any, ...]] = None
+
+
+def find_maps(paths: Iterable[Path]) -> Iterator[Path]:
+    """Find all the maps in the provided files or folders."""
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(path.rglob('*.vmf'))
+        else:
+            yield path
+
+
+def load_state(p2_folder: Path) -> None:
+    """Parse the exported configuration, in the same way as the compiler does."""
+    global _STATE
+    # The compiler is run from the bin/ folder, and uses relative paths.
+    os.chdir(p2_folder / 'bin')
+    import vbsp
+    from srctools.game import Game
+    from precomp import conditions
+
+    # Only show our own progress on the console, the log still has everything.
+    for handler in logging.getLogger().handlers:
+        if not isinstance(handler, logging.FileHandler):
+            handler.setLevel(logging.CRITICAL)
+
+    conditions.import_conditions()
+    game = Game(str(p2_folder / 'portal2'))
+    _STATE = (game, *vbsp.load_settings())
+
+
+def convert(name: str, map_path: Path, output: Path) -> Dict[str, Any]:
+    """Convert a single map in a worker, and return the results."""
+    import vbsp
+    from compile_metrics import CompileMetrics
+
+    assert _STATE is not None, 'Configuration not loaded!'
+    result: Dict[str, Any] = {
+        'map': name,
+        'success': False,
+        'time': 0.0,
+        'counts': {},
+        'error': None,
+    }
+    metrics = CompileMetrics('vbsp')
+    start = time.perf_counter()
+    try:
+        vbsp.convert_loaded(_STATE[0], str(map_path), str(output), *_STATE[1:], metrics)
+    except BaseException as exc:  # SystemExit is used for some errors.
+        result['error'] = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+        vbsp.LOGGER.exception('Converting "{}" failed:', map_path)
+    else:
+        result['success'] = True
+        result['counts'] = metrics.counts
+        result['output_size'] = output.stat().st_size
+    # Keep the stages which finished, even if it failed.
+    result['stages'] = metrics.stages
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+    p2_folder: Path,
+    maps: List[Path],
+    output: Path,
+    jobs: int,
+) -> List[Dict[str, Any]]:
+    """Convert all the maps, returning the results in the same order."""
+    output.mkdir(parents=True, exist_ok=True)
+    outputs = [
+        output / f'{i:04}_{map_path.name}'
+        for i, map_path in enumerate(maps)
+    ]
+    # Results are identified by the path as passed in, so they can be compared
+    # between machines. The compiler changes directory though, so make
+    # everything absolute.
+    names = [str(map_path) for map_path in maps]
+    p2_folder = p2_folder.absolute()
+    maps = [map_path.absolute() for map_path in maps]
+    outputs = [out_path.absolute() for out_path in outputs]
+    orig_dir = os.getcwd()
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Load once, then every worker is forked with a copy.
+        load_state(p2_folder)
+        ctx = multiprocessing.get_context('fork')
+        initializer = None
+    else:
+        ctx = multiprocessing.get_context('spawn')
+        initializer = load_state
+
+    results = []
+    try:
+        with ctx.Pool(
+            jobs,
+            initializer=initializer,
+            initargs=(p2_folder, ) if initializer is not None else (),
+            maxtasksperchild=1,
+        ) as pool:
+            pending = [
+                pool.apply_async(convert, args)
+                for args in zip(names, maps, outputs)
+            ]
+            for i, task in enumerate(pending, 1):
+                result = task.get()
+                status = f'{result["time"]:.2f}s' if result['success'] else 'FAILED'
+                print(f'[{i}/{len(maps)}] {result["map"]}: {status}', file=sys.stderr)
+                results.append(result)
+    finally:
+        os.chdir(orig_dir)
+    return results
+
+
+def summarise(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    """Compute the totals for a set of results."""
+    times = [result['time'] for result in results if result['success']]
+    return {
+        'maps': len(results),
+        'failed': sum(not result['success'] for result in results),
+        'wall_time': wall_time,
+        'total_time': sum(times),
+        'median_time': statistics.median(times) if times else 0.0,
+        'max_time': max(times, default=0.0),
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Compare two summaries, returning a description of each change."""
+    old_maps = {result['map']: result for result in old['results']}
+    changes = []
+    for result in new['results']:
+        try:
+            old_result = old_maps[result['map']]
+        except KeyError:
+            continue
+        name = result['map']
+        if old_result['success'] and not result['success']:
+            changes.append(f'{name}: now fails: {result["error"]}')
+            continue
+        elif result['success'] and not old_result['success']:
+            changes.append(f'{name}: now succeeds')
+            continue
+        elif not result['success']:
+            continue
+        for key, value in result['counts'].items():
+            old_value = old_result['counts'].get(key)
+            if old_value is not None and old_value != value:
+                changes.append(f'{name}: {key} {old_value} -> {value}')
+        old_time = old_result['time']
+        if old_time and abs(result['time'] - old_time) / old_time > TIME_THRESHOLD:
+            change = (result['time'] - old_time) / old_time * 100
+            changes.append(f'{name}: time {old_time:.3f}s -> {result["time"]:.3f}s ({change:+.1f}%)')
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the batch conversion."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('game', type=Path, help='The Portal 2 folder the palette was exported to.')
+    parser.add_argument('maps', nargs='+', type=Path, help='Maps, or folders of maps to convert.')
+    parser.add_argument('-o', '--output', help='Write the summary to this JSON file.')
+    parser.add_argument('-c', '--compare', help='Compare results against this JSON file.')
+    parser.add_argument(
+        '-d', '--dest', type=Path,
+        help='Folder to write converted maps to. Defaults to a temporary folder.',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1,
+        help='The number of maps to convert at once.',
+    )
+    args = parser.parse_args(argv)
+
+    if not (args.game / 'bin' / 'bee2' / 'vbsp_config.cfg').is_file():
+        parser.error(f'"{args.game}" has not been exported to!')
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1!')
+    maps = list(find_maps(args.maps))
+    if not maps:
+        parser.error('No maps found!')
+
+    start = time.perf_counter()
+    if args.dest is not None:
+        results = run_batch(args.game, maps, args.dest, args.jobs)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bee2_batch_') as folder:
+            results = run_batch(args.game, maps, Path(folder), args.jobs)
+    summary = summarise(results, time.perf_counter() - start)
+
+    output = {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'summary': summary,
+        'results': results,
+    }
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    print(
+        f'{summary["maps"]} maps, {summary["failed"]} failed. '
+        f'Wall time {summary["wall_time"]:.2f}s, '
+        f'median {summary["median_time"]:.3f}s, max {summary["max_time"]:.3f}s.',
+        file=sys.stderr,
+    )
+    for result in results:
+        if not result['success']:
+            print(f'  {result["map"]}: {result["error"]}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('format') != FORMAT_VERSION:
+            raise ValueError(f'Cannot compare against format {old.get("format")}!')
+        for change in compare(old, output):
+            print(change, file=sys.stderr)
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
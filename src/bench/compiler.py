@@ -0,0 +1,313 @@
+"""Benchmark the stages of the VBSP hook on synthetic maps.
+
+Run from src/ with ``python -m bench.compiler``. Each map is compiled in a
+fresh subprocess, since the compiler keeps a lot of global state. Results are
+written as JSON, and a previous result file can be passed to compare against.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import attrs
+from srctools import VMF, Vec
+from srctools.dmx import Element, Attribute, ValueType
+
+from bench.mapgen import MapParams, generate
+import consts
+
+
+# Increment if the result format changes incompatibly.
+FORMAT_VERSION = 1
+# The standard set of maps to benchmark.
+PRESETS: Dict[str, MapParams] = {
+    'small': MapParams(size=6, height=3, items=5, antline_length=2),
+    'medium': MapParams(size=12, height=6, fill=0.15, items=30, goo=10, panels=10),
+    'large': MapParams(size=24, height=12, fill=0.2, items=100, antline_length=6, goo=40, panels=40),
+}
+TEMPLATE_ID = 'BENCH_TILING'
+# The names of the visgroups in the tiling template.
+TILE_VISGROUPS = {
+    (2, True): 'bevel_thin',
+    (4, True): 'bevel_norm',
+    (8, True): 'bevel_thick',
+    (2, False): 'flat_thin',
+    (4, False): 'flat_norm',
+    (8, False): 'flat_thick',
+}
+
+# Meta conditions which require configuration from an exported palette.
+SKIPPED_META = {
+    f'MetaCondition "{name}"' for name in [
+        'add_fog_ents',
+        'gen_item_outputs',
+        'generate_cubes',
+        'make_barriers',
+        'set_elev_videos',
+        'set_player_portalgun',
+    ]
+}
+
+
+def write_fixture(folder: Path) -> None:
+    """Write out the configuration files the compiler needs.
+
+    This is a minimal game folder, and a tiling template.
+    """
+    game = folder / 'portal2'
+    game.mkdir(parents=True, exist_ok=True)
+    (game / 'gameinfo.txt').write_text(
+        '"GameInfo"\n{\n'
+        '\t"game" "Benchmark"\n'
+        '\t"FileSystem"\n\t{\n'
+        '\t\t"SearchPaths"\n\t\t{\n\t\t\t"Game" "|gameinfo_path|."\n\t\t}\n'
+        '\t}\n}\n'
+    )
+
+    # The tiling template, one tile in each visgroup. These face +X.
+    vmf = VMF()
+    conf = vmf.create_ent('bee2_template_conf', template_id=TEMPLATE_ID, temp_type='world')
+    conf['discard_brushes'] = '0'
+    for (thickness, bevel), name in TILE_VISGROUPS.items():
+        visgroup = vmf.create_visgroup(name)
+        prism = vmf.make_prism(
+            Vec(-thickness / 2, -16, -16),
+            Vec(thickness / 2, 16, 16),
+            consts.Special.SQUAREBEAMS,
+        )
+        prism.east.mat = consts.BlackPan.BLACK_1x1
+        prism.west.mat = consts.Special.BACKPANELS
+        # Visgroups are only saved for brush entities.
+        ent = vmf.create_ent('func_detail')
+        ent.solids.append(prism.solid)
+        ent.visgroup_ids.add(visgroup.id)
+    with (folder / 'tiling.vmf').open('w') as f:
+        vmf.export(f)
+
+    root = Element('Templates', 'DMERoot')
+    temp_list = root['temp'] = Attribute.array('list', ValueType.ELEMENT)
+    temp = Element(TEMPLATE_ID, 'DMETemplate')
+    temp['package'] = str(folder.absolute()).replace('\\', '/')
+    temp['path'] = 'tiling.vmf'
+    temp_list.append(temp)
+    with (folder / 'templates.lst').open('wb') as f:
+        root.export_binary(f, fmt_name='bee_templates', unicode='format')
+
+
+def run_stages(folder: Path, params: MapParams, memory: bool) -> Dict[str, Any]:
+    """Compile the map in this process, timing each stage.
+
+    This must only be done once per process.
+    """
+    # Imported here, so the log file goes in the fixture folder.
+    import vbsp
+    from srctools.game import Game
+    from srctools import Property
+    from precomp import (
+        antlines, brushLoc, conditions, corridor, options,
+        template_brush, texturing, tiling,
+    )
+    from precomp.collisions import Collisions
+
+    texturing.load_config(Property('Textures', []))
+    options.load([Property('Options', [
+        Property('_tiling_template_', TEMPLATE_ID),
+    ])])
+    template_brush.load_templates(str(folder / 'templates.lst'))
+    # Without an exported palette, skip the meta conditions which need it.
+    conditions.conditions = [
+        cond for cond in conditions.conditions
+        if cond.source not in SKIPPED_META
+    ]
+    game = Game(str(folder / 'portal2'))
+
+    map_path = str(folder / 'bench.vmf')
+    with open(map_path, 'w') as f:
+        generate(params).export(f)
+
+    coll = Collisions()
+    info = corridor.Info(
+        is_publishing=False,
+        start_at_elevator=False,
+        game_mode=corridor.GameMode.SP,
+        attrs={},
+        corr_entry=None,  # type: ignore
+        corr_exit=None,  # type: ignore
+    )
+    state: Dict[str, Any] = {}
+
+    def parse_antlines() -> None:
+        """Parse antlines, keeping the result for analyse_map."""
+        state['ant'], state['side_to_ant'] = antlines.parse_antlines(state['vmf'])
+
+    def analyse_map() -> None:
+        """Generate tiles from the brushes."""
+        tiling.gen_tile_temp()
+        tiling.analyse_map(state['vmf'], state['side_to_ant'])
+
+    stages: List[tuple[str, Callable[[], object]]] = [
+        ('load', lambda: state.__setitem__('vmf', vbsp.load_map(map_path))),
+        ('read_from_map', lambda: brushLoc.POS.read_from_map(state['vmf'], {}, {})),
+        ('antlines', parse_antlines),
+        ('analyse_map', analyse_map),
+        ('texturing', lambda: texturing.setup(game, state['vmf'], list(tiling.TILES.values()))),
+        ('conditions', lambda: conditions.check_all(state['vmf'], coll, info)),
+        ('generate_brushes', lambda: tiling.generate_brushes(state['vmf'])),
+        ('save', lambda: vbsp.save(state['vmf'], str(folder / 'styled' / 'bench.vmf'))),
+    ]
+
+    times: Dict[str, float] = {}
+    peaks: Dict[str, int] = {}
+    if memory:
+        tracemalloc.start()
+    for name, func in stages:
+        start = time.perf_counter()
+        func()
+        times[name] = time.perf_counter() - start
+        if memory:
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+            # Not available before 3.9, the peak is then cumulative.
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+    if memory:
+        tracemalloc.stop()
+
+    vmf: VMF = state['vmf']
+    return {
+        'times': times,
+        'memory': peaks,
+        'counts': {
+            'tiles': len(tiling.TILES),
+            'brushes': len(vmf.brushes) + sum(len(ent.solids) for ent in vmf.entities),
+            'entities': len(vmf.entities),
+        },
+    }
+
+
+def run_worker(params: MapParams, memory: bool) -> Dict[str, Any]:
+    """Run a single compile in a subprocess, and return its results."""
+    with tempfile.TemporaryDirectory(prefix='bee2_bench_') as folder:
+        write_fixture(Path(folder))
+        proc = subprocess.run(
+            [
+                sys.executable, '-m', 'bench.compiler', '--worker', folder,
+                json.dumps(attrs.asdict(params)),
+            ] + (['--memory'] if memory else []),
+            cwd=folder,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    if proc.returncode != 0:
+        sys.stderr.buffer.write(proc.stderr)
+        raise RuntimeError(f'Benchmark worker failed with code {proc.returncode}!')
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def benchmark(name: str, params: MapParams, repeat: int) -> Dict[str, Any]:
+    """Benchmark a map, repeating it several times."""
+    runs = [run_worker(params, False) for _ in range(repeat)]
+    mem_run = run_worker(params, True)
+    stages = {
+        stage: {
+            'min': min(run['times'][stage] for run in runs),
+            'median': statistics.median(run['times'][stage] for run in runs),
+            'peak_memory': mem_run['memory'][stage],
+        }
+        for stage in runs[0]['times']
+    }
+    return {
+        'name': name,
+        'params': attrs.asdict(params),
+        'repeat': repeat,
+        'total': min(sum(run['times'].values()) for run in runs),
+        'stages': stages,
+        'counts': runs[0]['counts'],
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print the relative change in each stage between two result files."""
+    old_maps = {result['name']: result for result in old['results']}
+    for result in new['results']:
+        try:
+            old_result = old_maps[result['name']]
+        except KeyError:
+            continue
+        if old_result['params'] != result['params']:
+            print(f'{result["name"]}: parameters differ, skipping.')
+            continue
+        print(f'{result["name"]}:')
+        for stage, data in result['stages'].items():
+            try:
+                old_time = old_result['stages'][stage]['min']
+            except KeyError:
+                continue
+            change = (data['min'] - old_time) / old_time * 100 if old_time else 0.0
+            print(f'  {stage:<20} {old_time:8.4f}s -> {data["min"]:8.4f}s ({change:+.1f}%)')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'maps', nargs='*', metavar='map', default=[],
+        help=f'The presets to run, defaults to all. Choices: {", ".join(PRESETS)}',
+    )
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('-c', '--compare', help='Compare results against this JSON file.')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times to run each map.')
+    parser.add_argument('--worker', nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument('--memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        folder, params = args.worker
+        os.chdir(folder)
+        result = run_stages(Path(folder), MapParams(**json.loads(params)), args.memory)
+        # The compiler logs to stdout too, so the result is the last line.
+        print('\n' + json.dumps(result))
+        return
+
+    for name in args.maps:
+        if name not in PRESETS:
+            parser.error(f'Unknown preset "{name}"!')
+
+    results = []
+    for name in args.maps or PRESETS:
+        print(f'Benchmarking {name}...', file=sys.stderr)
+        results.append(benchmark(name, PRESETS[name], args.repeat))
+
+    output = {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('format') != FORMAT_VERSION:
+            raise ValueError(f'Cannot compare against format {old.get("format")}!')
+        compare(old, output)
+
+
+if __name__ == '__main__':
+    main()
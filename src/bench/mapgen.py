@@ -0,0 +1,191 @@
+"""Generate synthetic puzzlemaker maps, for benchmarking the compiler.
+
+The maps mimic what the puzzlemaker exports - a shell of 128-unit cubes around
+the chamber with the tile textures on their inner faces, goo brushes, 4-unit
+panel brushes, item instances and antline overlays.
+"""
+from __future__ import annotations
+
+from typing import Dict, Set, Tuple
+import random
+
+import attrs
+from srctools import VMF, Vec, Solid
+
+import consts
+
+
+__all__ = ['MapParams', 'generate']
+# Instances used for items, to give conditions something to match.
+ITEM_FILES = [
+    'instances/p2editor/item_button_floor.vmf',
+    'instances/p2editor/item_cube_dropper.vmf',
+    'instances/p2editor/item_light_bridge.vmf',
+    'instances/p2editor/item_laser_emitter.vmf',
+]
+DIRECTIONS = [
+    Vec(x=1), Vec(x=-1),
+    Vec(y=1), Vec(y=-1),
+    Vec(z=1), Vec(z=-1),
+]
+
+
+@attrs.frozen
+class MapParams:
+    """The parameters controlling the size of the generated map."""
+    # The chamber's size in voxels. The map can be at most 26 voxels wide,
+    # including the shell.
+    size: int = 8
+    height: int = 4
+    # Fraction of floor positions with a pillar.
+    fill: float = 0.1
+    # Fraction of tiles which are white.
+    white: float = 0.5
+    items: int = 10
+    # The length of the antline from each item, in voxels.
+    antline_length: int = 3
+    # The number of floor voxels filled with goo.
+    goo: int = 0
+    # The number of floor tiles made from 4-unit panel brushes.
+    panels: int = 0
+    seed: int = 0
+
+    def __attrs_post_init__(self) -> None:
+        """Check the map fits in the puzzlemaker's bounds."""
+        if not (1 <= self.size <= 24 and 2 <= self.height <= 24):
+            raise ValueError(f'Map size {self.size}x{self.size}x{self.height} is too large!')
+
+
+def _cube(vmf: VMF, pos: Vec, mats: Dict[Tuple[int, int, int], str]) -> Solid:
+    """Create a 128-unit cube at this voxel, with the given face materials."""
+    solid = vmf.make_prism(pos * 128, pos * 128 + 128, consts.Tools.NODRAW).solid
+    for side in solid.sides:
+        # Side normals point inward.
+        outward = tuple(-side.normal())
+        try:
+            side.mat = mats[outward]  # type: ignore
+        except KeyError:
+            pass
+    return solid
+
+
+def _tile_mat(rand: random.Random, params: MapParams, normal: Vec) -> str:
+    """Pick a tile material for a surface."""
+    is_white = rand.random() < params.white
+    if normal.z != 0:
+        return consts.WhitePan.WHITE_FLOOR if is_white else consts.BlackPan.BLACK_FLOOR
+    else:
+        return consts.WhitePan.WHITE_1x1 if is_white else consts.BlackPan.BLACK_1x1
+
+
+def generate(params: MapParams) -> VMF:
+    """Generate a map with the given parameters."""
+    rand = random.Random(params.seed)
+    vmf = VMF()
+    size = params.size
+    height = params.height
+
+    floor_pos = [(x, y) for x in range(1, size + 1) for y in range(1, size + 1)]
+    rand.shuffle(floor_pos)
+
+    # Each of these takes a unique floor position.
+    goo_pos = set(floor_pos[:params.goo])
+    del floor_pos[:params.goo]
+    panel_pos = set(floor_pos[:params.panels])
+    del floor_pos[:params.panels]
+    pillar_count = int(len(floor_pos) * params.fill)
+    pillars = {
+        pos: rand.randint(1, height - 1)
+        for pos in floor_pos[:pillar_count]
+    }
+    del floor_pos[:pillar_count]
+
+    air: Set[Tuple[int, int, int]] = set()
+    for x in range(1, size + 1):
+        for y in range(1, size + 1):
+            for z in range(1 + pillars.get((x, y), 0), height + 1):
+                air.add((x, y, z))
+
+    # Make cubes for every solid voxel next to air.
+    solid: Set[Tuple[int, int, int]] = set()
+    for (x, y, z) in air:
+        for norm in DIRECTIONS:
+            pos = (x + int(norm.x), y + int(norm.y), z + int(norm.z))
+            if pos not in air:
+                solid.add(pos)
+
+    for pos in sorted(solid):
+        x, y, z = pos
+        if z == 0 and (x, y) in panel_pos:
+            # A 4-unit thick panel on top of this voxel instead.
+            panel = vmf.make_prism(
+                Vec(x * 128, y * 128, 124),
+                Vec(x * 128 + 128, y * 128 + 128, 128),
+                consts.Special.BACKPANELS_CHEAP,
+            )
+            panel.top.mat = _tile_mat(rand, params, Vec(z=1))
+            vmf.add_brush(panel.solid)
+            continue
+        mats = {}
+        for norm in DIRECTIONS:
+            if (x + int(norm.x), y + int(norm.y), z + int(norm.z)) in air:
+                mats[tuple(norm)] = _tile_mat(rand, params, norm)
+        vmf.add_brush(_cube(vmf, Vec(pos), mats))
+
+    for (x, y) in sorted(goo_pos):
+        vmf.add_brush(vmf.make_prism(
+            Vec(x * 128, y * 128, 128),
+            Vec(x * 128 + 128, y * 128 + 128, 224),
+            consts.Goo.REFLECTIVE,
+        ).solid)
+
+    # The player, so the chamber is always filled with air.
+    vmf.create_ent(
+        'info_player_start',
+        origin=Vec(size * 64 + 64, size * 64 + 64, 160),
+        angles='0 0 0',
+    )
+
+    # Place items on the remaining floor positions.
+    rand.shuffle(floor_pos)
+    for i, (x, y) in enumerate(floor_pos[:params.items]):
+        name = f'item_{i}'
+        inst = vmf.create_ent(
+            'func_instance',
+            targetname=name,
+            file=rand.choice(ITEM_FILES),
+            origin=Vec(x * 128 + 64, y * 128 + 64, 128),
+            angles='0 0 0',
+        )
+        inst.fixup['$connectioncount'] = '0'
+        inst.fixup['$start_enabled'] = rand.choice(['0', '1'])
+        _make_antline(vmf, name, x, y, params.antline_length, size)
+
+    return vmf
+
+
+def _make_antline(vmf: VMF, name: str, x: int, y: int, length: int, size: int) -> None:
+    """Add a straight antline along the floor from this position."""
+    length = min(length, size - y)
+    if length <= 0:
+        return
+    # Straight overlays point along the Y axis, with angles of 0 0 0.
+    vmf.create_ent(
+        'info_overlay',
+        targetname=name + '_overlay',
+        material=consts.Antlines.STRAIGHT,
+        angles='0 0 0',
+        origin=Vec(x * 128 + 64, y * 128 + 64 + length * 64, 128.0625),
+        basisorigin=Vec(x * 128 + 64, y * 128 + 64 + length * 64, 128),
+        basisnormal='0 0 1',
+        basisu='0 1 0',
+        basisv='-1 0 0',
+        startu='0', endu=str(length * 8),
+        startv='0', endv='1',
+        uv0=f'{-length * 64} -8 0',
+        uv1=f'{-length * 64} 8 0',
+        uv2=f'{length * 64} 8 0',
+        uv3=f'{length * 64} -8 0',
+        sides='',
+        renderorder='0',
+    )
@@ -0,0 +1,516 @@
+"""Benchmark loading packages, using synthetic package sets.
+
+Run from src/ with ``python -m bench.package_load``. Packages are generated in
+both zipped and folder form, then loaded in a fresh subprocess with
+packages.load_packages(). The UI isn't started, progress is sent to a stub
+loading screen. Importing the packages module still creates the hidden Tk
+root, so a display is required (use xvfb-run on a headless machine).
+
+For each set, the time taken, peak RSS and the time spent on each object
+type is written out as JSON.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import attrs
+from srctools import VMF, Vec
+
+from compile_metrics import peak_memory
+import consts
+
+if TYPE_CHECKING:
+    import trio
+
+
+# Increment if the result format changes incompatibly.
+FORMAT_VERSION = 1
+CLEAN_STYLE_ID = 'BEE2_CLEAN_STYLE'
+
+
+@attrs.frozen
+class PackageParams:
+    """The parameters controlling the generated package set."""
+    # The number of packages. The first is always the Clean Style package.
+    packages: int = 4
+    # These are spread evenly over all packages.
+    items: int = 50
+    styles: int = 2
+    templates: int = 20
+    images: int = 50
+    # Items which have a style variant added by another package.
+    overrides: int = 10
+    zipped: bool = True
+    seed: int = 0
+
+    def __attrs_post_init__(self) -> None:
+        """Check the set is valid."""
+        if self.packages < 1 or self.styles < 1:
+            raise ValueError('At least one package and style is required!')
+        if self.overrides > self.items:
+            raise ValueError('Cannot override more items than exist!')
+        if self.overrides and self.styles < 2:
+            # The override adds the last style, items define the first.
+            raise ValueError('Overrides require at least two styles!')
+
+
+_SIZES = {
+    'small': PackageParams(packages=2, items=20, styles=2, templates=10, images=20, overrides=5),
+    'medium': PackageParams(packages=8, items=150, styles=4, templates=80, images=300, overrides=30),
+    # Roughly the size of the BEE2-items package set.
+    'large': PackageParams(packages=30, items=600, styles=10, templates=400, images=2000, overrides=120),
+}
+# The standard set of package sets to benchmark.
+PRESETS: Dict[str, PackageParams] = {
+    f'{name}_{"zip" if zipped else "folder"}': attrs.evolve(params, zipped=zipped)
+    for name, params in _SIZES.items()
+    for zipped in [True, False]
+}
+
+EDITORITEMS = '''\
+"Item"
+\t{{
+\t"Type" "{item_id}"
+\t"Editor"
+\t\t{{
+\t\t"SubType"
+\t\t\t{{
+\t\t\t"Name" "{name}"
+\t\t\t"Model"
+\t\t\t\t{{
+\t\t\t\t"ModelName" "cube.3ds"
+\t\t\t\t}}
+\t\t\t"Palette"
+\t\t\t\t{{
+\t\t\t\t"Tooltip" "{name}"
+\t\t\t\t"Image" "palette/bench/{item_id}.png"
+\t\t\t\t"Position" "{x} {y} 0"
+\t\t\t\t}}
+\t\t\t}}
+\t\t"MovementHandle" "HANDLE_4_DIRECTIONS"
+\t\t"DesiredFacing" "DESIRES_UP"
+\t\t}}
+\t"Exporting"
+\t\t{{
+\t\t"Instances"
+\t\t\t{{
+\t\t\t"0"
+\t\t\t\t{{
+\t\t\t\t"Name" "instances/bench/{folder}.vmf"
+\t\t\t\t"EntityCount" "2"
+\t\t\t\t"BrushCount" "1"
+\t\t\t\t"BrushSideCount" "6"
+\t\t\t\t}}
+\t\t\t}}
+\t\t"TargetName" "bench"
+\t\t"Offset" "64 64 64"
+\t\t"OccupiedVoxels"
+\t\t\t{{
+\t\t\t"Voxel"
+\t\t\t\t{{
+\t\t\t\t"Pos" "0 0 0"
+\t\t\t\t"CollideType" "COLLIDE_SOLID"
+\t\t\t\t}}
+\t\t\t}}
+\t\t}}
+\t}}
+'''
+
+PROPERTIES = '''\
+"Properties"
+\t{{
+\t"Authors" "Benchmark"
+\t"Tags" "Benchmark; Synthetic"
+\t"ent_count" "2"
+\t"Description"
+\t\t{{
+\t\t"" "A generated item, number {index}."
+\t\t"" "[[Bullet]] With a second line."
+\t\t}}
+\t"Icon"
+\t\t{{
+\t\t"0" "{icon}"
+\t\t}}
+\t}}
+'''
+
+VBSP_CONFIG = '''\
+"Conditions"
+\t{{
+\t"Condition"
+\t\t{{
+\t\t"instance" "<{item_id}>"
+\t\t"AddOutput"
+\t\t\t{{
+\t\t\t"output" "OnUser1"
+\t\t\t"target" "bench"
+\t\t\t"input" "Trigger"
+\t\t\t}}
+\t\t}}
+\t}}
+'''
+
+
+def _write_template(path: Path, temp_id: str) -> None:
+    """Write a template VMF, with a few brushes."""
+    vmf = VMF()
+    vmf.create_ent('bee2_template_conf', template_id=temp_id, temp_type='default')
+    for i in range(4):
+        prism = vmf.make_prism(Vec(-64, -64, 16 * i), Vec(64, 64, 16 * i + 8), consts.Tools.NODRAW)
+        prism.top.mat = consts.BlackPan.BLACK_FLOOR
+        vmf.add_brush(prism.solid)
+    with path.open('w') as f:
+        vmf.export(f)
+
+
+def _image_data() -> bytes:
+    """Produce the contents of an icon."""
+    from io import BytesIO
+    from PIL import Image
+    buf = BytesIO()
+    Image.new('RGB', (64, 64), (128, 64, 32)).save(buf, 'png')
+    return buf.getvalue()
+
+
+def generate(folder: Path, params: PackageParams) -> None:
+    """Write out the package set into this folder."""
+    rand = random.Random(params.seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    pak_ids = [CLEAN_STYLE_ID] + [f'BENCH_PAK_{i}' for i in range(1, params.packages)]
+    style_ids = [f'BENCH_STYLE_{i}' for i in range(params.styles)]
+    infos: List[List[str]] = [
+        [
+            f'"ID" "{pak_id}"',
+            f'"Name" "Benchmark Package {i}"',
+            '"Desc" "A generated package, for benchmarking."',
+        ]
+        for i, pak_id in enumerate(pak_ids)
+    ]
+    pak_folders = [folder / pak_id.casefold() for pak_id in pak_ids]
+    image = _image_data()
+
+    images = [f'bench/image_{i}.png' for i in range(params.images)]
+    for i, img_path in enumerate(images):
+        path = pak_folders[i % params.packages] / 'resources' / 'BEE2' / 'items' / img_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(image)
+
+    # Styles all go in the Clean Style package, each inheriting from the last.
+    clean = pak_folders[0]
+    for i, style_id in enumerate(style_ids):
+        style_folder = clean / 'styles' / style_id.casefold()
+        style_folder.mkdir(parents=True, exist_ok=True)
+        (style_folder / 'items.txt').write_text('"ItemData"\n\t{\n\t}\n')
+        (style_folder / 'vbsp_config.cfg').write_text('"Options"\n\t{\n\t"bench_style" "1"\n\t}\n')
+        infos[0].append(
+            f'"Style"\n\t{{\n\t"ID" "{style_id}"\n\t"Name" "Benchmark Style {i}"\n'
+            + (f'\t"Base" "{style_ids[i - 1]}"\n' if i > 0 else '')
+            + f'\t"Folder" "{style_id.casefold()}"\n\t}}'
+        )
+
+    def write_item_folder(pak_ind: int, item_id: str, fold: str, index: int) -> None:
+        """Write the configs for an item variant."""
+        item_folder = pak_folders[pak_ind] / 'items' / fold
+        item_folder.mkdir(parents=True, exist_ok=True)
+        (item_folder / 'editoritems.txt').write_text(EDITORITEMS.format(
+            item_id=item_id, name=f'Bench Item {index}', folder=fold,
+            x=index % 4, y=(index // 4) % 8,
+        ))
+        (item_folder / 'properties.txt').write_text(PROPERTIES.format(
+            index=index,
+            icon=rand.choice(images) if images else '<special>:error',
+        ))
+        (item_folder / 'vbsp_config.cfg').write_text(VBSP_CONFIG.format(item_id=item_id))
+
+    for i in range(params.items):
+        item_id = f'BENCH_ITEM_{i}'
+        pak_ind = i % params.packages
+        fold = f'bench_item_{i}'
+        write_item_folder(pak_ind, item_id, fold, i)
+        infos[pak_ind].append(
+            f'"Item"\n\t{{\n\t"ID" "{item_id}"\n\t"Version"\n\t\t{{\n'
+            f'\t\t"Styles"\n\t\t\t{{\n\t\t\t"{style_ids[0]}" "{fold}"\n\t\t\t}}\n\t\t}}\n\t}}'
+        )
+
+    # Overrides come from the next package along, adding a variant for the last style.
+    overrides: List[List[str]] = [[] for _ in pak_ids]
+    for i in rand.sample(range(params.items), params.overrides):
+        item_id = f'BENCH_ITEM_{i}'
+        pak_ind = (i + 1) % params.packages
+        fold = f'bench_item_{i}_override'
+        write_item_folder(pak_ind, item_id, fold, i)
+        overrides[pak_ind].append(
+            f'\t"Item"\n\t\t{{\n\t\t"ID" "{item_id}"\n\t\t"Version"\n\t\t\t{{\n'
+            f'\t\t\t"Styles"\n\t\t\t\t{{\n\t\t\t\t"{style_ids[-1]}" "{fold}"\n\t\t\t\t}}\n\t\t\t}}\n\t\t}}'
+        )
+
+    for i in range(params.templates):
+        path = pak_folders[i % params.packages] / 'templates' / f'bench_{i}.vmf'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_template(path, f'BENCH_TEMPLATE_{i}')
+
+    for pak_folder, info, over in zip(pak_folders, infos, overrides):
+        if over:
+            info.append('"Overrides"\n\t{\n' + '\n'.join(over) + '\n\t}')
+        (pak_folder / 'info.txt').write_text('\n'.join(info) + '\n')
+        if params.zipped:
+            with zipfile.ZipFile(pak_folder.with_suffix('.bee_pack'), 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for path in pak_folder.rglob('*'):
+                    if path.is_file():
+                        zipf.write(path, path.relative_to(pak_folder).as_posix())
+            shutil.rmtree(pak_folder)
+
+
+class StubLoader:
+    """Replaces the loading screen, counting the steps made."""
+    def __init__(self) -> None:
+        self.lengths: Dict[str, int] = {}
+        self.steps: Counter[str] = Counter()
+
+    def set_length(self, stage: str, num: int) -> None:
+        """Set the number of items in a stage."""
+        self.lengths[stage] = num
+
+    def step(self, stage: str, disp_name: object = '') -> None:
+        """Increment a stage."""
+        self.steps[stage] += 1
+
+
+def _make_tracer() -> trio.abc.Instrument:
+    """Build an instrument which tracks the time spent on each object type."""
+    import trio
+
+    class TypeTracer(trio.abc.Instrument):
+        """Attribute the time spent in each task to the kind of object being parsed."""
+        def __init__(self) -> None:
+            self.category: Dict[trio.lowlevel.Task, str] = {}
+            self.start_time: Dict[trio.lowlevel.Task, float] = {}
+            self.elapsed: Dict[str, float] = {}
+
+        def task_spawned(self, task: trio.lowlevel.Task) -> None:
+            """Work out what this task is doing."""
+            code_name = task.coro.cr_code.co_name
+            args = task.coro.cr_frame.f_locals
+            if code_name in ('parse_type', 'parse_object'):
+                category = args['obj_class'].__name__
+            elif code_name == 'parse_package':
+                category = 'Package'
+            elif code_name == 'parse_template':
+                category = 'TemplateBrush'
+            elif code_name == 'find_packages':
+                category = 'find'
+            else:
+                # Child tasks are counted for their parent.
+                parent = task.parent_nursery.parent_task if task.parent_nursery else None
+                category = self.category.get(parent, 'other')
+            self.category[task] = category
+
+        def before_task_step(self, task: trio.lowlevel.Task) -> None:
+            """Begin timing this task."""
+            self.start_time[task] = time.perf_counter()
+
+        def after_task_step(self, task: trio.lowlevel.Task) -> None:
+            """Count up the time."""
+            try:
+                diff = time.perf_counter() - self.start_time.pop(task)
+            except KeyError:
+                return
+            category = self.category.get(task, 'other')
+            self.elapsed[category] = self.elapsed.get(category, 0.0) + diff
+
+    return TypeTracer()
+
+
+def run_load(folder: Path) -> Dict[str, Any]:
+    """Load the packages in this process, and return the results.
+
+    This must only be done once per process.
+    """
+    import trio
+    from config.gen_opts import GenOptions
+    from packages import template_brush
+    import app
+    import config
+    import packages
+
+    # Item parsing checks this option.
+    config.APP.store_conf(GenOptions())
+    packset = packages.PackagesSet()
+    loader = StubLoader()
+    tracer = _make_tracer()
+    ready: Dict[str, float] = {}
+    rss_before = peak_memory()
+
+    async def wait_ready(start: float, obj_type: type) -> None:
+        """Record when each object type has been fully parsed."""
+        await packset.ready(obj_type).wait()
+        ready[obj_type.__name__] = time.perf_counter() - start
+
+    async def main() -> float:
+        """Load the packages, then wait for background parsing to finish."""
+        start = time.perf_counter()
+        async with trio.open_nursery() as nursery:
+            # Objects not needed for the UI are parsed in the background.
+            app._APP_NURSERY = nursery
+            for obj_type in packages.OBJ_TYPES.values():
+                nursery.start_soon(wait_ready, start, obj_type)
+            await packages.load_packages(packset, [folder], loader)
+        return time.perf_counter() - start
+
+    total = trio.run(main, instruments=[tracer])
+    return {
+        'total': total,
+        'ready': ready,
+        'task_time': tracer.elapsed,  # type: ignore[attr-defined]
+        'rss_before': rss_before,
+        'peak_rss': peak_memory(),
+        'counts': {
+            'TemplateBrush': len(template_brush.TEMPLATES),
+            **{
+                obj_type.__name__: len(objs)
+                for obj_type, objs in packset.objects.items()
+            },
+        },
+        'loader': {
+            stage: {'length': length, 'steps': loader.steps[stage]}
+            for stage, length in loader.lengths.items()
+        },
+    }
+
+
+def run_worker(params: PackageParams) -> Dict[str, Any]:
+    """Generate and load a package set in a subprocess, and return its results."""
+    with tempfile.TemporaryDirectory(prefix='bee2_bench_') as folder:
+        generate(Path(folder, 'packages'), params)
+        proc = subprocess.run(
+            [sys.executable, '-m', 'bench.package_load', '--worker', folder],
+            cwd=folder,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    if proc.returncode != 0:
+        sys.stderr.buffer.write(proc.stderr)
+        raise RuntimeError(f'Benchmark worker failed with code {proc.returncode}!')
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def benchmark(name: str, params: PackageParams, repeat: int) -> Dict[str, Any]:
+    """Benchmark a package set, repeating it several times."""
+    runs = [run_worker(params) for _ in range(repeat)]
+    return {
+        'name': name,
+        'params': attrs.asdict(params),
+        'repeat': repeat,
+        'total': {
+            'min': min(run['total'] for run in runs),
+            'median': statistics.median(run['total'] for run in runs),
+        },
+        'peak_rss': max(run['peak_rss'] for run in runs),
+        'rss_before': min(run['rss_before'] for run in runs),
+        'types': {
+            obj_type: {
+                'count': count,
+                'ready': min(run['ready'].get(obj_type, 0.0) for run in runs),
+                'task_time': min(run['task_time'].get(obj_type, 0.0) for run in runs),
+            }
+            for obj_type, count in runs[0]['counts'].items()
+        },
+        'task_time': {
+            category: min(run['task_time'].get(category, 0.0) for run in runs)
+            for category in runs[0]['task_time']
+        },
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print the relative change in each set between two result files."""
+    old_sets = {result['name']: result for result in old['results']}
+    for result in new['results']:
+        try:
+            old_result = old_sets[result['name']]
+        except KeyError:
+            continue
+        if old_result['params'] != result['params']:
+            print(f'{result["name"]}: parameters differ, skipping.')
+            continue
+        old_time, new_time = old_result['total']['min'], result['total']['min']
+        old_rss, new_rss = old_result['peak_rss'], result['peak_rss']
+        print(
+            f'{result["name"]}: {old_time:.3f}s -> {new_time:.3f}s '
+            f'({(new_time - old_time) / old_time * 100:+.1f}%), '
+            f'RSS {old_rss / 2**20:.1f}MiB -> {new_rss / 2**20:.1f}MiB'
+        )
+        for category, new_cat in result['task_time'].items():
+            old_cat = old_result['task_time'].get(category)
+            if old_cat:
+                change = (new_cat - old_cat) / old_cat * 100
+                print(f'  {category:<20} {old_cat:8.4f}s -> {new_cat:8.4f}s ({change:+.1f}%)')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'sets', nargs='*', metavar='set', default=[],
+        help=f'The presets to run, defaults to all. Choices: {", ".join(PRESETS)}',
+    )
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('-c', '--compare', help='Compare results against this JSON file.')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times to load each set.')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        os.chdir(args.worker)
+        result = run_load(Path(args.worker, 'packages'))
+        # The app logs to stdout too, so the result is the last line.
+        print('\n' + json.dumps(result))
+        return
+
+    for name in args.sets:
+        if name not in PRESETS:
+            parser.error(f'Unknown preset "{name}"!')
+
+    results = []
+    for name in args.sets or PRESETS:
+        print(f'Benchmarking {name}...', file=sys.stderr)
+        results.append(benchmark(name, PRESETS[name], args.repeat))
+
+    output = {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(output, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('format') != FORMAT_VERSION:
+            raise ValueError(f'Cannot compare against format {old.get("format")}!')
+        compare(old, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """Defines the region of space items occupy and computes collisions."""
 from __future__ import annotations
 
+import array
 import operator
 from enum import Flag, auto as enum_auto
 from typing import Iterable, Iterator, Sequence, overload
@@ -423,3 +424,251 @@ class BBox:
         return self.with_points(self.mins - other, self.maxes - other)
 
     # radd/rsub intentionally omitted. Don't allow inverting, that's nonsensical.
+
+
+def _make_bbox(
+    min_x: int, min_y: int, min_z: int,
+    max_x: int, max_y: int, max_z: int,
+    contents: CollideType, name: str, tags: frozenset[str],
+) -> BBox:
+    """Construct a bounding box, skipping the validation and sorting in __init__.
+
+    The values must already be ordered and form a valid volume or plane.
+    """
+    bbox = BBox.__new__(BBox)
+    bbox.__attrs_init__(min_x, min_y, min_z, max_x, max_y, max_z, contents, name, tags)
+    return bbox
+
+
+class BBoxSet(Sequence[BBox]):
+    """A compact collection of bounding boxes, stored as parallel arrays.
+
+    The coordinates are stored in a single integer array (6 values per box),
+    with contents as their flag values. Names and tags are interned, so each box
+    only stores an index. Indexing or iterating produces regular BBox objects.
+    This allows transforming all the collisions for an item at once, without
+    allocating intermediate bounding boxes and vectors.
+    """
+    __slots__ = ['_coords', '_contents', '_name_ind', '_tag_ind', '_names', '_tags']
+    _coords: array.array[int]
+    _contents: array.array[int]
+    _name_ind: array.array[int]
+    _tag_ind: array.array[int]
+    _names: list[str]
+    _tags: list[frozenset[str]]
+
+    def __init__(self, bboxes: Iterable[BBox] = ()) -> None:
+        self._coords = array.array('l')
+        self._contents = array.array('L')
+        self._name_ind = array.array('L')
+        self._tag_ind = array.array('L')
+        self._names = []
+        self._tags = []
+        for bbox in bboxes:
+            self.append(bbox)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({list(self)!r})'
+
+    def __len__(self) -> int:
+        return len(self._contents)
+
+    @overload
+    def __getitem__(self, index: int) -> BBox: ...
+    @overload
+    def __getitem__(self, index: slice) -> BBoxSet: ...
+
+    def __getitem__(self, index: int | slice) -> BBox | BBoxSet:
+        """Fetch a bounding box, or a subset of them."""
+        if isinstance(index, slice):
+            return BBoxSet(map(self.__getitem__, range(len(self))[index]))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        off = 6 * index
+        return _make_bbox(
+            *self._coords[off:off + 6],
+            CollideType(self._contents[index]),
+            self._names[self._name_ind[index]],
+            self._tags[self._tag_ind[index]],
+        )
+
+    def __iter__(self) -> Iterator[BBox]:
+        coords = self._coords
+        names = self._names
+        tags = self._tags
+        for i, (contents, name_ind, tag_ind) in enumerate(zip(
+            self._contents, self._name_ind, self._tag_ind,
+        )):
+            off = 6 * i
+            yield _make_bbox(
+                *coords[off:off + 6],
+                CollideType(contents), names[name_ind], tags[tag_ind],
+            )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, BBoxSet):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def _intern_name(self, name: str) -> int:
+        """Return the index for this name, adding it if required."""
+        try:
+            return self._names.index(name)
+        except ValueError:
+            self._names.append(name)
+            return len(self._names) - 1
+
+    def _intern_tags(self, tags: frozenset[str]) -> int:
+        """Return the index for this set of tags, adding it if required."""
+        try:
+            return self._tags.index(tags)
+        except ValueError:
+            self._tags.append(tags)
+            return len(self._tags) - 1
+
+    def append(self, bbox: BBox) -> None:
+        """Add a bounding box to the end of the set."""
+        self._coords.extend((
+            bbox.min_x, bbox.min_y, bbox.min_z,
+            bbox.max_x, bbox.max_y, bbox.max_z,
+        ))
+        self._contents.append(bbox.contents.value)
+        self._name_ind.append(self._intern_name(bbox.name))
+        self._tag_ind.append(self._intern_tags(bbox.tags))
+
+    def extend(self, bboxes: Iterable[BBox]) -> None:
+        """Add several bounding boxes to the end of the set."""
+        for bbox in bboxes:
+            self.append(bbox)
+
+    def names(self) -> set[str]:
+        """Return all the item names used by bounding boxes in this set."""
+        return {self._names[ind] for ind in set(self._name_ind)}
+
+    def indexes_for_name(self, name: str) -> list[int]:
+        """Return the indexes of all the bounding boxes with this name."""
+        try:
+            name_ind = self._names.index(name)
+        except ValueError:
+            return []
+        return [i for i, ind in enumerate(self._name_ind) if ind == name_ind]
+
+    def _copy_with(self, coords: array.array[int], name: str | None) -> BBoxSet:
+        """Produce a new set with different coordinates and optionally a single name."""
+        result = BBoxSet.__new__(BBoxSet)
+        result._coords = coords
+        result._contents = array.array('L', self._contents)
+        result._tags = self._tags.copy()
+        result._tag_ind = array.array('L', self._tag_ind)
+        if name is None:
+            result._names = self._names.copy()
+            result._name_ind = array.array('L', self._name_ind)
+        else:
+            result._names = [name]
+            result._name_ind = array.array('L', [0]) * len(self)
+        return result
+
+    def transformed(
+        self,
+        orient: Angle | Matrix,
+        origin: Vec | tuple[float, float, float] = (0.0, 0.0, 0.0),
+        name: str | None = None,
+    ) -> BBoxSet:
+        """Rotate then translate every bounding box, returning a new set.
+
+        This is equivalent to ``(bbox @ orient + origin).with_attrs(name=name)`` for each box,
+        but the matrix is only analysed once. If name is provided, all boxes are renamed.
+        """
+        m = to_matrix(orient)
+        ox, oy, oz = origin
+        # For each output axis, compute which input coordinates (as offsets into the 6 values)
+        # contribute to the min and max, along with the coefficient. Zero coefficients are
+        # skipped, so for 90-degree rotations each axis is a single multiplication.
+        axes: list[list[tuple[float, int, int]]] = []
+        for out_ax in range(3):
+            terms = []
+            for in_ax in range(3):
+                coef = m[in_ax, out_ax]
+                if coef > 0.0:
+                    terms.append((coef, in_ax, in_ax + 3))
+                elif coef < 0.0:
+                    terms.append((coef, in_ax + 3, in_ax))
+            axes.append(terms)
+        terms_x, terms_y, terms_z = axes
+
+        old = self._coords
+        coords: array.array[int] = array.array('l')
+        for off in range(0, len(old), 6):
+            box = old[off:off + 6]
+            # Round twice to match rotating then translating individual bounding boxes.
+            coords.extend((
+                round(round(sum([coef * box[lo] for coef, lo, hi in terms_x])) + ox),
+                round(round(sum([coef * box[lo] for coef, lo, hi in terms_y])) + oy),
+                round(round(sum([coef * box[lo] for coef, lo, hi in terms_z])) + oz),
+                round(round(sum([coef * box[hi] for coef, lo, hi in terms_x])) + ox),
+                round(round(sum([coef * box[hi] for coef, lo, hi in terms_y])) + oy),
+                round(round(sum([coef * box[hi] for coef, lo, hi in terms_z])) + oz),
+            ))
+        return self._copy_with(coords, name)
+
+    def intersections(self, other: BBoxSet) -> Iterator[tuple[int, int, BBox]]:
+        """Test every box in this set against every box in the other.
+
+        For each pair which collide, this yields the two indexes and the overlapping region,
+        as returned by BBox.intersect().
+        """
+        if not self or not other:
+            return
+        # First find the overall bounds of the other set, to quickly discard boxes.
+        oth_coords = other._coords
+        oth_min_x = min(oth_coords[0::6])
+        oth_min_y = min(oth_coords[1::6])
+        oth_min_z = min(oth_coords[2::6])
+        oth_max_x = max(oth_coords[3::6])
+        oth_max_y = max(oth_coords[4::6])
+        oth_max_z = max(oth_coords[5::6])
+        oth_contents = other._contents
+        coords = self._coords
+        for i, contents in enumerate(self._contents):
+            off = 6 * i
+            min_x, min_y, min_z, max_x, max_y, max_z = coords[off:off + 6]
+            if (
+                max_x < oth_min_x or min_x > oth_max_x or
+                max_y < oth_min_y or min_y > oth_max_y or
+                max_z < oth_min_z or min_z > oth_max_z
+            ):
+                continue
+            for j, oth_cont in enumerate(oth_contents):
+                if not contents & oth_cont:
+                    continue
+                oth_off = 6 * j
+                (
+                    b_min_x, b_min_y, b_min_z,
+                    b_max_x, b_max_y, b_max_z,
+                ) = oth_coords[oth_off:oth_off + 6]
+                int_min_x = max(min_x, b_min_x)
+                int_max_x = min(max_x, b_max_x)
+                if int_min_x > int_max_x:
+                    continue
+                int_min_y = max(min_y, b_min_y)
+                int_max_y = min(max_y, b_max_y)
+                if int_min_y > int_max_y:
+                    continue
+                int_min_z = max(min_z, b_min_z)
+                int_max_z = min(max_z, b_max_z)
+                if int_min_z > int_max_z:
+                    continue
+                if (
+                    (int_min_x != int_max_x) + (int_min_y != int_max_y)
+                    + (int_min_z != int_max_z)
+                ) < 2:  # Edge or corner, don't count those.
+                    continue
+                yield i, j, _make_bbox(
+                    int_min_x, int_min_y, int_min_z,
+                    int_max_x, int_max_y, int_max_z,
+                    CollideType(contents),
+                    self._names[self._name_ind[i]],
+                    self._tags[self._tag_ind[i]],
+                )
@@ -0,0 +1,307 @@
+"""Records statistics about each compile, for display and for tracking over time.
+
+The VBSP hook starts a new record for each map, then the VRAD hook adds its
+own section to the same file. Each hook stores how long its stages took, the
+various counts it found and the peak memory used. If enabled in compile.cfg,
+the complete record is also appended to a history file next to it, one JSON
+object per line.
+
+Optionally, memory usage can be traced as well. That uses tracemalloc, so it
+slows down the compile considerably.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from pathlib import Path
+import gc
+import json
+import sys
+import time
+import tracemalloc
+import types
+
+from atomicwrites import atomic_write
+import attrs
+import srctools.logger
+
+import utils
+
+
+LOGGER = srctools.logger.get_logger(__name__)
+# Increment if the format changes incompatibly.
+FORMAT_VERSION = 1
+# Our source folder, used to name subsystems.
+SRC_ROOT = Path(__file__).parent
+# Objects which are shared with everything else, so are not considered
+# part of the size of a cache.
+_SHARED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType, types.CodeType, types.FrameType,
+)
+
+
+def metrics_path() -> Path:
+    """The file holding the metrics for the last compile."""
+    return utils.conf_location('config/compile_metrics.json')
+
+
+def peak_memory() -> int:
+    """Return the peak resident memory of this process, in bytes."""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            """PROCESS_MEMORY_COUNTERS."""
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters), counters.cb,
+        )
+        return counters.PeakWorkingSetSize
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, Mac bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def subsystem(filename: str) -> str:
+    """Determine which module or package allocations from a file belong to.
+
+    Our own files are named by module, libraries by their top-level package.
+    """
+    path = Path(filename)
+    if 'site-packages' in path.parts:
+        parts = path.parts[path.parts.index('site-packages') + 1:]
+        return parts[0].split('.')[0] if parts else '<python>'
+    if path.is_absolute():
+        try:
+            path = path.relative_to(SRC_ROOT)
+        except ValueError:
+            return '<python>'
+    if path.name == '__init__.py':
+        path = path.parent
+    return '.'.join(path.with_suffix('').parts) or '<python>'
+
+
+def retained_size(obj: object, shared: Tuple[type, ...] = ()) -> int:
+    """Compute the total size of an object, and everything it refers to.
+
+    Types, modules, functions and instances of the shared types are skipped,
+    since they are not specific to this object.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if id(cur) in seen or isinstance(cur, _SHARED_TYPES) or (shared and isinstance(cur, shared)):
+            continue
+        seen.add(id(cur))
+        total += sys.getsizeof(cur)
+        stack.extend(gc.get_referents(cur))
+    return total
+
+
+@attrs.define
+class MemoryTracer:
+    """Uses tracemalloc to record memory usage after each stage.
+
+    Each snapshot logs the allocation sites which grew the most, the growth for
+    each subsystem and the retained sizes of the provided global caches.
+    """
+    # Functions returning each global cache to measure.
+    caches: Dict[str, Callable[[], object]] = attrs.Factory(dict)
+    # Objects of these types are not counted in the caches.
+    shared: Tuple[type, ...] = ()
+    # The number of allocation sites to report.
+    top: int = 10
+    stages: Dict[str, Dict[str, Any]] = attrs.Factory(dict)
+    _last: Optional[tracemalloc.Snapshot] = attrs.field(init=False, default=None)
+
+    def start(self) -> None:
+        """Begin tracing allocations."""
+        LOGGER.warning('Tracing memory usage, this is slow!')
+        tracemalloc.start()
+
+    def snapshot(self, stage: str) -> None:
+        """Record memory usage after this stage."""
+        if not tracemalloc.is_tracing():
+            return
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+
+        subsystems: Dict[str, int] = {}
+        for stat in snap.statistics('filename'):
+            name = subsystem(stat.traceback[0].filename)
+            subsystems[name] = subsystems.get(name, 0) + stat.size
+        growth: Dict[str, int] = {}
+        if self._last is not None:
+            for stat in self._last.statistics('filename'):
+                name = subsystem(stat.traceback[0].filename)
+                growth[name] = growth.get(name, 0) - stat.size
+        for name, size in subsystems.items():
+            growth[name] = growth.get(name, 0) + size
+
+        if self._last is not None:
+            diffs = snap.compare_to(self._last, 'lineno')
+            top_sites = [
+                (str(diff.traceback[0]), diff.size, diff.size_diff)
+                for diff in diffs[:self.top]
+            ]
+        else:
+            top_sites = [
+                (str(stat.traceback[0]), stat.size, stat.size)
+                for stat in snap.statistics('lineno')[:self.top]
+            ]
+        caches = {
+            name: retained_size(func(), self.shared)
+            for name, func in self.caches.items()
+        }
+        self._last = snap
+
+        LOGGER.info(
+            'Memory after {}: {:.1f}MB (peak {:.1f}MB)\n'
+            'Growth by subsystem:\n{}\n'
+            'Top allocation sites:\n{}\n'
+            'Caches:\n{}',
+            stage, current / 1e6, peak / 1e6,
+            '\n'.join([
+                f' - {name}: {size / 1e6:+.2f}MB'
+                for name, size in sorted(growth.items(), key=lambda t: -abs(t[1]))[:self.top]
+            ]),
+            '\n'.join([
+                f' - {site}: {size / 1e6:.2f}MB ({diff / 1e6:+.2f}MB)'
+                for site, size, diff in top_sites
+            ]),
+            '\n'.join([
+                f' - {name}: {size / 1e6:.2f}MB'
+                for name, size in caches.items()
+            ]),
+        )
+        self.stages[stage] = {
+            'current': current,
+            'peak': peak,
+            'subsystems': subsystems,
+            'growth': {name: size for name, size in growth.items() if size},
+            'top_sites': [
+                {'site': site, 'size': size, 'growth': diff}
+                for site, size, diff in top_sites
+            ],
+            'caches': caches,
+        }
+
+    def stop(self) -> None:
+        """Stop tracing allocations."""
+        self._last = None
+        tracemalloc.stop()
+
+
+@attrs.define
+class CompileMetrics:
+    """The metrics recorded by one of the compiler hooks.
+
+    Stages are timed by calling lap() after each finishes, which records the
+    time since the previous lap. If a tracer is present, memory usage is
+    recorded then too.
+    """
+    compiler: str
+    stages: Dict[str, float] = attrs.Factory(dict)
+    counts: Dict[str, int] = attrs.Factory(dict)
+    success: bool = False
+    tracer: Optional[MemoryTracer] = None
+    _start: float = attrs.field(init=False, factory=time.perf_counter)
+    _last: float = attrs.field(init=False)
+
+    @_last.default
+    def _default_last(self) -> float:
+        return self._start
+
+    def lap(self, stage: str) -> None:
+        """Record the time since the last lap as the duration of this stage."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        if self.tracer is not None:
+            self.tracer.snapshot(stage)
+            # Don't count the time taken by the tracer.
+            now = time.perf_counter()
+        self._last = now
+
+    def skip(self) -> None:
+        """Don't include the time since the last lap in any stage."""
+        self._last = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Produce the JSON representation of these metrics."""
+        result = {
+            'success': self.success,
+            'total_time': time.perf_counter() - self._start,
+            'stages': self.stages,
+            'counts': self.counts,
+            'peak_memory': peak_memory(),
+        }
+        if self.tracer is not None:
+            result['memory'] = self.tracer.stages
+        return result
+
+
+def write(
+    metrics: CompileMetrics,
+    map_name: str,
+    history: bool = False,
+    path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """Save the metrics for a hook, returning the complete record.
+
+    If the existing file is for the same map, this hook's section is added
+    to it. Otherwise, a new record is started. If history is true, the
+    record is also appended to the history file.
+    """
+    if path is None:
+        path = metrics_path()
+    record: Optional[Dict[str, Any]] = None
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError):
+        LOGGER.warning('Could not read previous metrics:', exc_info=True)
+
+    if (
+        not isinstance(record, dict)
+        or record.get('format') != FORMAT_VERSION
+        or record.get('map') != map_name
+        or metrics.compiler in record  # Recompiling the same map.
+    ):
+        record = {
+            'format': FORMAT_VERSION,
+            'map': map_name,
+            'version': utils.BEE_VERSION,
+            'timestamp': time.time(),
+        }
+    record[metrics.compiler] = metrics.as_dict()
+
+    try:
+        with atomic_write(path, overwrite=True, encoding='utf8') as f:
+            json.dump(record, f, indent=2, sort_keys=True)
+        if history:
+            with open(path.with_suffix('.jsonl'), 'a', encoding='utf8') as f:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+    except OSError:
+        # Never fail the compile because of this.
+        LOGGER.warning('Could not save compile metrics:', exc_info=True)
+    return record
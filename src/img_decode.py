@@ -0,0 +1,57 @@
+"""Decodes package images.
+
+This is separate from app.img so it can be run in worker processes, without
+needing to import the rest of the UI. Decoding VTFs is partly done in Python,
+so doing it in another process keeps the UI responsive.
+"""
+from typing import Tuple
+import io
+
+from PIL import Image
+from srctools.vtf import VTF, VTFFlags
+
+
+def decode(data: bytes, ext: str, width: int, height: int, resize_algo: int) -> Image.Image:
+    """Decode an image file, then resize if required.
+
+    If a width and height are specified, VTF files use the mipmap closest to
+    that size.
+    """
+    image: Image.Image
+    if ext.casefold() == 'vtf':
+        vtf = VTF.read(io.BytesIO(data))
+        mipmap = 0
+        # If resizing, pick the mipmap equal to or slightly larger than
+        # the desired size. With powers of two, most cases we don't
+        # need to resize at all.
+        if width > 0 and height > 0 and VTFFlags.NO_MIP not in vtf.flags:
+            for mipmap in range(vtf.mipmap_count):
+                mip_width = max(vtf.width >> mipmap, 1)
+                mip_height = max(vtf.height >> mipmap, 1)
+                if mip_width < width or mip_height < height:
+                    mipmap = max(0, mipmap - 1)
+                    break
+        image = vtf.get(mipmap=mipmap).to_PIL()
+    else:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+
+    if width > 0 and height > 0 and (width, height) != image.size:
+        image = image.resize((width, height), resample=resize_algo)
+    return image
+
+
+def decode_raw(
+    data: bytes, ext: str,
+    width: int, height: int,
+    resize_algo: int,
+) -> Tuple[str, Tuple[int, int], bytes]:
+    """Decode an image, returning the mode, size and pixel data.
+
+    This is run in the worker processes. The result can be passed to
+    Image.frombytes(), which is much cheaper to send back than the image.
+    """
+    image = decode(data, ext, width, height, resize_algo)
+    return image.mode, image.size, image.tobytes()
@@ -204,6 +204,10 @@ class NoVPKExport(Exception):
     """Raised to indicate that VPK files weren't copied."""
 
 
+class NoPackagesError(Exception):
+    """Raised when loading non-interactively, if required packages are missing."""
+
+
 T = TypeVar('T')
 PakT = TypeVar('PakT', bound='PakObject')
 
@@ -474,8 +478,11 @@ async def find_packages(nursery: trio.Nursery, packset: PackagesSet, pak_dir: Pa
         LOGGER.info('No packages in folder {}!', pak_dir)
 
 
-def no_packages_err(pak_dirs: list[Path], msg: str) -> NoReturn:
-    """Show an error message indicating no packages are present."""
+def no_packages_err(pak_dirs: list[Path], msg: str, interactive: bool = True) -> NoReturn:
+    """Show an error message indicating no packages are present.
+
+    If interactive is false, NoPackagesError is raised instead.
+    """
     from tkinter import messagebox
     import sys
     # We don't have a packages directory!
@@ -492,6 +499,8 @@ def no_packages_err(pak_dirs: list[Path], msg: str) -> NoReturn:
         f'and place them in {trailer}'
     )
     LOGGER.error(message)
+    if not interactive:
+        raise NoPackagesError(message)
     messagebox.showerror(
         title='BEE2 - Invalid Packages Directory!',
         message=message,
@@ -505,8 +514,13 @@ async def load_packages(
     loader: LoadScreen,
     has_mel_music: bool=False,
     has_tag_music: bool=False,
+    interactive: bool = True,
 ) -> None:
-    """Scan and read in all packages."""
+    """Scan and read in all packages.
+
+    If interactive is false, missing packages raise NoPackagesError instead of
+    showing a messagebox and quitting.
+    """
     async with trio.open_nursery() as find_nurs:
         for pak_dir in pak_dirs:
             find_nurs.start_soon(find_packages, find_nurs, packset, pak_dir)
@@ -515,14 +529,15 @@ async def load_packages(
     loader.set_length("PAK", pack_count)
 
     if pack_count == 0:
-        no_packages_err(pak_dirs, 'No packages found!')
+        no_packages_err(pak_dirs, 'No packages found!', interactive)
 
     # We must have the clean style package.
     if CLEAN_PACKAGE not in packset.packages:
         no_packages_err(
             pak_dirs,
             'No Clean Style package! This is required for some '
-            'essential resources and objects.'
+            'essential resources and objects.',
+            interactive,
         )
 
     # Ensure all objects are in the dicts.
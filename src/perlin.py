@@ -301,6 +301,145 @@ class SimplexNoise(BaseNoise):
 
 		return noise * 32.0
 
+	def noise2_array(self, xs, ys):
+		"""2D Perlin simplex noise, evaluated for many points at once.
+
+		xs and ys are sequences of coordinates. A list is returned containing
+		the same values noise2() would produce for each pair.
+		"""
+		perm = self.permutation
+		period = self.period
+		grad3 = _GRAD3
+		F2 = _F2
+		G2 = _G2
+		result = []
+		append = result.append
+		for x, y in zip(xs, ys):
+			s = (x + y) * F2
+			i = floor(x + s)
+			j = floor(y + s)
+			t = (i + j) * G2
+			x0 = x - (i - t)
+			y0 = y - (j - t)
+
+			if x0 > y0:
+				i1 = 1; j1 = 0
+			else:
+				i1 = 0; j1 = 1
+
+			x1 = x0 - i1 + G2
+			y1 = y0 - j1 + G2
+			x2 = x0 + G2 * 2.0 - 1.0
+			y2 = y0 + G2 * 2.0 - 1.0
+
+			ii = int(i) % period
+			jj = int(j) % period
+
+			tt = 0.5 - x0**2 - y0**2
+			if tt > 0:
+				g = grad3[perm[ii + perm[jj]] % 12]
+				noise = tt**4 * (g[0] * x0 + g[1] * y0)
+			else:
+				noise = 0.0
+
+			tt = 0.5 - x1**2 - y1**2
+			if tt > 0:
+				g = grad3[perm[ii + i1 + perm[jj + j1]] % 12]
+				noise += tt**4 * (g[0] * x1 + g[1] * y1)
+
+			tt = 0.5 - x2**2 - y2**2
+			if tt > 0:
+				g = grad3[perm[ii + 1 + perm[jj + 1]] % 12]
+				noise += tt**4 * (g[0] * x2 + g[1] * y2)
+
+			append(noise * 70.0)
+		return result
+
+	def noise3_array(self, xs, ys, zs):
+		"""3D Perlin simplex noise, evaluated for many points at once.
+
+		xs, ys and zs are sequences of coordinates. A list is returned
+		containing the same values noise3() would produce for each point.
+		"""
+		perm = self.permutation
+		period = self.period
+		grad3 = _GRAD3
+		F3 = _F3
+		G3 = _G3
+		G3_2 = 2.0 * _G3
+		G3_3 = 3.0 * _G3
+		result = []
+		append = result.append
+		for x, y, z in zip(xs, ys, zs):
+			s = (x + y + z) * F3
+			i = floor(x + s)
+			j = floor(y + s)
+			k = floor(z + s)
+			t = (i + j + k) * G3
+			x0 = x - (i - t)
+			y0 = y - (j - t)
+			z0 = z - (k - t)
+
+			if x0 >= y0:
+				if y0 >= z0:
+					i1 = 1; j1 = 0; k1 = 0
+					i2 = 1; j2 = 1; k2 = 0
+				elif x0 >= z0:
+					i1 = 1; j1 = 0; k1 = 0
+					i2 = 1; j2 = 0; k2 = 1
+				else:
+					i1 = 0; j1 = 0; k1 = 1
+					i2 = 1; j2 = 0; k2 = 1
+			else:
+				if y0 < z0:
+					i1 = 0; j1 = 0; k1 = 1
+					i2 = 0; j2 = 1; k2 = 1
+				elif x0 < z0:
+					i1 = 0; j1 = 1; k1 = 0
+					i2 = 0; j2 = 1; k2 = 1
+				else:
+					i1 = 0; j1 = 1; k1 = 0
+					i2 = 1; j2 = 1; k2 = 0
+
+			ii = int(i) % period
+			jj = int(j) % period
+			kk = int(k) % period
+
+			# Skip computing gradients for corners which don't contribute.
+			tt = 0.6 - x0**2 - y0**2 - z0**2
+			if tt > 0:
+				g = grad3[perm[ii + perm[jj + perm[kk]]] % 12]
+				noise = tt**4 * (g[0] * x0 + g[1] * y0 + g[2] * z0)
+			else:
+				noise = 0.0
+
+			x1 = x0 - i1 + G3
+			y1 = y0 - j1 + G3
+			z1 = z0 - k1 + G3
+			tt = 0.6 - x1**2 - y1**2 - z1**2
+			if tt > 0:
+				g = grad3[perm[ii + i1 + perm[jj + j1 + perm[kk + k1]]] % 12]
+				noise += tt**4 * (g[0] * x1 + g[1] * y1 + g[2] * z1)
+
+			x2 = x0 - i2 + G3_2
+			y2 = y0 - j2 + G3_2
+			z2 = z0 - k2 + G3_2
+			tt = 0.6 - x2**2 - y2**2 - z2**2
+			if tt > 0:
+				g = grad3[perm[ii + i2 + perm[jj + j2 + perm[kk + k2]]] % 12]
+				noise += tt**4 * (g[0] * x2 + g[1] * y2 + g[2] * z2)
+
+			x3 = x0 - 1.0 + G3_3
+			y3 = y0 - 1.0 + G3_3
+			z3 = z0 - 1.0 + G3_3
+			tt = 0.6 - x3**2 - y3**2 - z3**2
+			if tt > 0:
+				g = grad3[perm[ii + 1 + perm[jj + 1 + perm[kk + 1]]] % 12]
+				noise += tt**4 * (g[0] * x3 + g[1] * y3 + g[2] * z3)
+
+			append(noise * 32.0)
+		return result
+
 
 def lerp(t, a, b):
 	return a + t * (b - a)
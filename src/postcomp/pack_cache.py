@@ -0,0 +1,165 @@
+"""Cache the dependencies of packed files between compiles.
+
+Evaluating dependencies requires parsing every material and model in the map.
+Previewing the same chamber repeatedly parses the same files each time, so
+the files each one causes to be packed are recorded. If none of the files
+involved have changed, the recorded calls are replayed instead of parsing.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+import os
+import pickle
+
+from srctools.filesys import FileSystemChain
+from srctools.packlist import PackList, PackFile, FileType
+import srctools.logger
+
+
+__all__ = ['CachedPackList']
+LOGGER = srctools.logger.get_logger(__name__)
+# Increment if the format changes, to discard old caches.
+CACHE_VERSION = 1
+
+# The filesystem and cache key for a file, or None if missing.
+_FileKey = Optional[Tuple[str, int]]
+# A recorded call to pack_file(), pack_soundscript() or pack_particle().
+_Call = Union[
+    Tuple[str, str, FileType, Optional[Tuple[int, ...]], bool],
+    Tuple[str, str],
+    Tuple[str, str, bool],
+]
+# (type, filename, optional, skinset) -> (source files, calls made)
+_CacheKey = Tuple[FileType, str, bool, Optional[Tuple[int, ...]]]
+_CacheEntry = Tuple[Dict[str, _FileKey], List[_Call]]
+
+
+class CachedPackList(PackList):
+    """A packlist which remembers the dependencies of materials and models."""
+    def __init__(self, fsys: FileSystemChain) -> None:
+        super().__init__(fsys)
+        self._dep_cache: Dict[_CacheKey, _CacheEntry] = {}
+        # While evaluating a file, the calls made.
+        self._recording: Optional[List[_Call]] = None
+        # Set if the current file's dependencies can't be cached.
+        self._uncacheable = False
+        self.cache_hits = self.cache_misses = 0
+
+    def load_dep_cache(self, filename: Union[str, os.PathLike[str]]) -> None:
+        """Load the cache data. If the file is invalid, this does nothing."""
+        try:
+            with open(filename, 'rb') as f:
+                version, data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            LOGGER.warning('Could not parse dependency cache "{}"!', filename, exc_info=True)
+            return
+        if version == CACHE_VERSION:
+            self._dep_cache = data
+
+    def save_dep_cache(self, filename: Union[str, os.PathLike[str]]) -> None:
+        """Write back new cache data."""
+        # No need to be atomic, if we corrupt this it'll just be rebuilt.
+        with open(filename, 'wb') as f:
+            pickle.dump((CACHE_VERSION, self._dep_cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _file_key(self, filename: str) -> _FileKey:
+        """Identify the current version of a file."""
+        try:
+            file = self.fsys[filename]
+        except FileNotFoundError:
+            return None
+        return file.sys.path, file.cache_key()
+
+    def pack_file(
+        self,
+        filename: str | os.PathLike[str],
+        data_type: FileType = FileType.GENERIC,
+        data: Optional[bytes] = None,
+        skinset: Optional[Set[int]] = None,
+        optional: bool = False,
+    ) -> None:
+        """Queue the given file to be packed, recording it if required."""
+        if self._recording is not None:
+            if data is not None:
+                # Can't be reproduced from the cache.
+                self._uncacheable = True
+            else:
+                self._recording.append((
+                    'file', os.fspath(filename), data_type,
+                    tuple(sorted(skinset)) if skinset is not None else None,
+                    optional,
+                ))
+        super().pack_file(filename, data_type, data, skinset, optional)
+
+    def pack_soundscript(self, sound_name: str) -> None:
+        """Pack a soundscript, recording it if required."""
+        if self._recording is not None:
+            self._recording.append(('sound', sound_name))
+        super().pack_soundscript(sound_name)
+
+    def pack_particle(self, particle_name: str, preload: bool = False) -> None:
+        """Pack a particle system, recording it if required."""
+        if self._recording is not None:
+            self._recording.append(('particle', particle_name, preload))
+        super().pack_particle(particle_name, preload)
+
+    def _get_material_files(self, file: PackFile) -> None:
+        """Find any needed files for a material, using the cache if possible."""
+        self._eval_cached(file, super()._get_material_files)
+
+    def _get_model_files(self, file: PackFile) -> None:
+        """Find any needed files for a model, using the cache if possible."""
+        self._eval_cached(file, super()._get_model_files)
+
+    def _eval_cached(self, file: PackFile, func: Callable[[PackFile], None]) -> None:
+        """Replay the cached dependencies for this file, or evaluate and record them."""
+        if file.data is not None:
+            # Generated files can't be cached.
+            func(file)
+            return
+        skinset = self.skinsets.get(file.filename)
+        key: _CacheKey = (
+            file.type, file.filename, file.optional,
+            tuple(sorted(skinset)) if skinset is not None else None,
+        )
+        try:
+            sources, calls = self._dep_cache[key]
+        except KeyError:
+            pass
+        else:
+            if all(self._file_key(name) == file_key for name, file_key in sources.items()):
+                self.cache_hits += 1
+                for call in calls:
+                    if call[0] == 'file':
+                        _, filename, data_type, call_skins, optional = call
+                        super().pack_file(
+                            filename, data_type,
+                            skinset=set(call_skins) if call_skins is not None else None,
+                            optional=optional,
+                        )
+                    elif call[0] == 'sound':
+                        super().pack_soundscript(call[1])
+                    else:
+                        super().pack_particle(call[1], call[2])
+                return
+
+        self.cache_misses += 1
+        self._recording = recording = []
+        self._uncacheable = False
+        try:
+            func(file)
+        finally:
+            self._recording = None
+        file_key = self._file_key(file.filename)
+        if self._uncacheable or file_key is None:
+            # Missing files need to be warned about each time.
+            return
+        # The file itself and everything it referenced must be unchanged for
+        # the cache to be valid, this covers patch materials and model components.
+        sources = {file.filename: file_key}
+        for call in recording:
+            if call[0] == 'file':
+                sources[call[1]] = self._file_key(call[1])
+        self._dep_cache[key] = (sources, recording)
@@ -0,0 +1,120 @@
+"""Pack files into the BSP, reading them in parallel.
+
+This matches PackList.pack_into_zip(), but the files are read from disk in a
+thread pool. Reading releases the GIL, so this overlaps the I/O for the many
+small files in a typical map. The zip is then assembled in the same order as
+the serial version, so the output is identical.
+
+Files are always stored uncompressed - Portal 2 can't read compressed pakfile
+entries.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from zipfile import ZipFile, ZIP_STORED
+import shutil
+
+from srctools.bsp import BSP
+from srctools.filesys import File, FileSystem, VPKFileSystem
+from srctools.packlist import PackList
+import srctools.logger
+
+
+__all__ = ['pack_into_zip']
+LOGGER = srctools.logger.get_logger(__name__)
+# Reading is I/O bound, so more threads than cores is fine.
+MAX_WORKERS = 8
+
+
+def _read_file(file: File) -> bytes:
+    """Read the contents of a file."""
+    with file.open_bin() as f:
+        return f.read()
+
+
+def pack_into_zip(
+    packlist: PackList,
+    bsp: BSP,
+    *,
+    whitelist: Iterable[FileSystem] = (),
+    blacklist: Iterable[FileSystem] = (),
+    dump_loc: Optional[Path] = None,
+    ignore_vpk: bool = True,
+    workers: int = MAX_WORKERS,
+) -> None:
+    """Pack all the packlist's files into the packfile in the BSP.
+
+    The parameters match PackList.pack_into_zip().
+    """
+    fsys = packlist.fsys
+    allowed: Set[FileSystem] = {sys for sys, _ in fsys.systems}
+    if ignore_vpk:
+        allowed = {sys for sys in allowed if not isinstance(sys, VPKFileSystem)}
+    allowed.update(whitelist)
+    allowed.difference_update(blacklist)
+
+    if dump_loc is not None:
+        # Always write to a subfolder named after the map.
+        dump_loc /= Path(bsp.filename).stem
+        LOGGER.info('Dumping pakfile to "{}"..', dump_loc)
+        shutil.rmtree(dump_loc, ignore_errors=True)
+
+    # Casefolded name -> (original name, data). Files to be read are
+    # added with empty data, so the order matches the serial version.
+    packed_files: Dict[str, Tuple[str, bytes]] = {}
+    to_read: List[Tuple[str, File]] = []
+
+    for info in bsp.pakfile.infolist():
+        packed_files[info.filename.casefold()] = (info.filename, bsp.pakfile.read(info))
+
+    for file in packlist:
+        fname = file.filename.replace('\\', '/')
+        if file.data is not None:
+            LOGGER.debug('CUSTOM DATA: {}', fname)
+            packed_files[fname.casefold()] = (fname, file.data)
+            _dump(dump_loc, fname, file.data)
+            continue
+
+        try:
+            sys_file = fsys[file.filename]
+        except FileNotFoundError:
+            if not file.optional and fname.casefold() not in packed_files:
+                LOGGER.warning('WARNING: "{}" not packed!', file.filename)
+            continue
+
+        if fname.casefold().endswith('.bik'):
+            # BINK cannot be packed, always skip.
+            LOGGER.debug('EXT:  {}', fname)
+            continue
+
+        if fsys.get_system(sys_file) in allowed:
+            LOGGER.debug('ADD:  {}', fname)
+            packed_files[fname.casefold()] = (fname, b'')
+            to_read.append((fname, sys_file))
+        else:
+            LOGGER.debug('SKIP: {}', fname)
+
+    LOGGER.info('Reading {} files to pack...', len(to_read))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        contents = pool.map(_read_file, [sys_file for _, sys_file in to_read])
+        for (fname, _), data in zip(to_read, contents):
+            packed_files[fname.casefold()] = (fname, data)
+            _dump(dump_loc, fname, data)
+
+    LOGGER.info('Writing packfile...')
+    # Note no with statement, the BSP takes ownership and needs it open.
+    new_zip = ZipFile(BytesIO(), 'w', compression=ZIP_STORED)
+    for fname, data in packed_files.values():
+        new_zip.writestr(fname, data)
+    bsp.pakfile = new_zip
+
+
+def _dump(dump_loc: Optional[Path], fname: str, data: bytes) -> None:
+    """If enabled, also write the file to the dump folder."""
+    if dump_loc is not None:
+        path = dump_loc / fname
+        path.parent.mkdir(exist_ok=True, parents=True)
+        path.write_bytes(data)
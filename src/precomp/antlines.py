@@ -14,6 +14,8 @@ import consts
 
 
 LOGGER = logger.get_logger(__name__)
+# Added to coordinates when packing points, so they're always positive.
+_KEY_OFFSET = 1 << 20
 
 
 class SegType(Enum):
@@ -246,7 +248,7 @@ class Antline:
                 pos[v_axis] = pos[v_axis] // 128 * 128 + 64
                 pos -= 64 * seg.normal
                 try:
-                    tile = tiling.TILES[pos.as_tuple(), seg.normal.as_tuple()]
+                    tile = tiling.TILES[pos, seg.normal]
                 except KeyError:
                     pass
                 else:
@@ -341,6 +343,18 @@ class Antline:
         )
 
 
+def _join_key(x: float, y: float, z: float) -> int:
+    """Pack a point into a single integer, for use as a dict key.
+
+    Each axis is rounded, then offset to be positive and given 21 bits.
+    """
+    return (
+        (round(x) + _KEY_OFFSET) << 42
+        | (round(y) + _KEY_OFFSET) << 21
+        | (round(z) + _KEY_OFFSET)
+    )
+
+
 def parse_antlines(vmf: VMF) -> tuple[
     dict[str, list[Antline]],
     dict[int, list[Segment]]
@@ -362,7 +376,8 @@ def parse_antlines(vmf: VMF) -> tuple[
 
     # Points on antlines where two can connect. For corners that's each side, for straight it's
     # each end. Combine that with the targetname, so we only join related antlines.
-    join_points: dict[tuple[str, float, float, float], Segment] = {}
+    # The points are packed into a single integer with _join_key().
+    join_points: dict[tuple[str, int], Segment] = {}
 
     mat_straight = consts.Antlines.STRAIGHT
     mat_corner = consts.Antlines.CORNER
@@ -381,11 +396,13 @@ def parse_antlines(vmf: VMF) -> tuple[
             start = end = origin
 
             # One on each side - we know the size.
+            left = orient.left(8.0)
+            forward = orient.forward(8.0)
             points = [
-                origin + orient.left(-8.0),
-                origin + orient.left(+8.0),
-                origin + orient.forward(-8.0),
-                origin + orient.forward(+8.0),
+                _join_key(origin.x - left.x, origin.y - left.y, origin.z - left.z),
+                _join_key(origin.x + left.x, origin.y + left.y, origin.z + left.z),
+                _join_key(origin.x - forward.x, origin.y - forward.y, origin.z - forward.z),
+                _join_key(origin.x + forward.x, origin.y + forward.y, origin.z + forward.z),
             ]
         elif mat == mat_straight:
             seg_type = SegType.STRAIGHT
@@ -415,7 +432,7 @@ def parse_antlines(vmf: VMF) -> tuple[
                 start += offset
                 end -= offset
 
-                points = [start, end]
+                points = [_join_key(*start), _join_key(*end)]
         else:
             # It's not an antline.
             continue
@@ -429,10 +446,7 @@ def parse_antlines(vmf: VMF) -> tuple[
         for point in points:
             # Lookup the point to see if we've already checked it.
             # If not, write us into that spot.
-            neighbour = join_points.setdefault(
-                (over_name, ) + point.as_tuple(),
-                seg,
-            )
+            neighbour = join_points.setdefault((over_name, point), seg)
             if neighbour is seg:
                 # None found
                 continue
@@ -458,12 +472,15 @@ def parse_antlines(vmf: VMF) -> tuple[
             continue
         # Found a start point!
         segments = [start_seg]
+        # Check membership with a set, long antlines would be quadratic otherwise.
+        visited = {start_seg}
 
         for segment in segments:
             neighbours = overlay_joins.pop(segment)
             # Except KeyError: this segment's already done??
             for neighbour in neighbours:
-                if neighbour not in segments:
+                if neighbour not in visited:
+                    visited.add(neighbour)
                     segments.append(neighbour)
 
         antlines.setdefault(over_name, []).append(Antline(over_name, segments))
@@ -475,7 +492,7 @@ def parse_antlines(vmf: VMF) -> tuple[
 def fix_single_straight(
     seg: Segment,
     over_name: str,
-    join_points: dict[tuple[str, float, float, float], Segment],
+    join_points: dict[tuple[str, int], Segment],
     overlay_joins: dict[Segment, set[Segment]],
 ) -> None:
     """Figure out the correct rotation for 1-long straight antlines."""
@@ -492,7 +509,7 @@ def fix_single_straight(
         orient.up(+8.0),
     ]:
         try:
-            neigh = join_points[(over_name, ) + (center + off).as_tuple()]
+            neigh = join_points[over_name, _join_key(*(center + off))]
         except KeyError:
             continue
 
@@ -512,7 +529,7 @@ def fix_single_straight(
         elif seg.start != off_min or seg.end != off_max:
             # The other side is also present. Only override if we are on both
             # sides.
-            if (over_name, ) + (center - off).as_tuple() in join_points:
+            if (over_name, _join_key(*(center - off))) in join_points:
                 seg.start = off_min
                 seg.end = off_max
         # Else: Both equal, we're fine.
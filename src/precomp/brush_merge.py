@@ -0,0 +1,165 @@
+"""Merge adjacent detail brushes together, to reduce the work VBSP needs to do.
+
+Only axis-aligned boxes are merged. Two boxes can be combined if they share
+an entire face, and all the faces around the seam are textured identically.
+The sides of the first box lie on the same planes as the combined box, so
+only the far face needs to be replaced.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import attrs
+from srctools import VMF, Entity, Side, Solid, logger
+
+
+__all__ = ['merge_detail']
+LOGGER = logger.get_logger(__name__)
+
+# Everything that affects the appearance of a face.
+_FaceSig = Tuple[str, Tuple[float, ...], Tuple[float, ...], float, int, int]
+
+
+@attrs.define(eq=False)
+class _Box:
+    """An axis-aligned box brush."""
+    solid: Solid
+    ent: Entity
+    mins: List[float]
+    maxs: List[float]
+    # Indexed by axis * 2 + (0 for the min face, 1 for the max face).
+    faces: List[Side]
+    sigs: List[_FaceSig]
+
+
+def _face_sig(side: Side) -> _FaceSig:
+    """Compute the values which must match for faces to be merged."""
+    u = side.uaxis
+    v = side.vaxis
+    return (
+        side.mat,
+        (u.x, u.y, u.z, u.offset, u.scale),
+        (v.x, v.y, v.z, v.offset, v.scale),
+        side.ham_rot, side.lightmap, side.smooth,
+    )
+
+
+def _parse_box(solid: Solid, ent: Entity) -> Optional[_Box]:
+    """If this brush is an axis-aligned box, produce the box for it."""
+    if len(solid.sides) != 6 or solid.hidden:
+        return None
+    faces: List[Optional[Side]] = [None] * 6
+    pos: List[float] = [0.0] * 6
+    for side in solid.sides:
+        if side.disp_power > 0:
+            return None
+        normal = side.normal()
+        for axis in range(3):
+            if abs(normal[axis]) > 0.999:
+                break
+        else:
+            return None
+        # The normal points inward, so a positive normal is the min face.
+        ind = axis * 2 + (normal[axis] < 0)
+        if faces[ind] is not None:
+            return None
+        faces[ind] = side
+        pos[ind] = side.planes[0][axis]
+    if pos[0] >= pos[1] or pos[2] >= pos[3] or pos[4] >= pos[5]:
+        return None
+    return _Box(
+        solid, ent,
+        pos[0::2], pos[1::2],
+        faces,  # type: ignore  # All were set.
+        [_face_sig(side) for side in faces],  # type: ignore
+    )
+
+
+def _merge_axis(boxes: List[_Box], axis: int, dead: Set[Solid]) -> int:
+    """Merge boxes which touch along this axis, returning the number removed."""
+    other = [ax for ax in range(3) if ax != axis]
+    groups: Dict[tuple, List[_Box]] = {}
+    for box in boxes:
+        key = (
+            box.mins[other[0]], box.maxs[other[0]],
+            box.mins[other[1]], box.maxs[other[1]],
+            box.sigs[other[0] * 2], box.sigs[other[0] * 2 + 1],
+            box.sigs[other[1] * 2], box.sigs[other[1] * 2 + 1],
+        )
+        groups.setdefault(key, []).append(box)
+
+    merged = 0
+    min_ind = axis * 2
+    max_ind = min_ind + 1
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda box: box.mins[axis])
+        cur = group[0]
+        for box in group[1:]:
+            if cur.maxs[axis] != box.mins[axis]:
+                cur = box
+                continue
+            # Remove the two faces at the seam, and use the far face of the other.
+            sides = cur.solid.sides
+            sides[sides.index(cur.faces[max_ind])] = box.faces[max_ind]
+            cur.faces[max_ind] = box.faces[max_ind]
+            cur.sigs[max_ind] = box.sigs[max_ind]
+            cur.maxs[axis] = box.maxs[axis]
+            dead.add(box.solid)
+            merged += 1
+    return merged
+
+
+def merge_detail(vmf: VMF) -> None:
+    """Merge together adjacent func_detail boxes with identical faces.
+
+    All func_detail entities are equivalent, so brushes are merged between
+    them, and any left empty are removed.
+    """
+    # Overlays and cubemaps refer to faces by ID, those brushes must be kept intact.
+    used_sides: Set[int] = set()
+    for ent in vmf.entities:
+        for side_id in ent['sides'].split():
+            try:
+                used_sides.add(int(side_id))
+            except ValueError:
+                pass
+
+    detail_ents = list(vmf.by_class['func_detail'])
+    boxes: List[_Box] = []
+    brush_count = side_count = 0
+    for ent in detail_ents:
+        for solid in ent.solids:
+            brush_count += 1
+            side_count += len(solid.sides)
+            if any(side.id in used_sides for side in solid.sides):
+                continue
+            box = _parse_box(solid, ent)
+            if box is not None:
+                boxes.append(box)
+
+    dead: Set[Solid] = set()
+    # Each pass can only produce strips, repeat to form larger boxes.
+    for _ in range(3):
+        merged = 0
+        for axis in range(3):
+            merged += _merge_axis(boxes, axis, dead)
+            boxes = [box for box in boxes if box.solid not in dead]
+        if not merged:
+            break
+
+    if not dead:
+        LOGGER.info('No detail brushes to merge.')
+        return
+
+    for ent in detail_ents:
+        ent.solids = [solid for solid in ent.solids if solid not in dead]
+        if not ent.solids:
+            vmf.remove_ent(ent)
+
+    LOGGER.info(
+        'Merged detail brushes: {} -> {} brushes, {} -> {} sides',
+        brush_count, brush_count - len(dead),
+        side_count, side_count - 6 * len(dead),
+    )
@@ -5,12 +5,14 @@ import attrs
 from srctools import Entity, Matrix, VMF, Vec
 from srctools.vmf import EntityGroup
 
-from collisions import CollideType as CollideType, BBox as BBox  # re-export.
+from collisions import (  # re-export.
+    CollideType as CollideType, BBox as BBox, BBoxSet as BBoxSet,
+)
 from editoritems import Item
 from tree import RTree
 
 
-__all__ = ['CollideType', 'BBox', 'Collisions']
+__all__ = ['CollideType', 'BBox', 'BBoxSet', 'Collisions']
 
 
 @attrs.define
@@ -20,6 +22,8 @@ class Collisions:
     _by_bbox: RTree[BBox] = attrs.field(factory=RTree, repr=False, eq=False)
     # Item names -> bounding boxes of that item
     _by_name: Dict[str, List[BBox]] = attrs.Factory(dict)
+    # Item IDs -> the collisions defined for that item, in compact form.
+    _item_colls: Dict[str, BBoxSet] = attrs.field(factory=dict, repr=False, eq=False)
 
     def add(self, bbox: BBox) -> None:
         """Add the given bounding box to the map."""
@@ -52,8 +56,12 @@ class Collisions:
         """Add the default collisions from an item definition for this instance."""
         origin = Vec.from_str(inst['origin'])
         orient = Matrix.from_angstr(inst['angles'])
-        for coll in item.collisions:
-            self.add((coll @ orient + origin).with_attrs(name=inst['targetname']))
+        try:
+            item_colls = self._item_colls[item.id.casefold()]
+        except KeyError:
+            item_colls = self._item_colls[item.id.casefold()] = BBoxSet(item.collisions)
+        for coll in item_colls.transformed(orient, origin, inst['targetname']):
+            self.add(coll)
 
     def dump(self, vmf: VMF, vis_name: str = 'Collisions') -> None:
         """Dump all the bounding boxes as a set of brushes."""
@@ -0,0 +1,163 @@
+"""Caches the converted map, so recompiling an unchanged map skips conversion.
+
+The key is a hash of the original map, all the exported configuration and
+the template files in packages, so any change to those produces a new entry. The oldest entries are evicted
+once the cache grows past the configured size.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+import srctools.logger
+from BEE2_config import ConfigFile
+from precomp import template_brush
+import utils
+
+
+LOGGER = srctools.logger.get_logger(__name__)
+
+CACHE_DIR = Path('bee2', 'compile_cache')
+# Files exported by the app which affect the conversion.
+CONFIG_FILES = [
+    'bee2/vbsp_config.cfg',
+    'bee2/editor.bin',
+    'bee2/corridors.bin',
+    'bee2/templates.lst',
+    'bee2/pack_list.cfg',
+    'bee2/voice.cfg',
+    'bee2/mid_voice.cfg',
+    'bee2/resp_voice.cfg',
+]
+# The list of templates. These are read directly from packages.
+TEMPLATE_LIST = 'bee2/templates.lst'
+# Sections of compile.cfg which affect the conversion. 'Counts' is
+# excluded, since it is rewritten after every compile.
+COMPILE_SECTIONS = ['General', 'Screenshot', 'CorridorNames']
+# The number of converted maps to keep if not specified in compile.cfg.
+DEFAULT_SIZE = 8
+
+
+def _hash_file(hasher: hashlib._Hash, filename: str | Path) -> None:
+    """Add the contents of a file to the hash, or a marker if not present."""
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        hasher.update(b'\0missing\0')
+    else:
+        hasher.update(len(data).to_bytes(8, 'little'))
+        hasher.update(data)
+
+
+def _hash_templates(hasher: hashlib._Hash, filename: str | Path) -> None:
+    """Add the size and modification time of each template source to the hash.
+
+    The template list only holds their locations, so packages can change
+    without it changing. Templates in folders are checked individually,
+    archives as a whole.
+    """
+    try:
+        templates = template_brush.read_templates(str(filename))
+    except (OSError, ValueError):
+        # Missing or invalid, the conversion will report this.
+        hasher.update(b'\0missing\0')
+        return
+    sources = set()
+    for template in templates:
+        if os.path.isdir(template.pak_path):
+            sources.add(os.path.join(template.pak_path, template.path))
+        else:
+            sources.add(template.pak_path)
+    for source in sorted(sources):
+        try:
+            stat = os.stat(source)
+        except OSError:
+            hasher.update(f'{source}|missing\n'.encode('utf8'))
+        else:
+            hasher.update(f'{source}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode('utf8'))
+
+
+def _hash_config(hasher: hashlib._Hash, config: ConfigFile, sections: Iterable[str]) -> None:
+    """Add the given sections of a config file to the hash."""
+    for section in sections:
+        hasher.update(b'[%s]\n' % section.encode('utf8'))
+        if not config.has_section(section):
+            continue
+        for key, value in sorted(config.items(section)):
+            hasher.update(f'{key}={value}\n'.encode('utf8'))
+
+
+def compute_key(
+    map_path: str,
+    compile_conf: ConfigFile,
+    item_conf: ConfigFile,
+) -> str:
+    """Compute the hash identifying the result of converting this map."""
+    hasher = hashlib.sha256()
+    hasher.update(f'{utils.BEE_VERSION}|{srctools.__version__}\n'.encode('utf8'))
+    # The filename is used to distinguish preview and publishing compiles.
+    hasher.update(os.path.basename(map_path).casefold().encode('utf8') + b'\n')
+    _hash_file(hasher, map_path)
+    for filename in CONFIG_FILES:
+        hasher.update(filename.encode('utf8') + b'\n')
+        _hash_file(hasher, filename)
+    _hash_templates(hasher, TEMPLATE_LIST)
+    _hash_config(hasher, compile_conf, COMPILE_SECTIONS)
+    _hash_config(hasher, item_conf, item_conf.sections())
+    return hasher.hexdigest()
+
+
+def fetch(key: str, dest: str) -> bool:
+    """If a converted map is cached, copy it to dest and return True."""
+    cached = CACHE_DIR / (key + '.vmf')
+    try:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(cached, dest)
+    except FileNotFoundError:
+        return False
+    # Mark this as recently used, so it survives eviction.
+    try:
+        os.utime(cached)
+    except OSError:
+        pass
+    LOGGER.info('Reusing cached conversion "{}"', key)
+    return True
+
+
+def store(key: str, src: str, max_size: int) -> None:
+    """Add a converted map to the cache, then evict older entries.
+
+    max_size is the number of maps to keep, zero disables caching entirely.
+    """
+    if max_size <= 0:
+        return
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        temp = CACHE_DIR / (key + '.tmp')
+        shutil.copyfile(src, temp)
+        os.replace(temp, CACHE_DIR / (key + '.vmf'))
+    except OSError:
+        LOGGER.warning('Could not cache converted map:', exc_info=True)
+        return
+    evict(max_size)
+
+
+def evict(max_size: int) -> None:
+    """Remove the least recently used maps, until only max_size remain."""
+    entries: list[tuple[float, Path]] = []
+    for path in CACHE_DIR.glob('*.vmf'):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[max(max_size, 0):]:
+        LOGGER.debug('Evicting cached conversion "{}"', path.stem)
+        try:
+            path.unlink()
+        except OSError:
+            pass
@@ -235,7 +235,7 @@ def res_set_texture(inst: Entity, res: Property):
     try:
         # The user expects the tile to be at it's surface pos, not the
         # position of the voxel.
-        tile = tiling.TILES[(pos - 64 * norm).as_tuple(), norm.as_tuple()]
+        tile = tiling.TILES[pos - 64 * norm, norm]
     except KeyError:
         LOGGER.warning(
             '"{}": Could not find tile at {} with orient {}!',
@@ -705,7 +705,7 @@ def res_antigel(inst: Entity) -> None:
     pos = round(origin - 128 * orient.up(), 6)
     norm = round(orient.up(), 6)
     try:
-        tiling.TILES[pos.as_tuple(), norm.as_tuple()].is_antigel = True
+        tiling.TILES[pos, norm].is_antigel = True
     except KeyError:
         LOGGER.warning('No tile to set antigel at {}, {}', pos, norm)
     texturing.ANTIGEL_LOCS.add((origin // 128).as_tuple())
@@ -919,7 +919,7 @@ def res_add_placement_helper(inst: Entity, res: Property):
         up_dir = None
 
     try:
-        tile = tiling.TILES[(pos - 64 * normal).as_tuple(), normal.as_tuple()]
+        tile = tiling.TILES[pos - 64 * normal, normal]
     except KeyError:
         LOGGER.warning('No tile at {} @ {}', pos, normal)
         return
@@ -1250,8 +1250,8 @@ def res_transfer_bullseye(inst: Entity, props: Property):
 
     try:
         start_tile = tiling.TILES[
-            (start_pos - 64 * start_norm).as_tuple(),
-            start_norm.as_tuple()
+            start_pos - 64 * start_norm,
+            start_norm
         ]
     except KeyError:
         LOGGER.warning('"{}": Cannot find tile to transfer from at {}, {}!'.format(
@@ -1261,10 +1261,18 @@ def res_transfer_bullseye(inst: Entity, props: Property):
         ))
         return
 
-    end_tile = tiling.TileDef.ensure(
-        end_pos - 64 * end_norm,
-        end_norm,
-    )
+    try:
+        end_tile = tiling.TileDef.ensure(
+            end_pos - 64 * end_norm,
+            end_norm,
+        )
+    except KeyError:
+        LOGGER.warning('"{}": Cannot transfer to tile at {}, {}!'.format(
+            inst['targetname'],
+            end_pos,
+            end_norm
+        ))
+        return
     # Now transfer the stuff.
     if start_tile.has_oriented_portal_helper:
         # We need to rotate this.
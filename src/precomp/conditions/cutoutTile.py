@@ -1,7 +1,7 @@
 """Generate random quarter tiles, like in Destroyed or Retro maps."""
 import random
 from collections import defaultdict, namedtuple
-from typing import Tuple, Set, Dict, List
+from typing import Iterable, Tuple, Set, Dict, List
 
 import srctools.logger
 import utils
@@ -361,6 +361,16 @@ def res_cutout_tile(vmf: srctools.VMF, res: Property):
             classname='func_detail',
         )
 
+        # Evaluate the noise for every tile on this level at once.
+        noise_values = get_noise_batch(
+            (
+                Vec(x - 64 + tile_x * 32 + 16, y - 64 + tile_y * 32 + 16, z) // 32
+                for x, y in xy_dict
+                for tile_x, tile_y in utils.iter_grid(max_x=4, max_y=4)
+            ),
+            noise,
+        )
+
         for x, y in xy_dict:
             convert_floor(
                 vmf,
@@ -371,7 +381,7 @@ def res_cutout_tile(vmf: srctools.VMF, res: Property):
                 sign_locs,
                 detail_ent,
                 noise_weight=weights[x, y],
-                noise_func=noise,
+                noise_values=noise_values,
             )
 
     add_floor_sides(vmf, floor_edges)
@@ -379,18 +389,36 @@ def res_cutout_tile(vmf: srctools.VMF, res: Property):
     return conditions.RES_EXHAUSTED
 
 
-def get_noise(loc: Vec, noise_func: SimplexNoise):
-    """Generate a number between 0 and 1.
+def get_noise_batch(
+    locs: Iterable[Vec],
+    noise_func: SimplexNoise,
+) -> Dict[Tuple[float, float, float], float]:
+    """Generate numbers between 0 and 1 for many locations at once.
 
-    This is used to determine where tiles are placed.
+    This is used to determine where tiles are placed. Each value is the
+    average of the neighbouring locations, to smooth out changes. Neighbouring
+    locations share most of their samples, so each is only evaluated once.
     """
-    # Average between the neighbouring locations, to smooth out changes.
-    return sum(
-        # + 1 / 2 fixes the value range (originally -1,1 -> 0,1)
-        (noise_func.noise3(loc.x + x, loc.y + y, loc.z) + 1) / 2
-        for x in (-1, 0, 1)
-        for y in (-1, 0, 1)
-    ) / 9
+    loc_tups = {loc.as_tuple() for loc in locs}
+    samples = list({
+        (x + off_x, y + off_y, z)
+        for (x, y, z) in loc_tups
+        for off_x in (-1, 0, 1)
+        for off_y in (-1, 0, 1)
+    })
+    sample_values = dict(zip(samples, noise_func.noise3_array(
+        [x for x, y, z in samples],
+        [y for x, y, z in samples],
+        [z for x, y, z in samples],
+    )))
+    return {
+        (x, y, z): sum(
+            (sample_values[x + off_x, y + off_y, z] + 1) / 2
+            for off_x in (-1, 0, 1)
+            for off_y in (-1, 0, 1)
+        ) / 9
+        for (x, y, z) in loc_tups
+    }
 
 
 def convert_floor(
@@ -402,7 +430,7 @@ def convert_floor(
     signage_loc,
     detail,
     noise_weight,
-    noise_func: SimplexNoise,
+    noise_values: Dict[Tuple[float, float, float], float],
 ):
     """Cut out tiles at the specified location."""
     # We pop it, so the face isn't detected by other logic - otherwise it'll
@@ -456,7 +484,7 @@ def convert_floor(
             signage_loc.remove(tile_loc.as_tuple())
         else:
             # Create a number between 0-100
-            rand = 100 * get_noise(tile_loc // 32, noise_func) + 10
+            rand = 100 * noise_values[(tile_loc // 32).as_tuple()] + 10
 
             # Adjust based on the noise_weight value, so boundries have more tiles
             rand *= 0.1 + 0.9 * (1 - noise_weight)
@@ -757,20 +785,27 @@ def make_displacement(
         # We can duplicate immutable strings fine..
         face.disp_data[key] = [val * grid_size] * grid_size
 
+    vert_locs = [
+        [
+            Vec(
+                bbox_min.x + x * x_vert,
+                bbox_min.y + y * y_vert,
+                bbox_min.z,
+            ) // max(x_vert, y_vert)
+            for x in range(grid_size)
+        ]
+        for y in range(grid_size)
+    ]
+    noise_values = get_noise_batch(
+        (loc for row in vert_locs for loc in row),
+        noise,
+    )
     face.disp_data['alphas'] = [
         ' '.join(
-            str(512 * get_noise(
-                Vec(
-                    bbox_min.x + x * x_vert,
-                    bbox_min.y + y * y_vert,
-                    bbox_min.z,
-                ) // max(x_vert, y_vert),
-                noise,
-            ))
-            for x in
-            range(grid_size)
+            str(512 * noise_values[loc.as_tuple()])
+            for loc in row
         )
-        for y in range(grid_size)
+        for row in vert_locs
     ]
 
 
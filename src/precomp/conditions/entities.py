@@ -57,7 +57,7 @@ def res_insert_overlay(vmf: VMF, res: Property):
         face_pos -= 64 * normal
 
         try:
-            tiledef = tiling.TILES[face_pos.as_tuple(), normal.as_tuple()]
+            tiledef = tiling.TILES[face_pos, normal]
         except KeyError:
             LOGGER.warning(
                 'Overlay brush position is not valid: {}',
@@ -218,7 +218,7 @@ def res_piston_plat(vmf: VMF, res: Property) -> conditions.ResultCallable:
         tile_pos = origin - orient.up(128)
         panel: Optional[Panel] = None
         try:
-            tiledef = TILES[tile_pos.as_tuple(), off.norm().as_tuple()]
+            tiledef = TILES[tile_pos, off.norm()]
         except KeyError:
             pass
         else:
@@ -179,7 +179,7 @@ def res_signage(vmf: VMF, inst: Entity, res: Property):
         # Find the grid pos first.
         grid_pos = (origin // 128) * 128 + 64
         try:
-            tiledef = tiling.TILES[(grid_pos + 128 * normal).as_tuple(), (-normal).as_tuple()]
+            tiledef = tiling.TILES[grid_pos + 128 * normal, -normal]
         except KeyError:
             LOGGER.warning(
                 "Can't place signage at ({}) in ({}) direction!",
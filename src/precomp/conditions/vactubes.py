@@ -350,8 +350,8 @@ def make_straight(
             ]:
                 try:
                     tile = tiling.TILES[
-                        (position - 128 * supp_dir).as_tuple(),
-                        supp_dir.norm().as_tuple()
+                        position - 128 * supp_dir,
+                        supp_dir.norm()
                     ]
                 except KeyError:
                     continue
@@ -0,0 +1,247 @@
+"""Remove redundant logic entities before the map is saved.
+
+Conditions and item IO frequently produce identical relays, filters and
+texture toggles, or relays which simply forward a single output. Identical
+entities are merged together, and those relays are collapsed into the output
+which triggers them. Relays must allow fast retriggering, otherwise each
+suppresses Triggers until its outputs have fired.
+
+Only entities whose names can't be referenced from elsewhere are touched -
+instances can refer to global (@) names or their own prefixed names, and
+keyvalues can contain names we don't know how to update.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from typing import Dict, List, Set, Tuple
+
+import attrs
+from srctools import VMF, Entity, Output, conv_bool, conv_int, logger
+
+
+__all__ = ['optimise_ents']
+LOGGER = logger.get_logger(__name__)
+
+# Classes which have no position, and so can be merged if identical.
+MERGEABLE_CLASSES = {
+    'logic_relay', 'env_texturetoggle', 'comp_relay',
+    'comp_pack', 'comp_precache_model', 'comp_precache_sound',
+}
+# Of those, classes which do nothing but load resources. Unnamed copies are redundant.
+IDEMPOTENT_CLASSES = {
+    'comp_pack', 'comp_precache_model', 'comp_precache_sound',
+}
+# Keyvalues which don't affect the behaviour of these entities.
+IGNORED_KEYS = {'targetname', 'hammerid', 'origin', 'angles'}
+# Keyvalues which refer to filters, which can be updated.
+FILTER_KEYS = {'filtername', 'damagefilter'} | {f'filter{i:02}' for i in range(1, 11)}
+# For relays, keys which are allowed to be collapsed.
+RELAY_KEYS = IGNORED_KEYS | {'classname', 'spawnflags', 'startdisabled'}
+# Targets/parameters in forwarded outputs which depend on the relay itself.
+SELF_REFS = ('!caller', '!self')
+# Outputs which are fired by the entity itself, not in response to an input.
+SELF_OUTPUTS = ('onspawn', 'onuser')
+
+
+@attrs.define
+class _References:
+    """Information about where entity names are used."""
+    # Name -> (entity, output) pairs targeting that name.
+    outputs: Dict[str, List[Tuple[Entity, Output]]]
+    # Names used in keyvalues other than filters, which can't be changed.
+    keyvalues: Set[str]
+    # Wildcard patterns used as output targets.
+    wildcards: List[str]
+    # Prefixes used by names inside instances.
+    inst_prefixes: Tuple[str, ...]
+
+    def is_protected(self, name: str) -> bool:
+        """Check if this name could be used from somewhere we can't see or update."""
+        return (
+            name.startswith('@')
+            or name in self.keyvalues
+            or name.startswith(self.inst_prefixes)
+            or any(fnmatchcase(name, pattern) for pattern in self.wildcards)
+        )
+
+
+def _find_references(vmf: VMF) -> _References:
+    """Locate all the places names are used."""
+    outputs: Dict[str, List[Tuple[Entity, Output]]] = defaultdict(list)
+    keyvalues: Set[str] = set()
+    wildcards: Set[str] = set()
+    inst_prefixes: Set[str] = set()
+    for ent in vmf.entities:
+        classname = ent['classname'].casefold()
+        for key, value in ent.items():
+            key = key.casefold()
+            if key not in IGNORED_KEYS and key != 'classname' and key not in FILTER_KEYS:
+                keyvalues.update(value.casefold().replace(',', ' ').replace(';', ' ').split())
+        for value in ent.fixup.values():
+            keyvalues.update(value.casefold().replace(',', ' ').replace(';', ' ').split())
+        if classname == 'func_instance' and ent['targetname']:
+            inst_prefixes.add(ent['targetname'].casefold() + '-')
+        for out in ent.outputs:
+            target = out.target.casefold()
+            if '*' in target:
+                wildcards.add(target)
+            outputs[target].append((ent, out))
+    return _References(outputs, keyvalues, list(wildcards), tuple(inst_prefixes))
+
+
+def _input_ok(classname: str, ent: Entity, refs: _References) -> bool:
+    """Check the inputs this entity receives don't depend on its state."""
+    if classname != 'logic_relay':
+        return True
+    # Without "Allow fast retrigger", relays ignore Triggers until their
+    # outputs have fired, so merging or removing them changes the timing.
+    # "Only trigger once" kills the relay, so the others would be killed too.
+    if conv_int(ent['spawnflags']) & 3 != 2 or conv_bool(ent['startdisabled']):
+        return False
+    # Only Trigger is stateless, Enable/Disable/CancelPending would affect
+    # the other entities too.
+    return all(
+        out.input.casefold() == 'trigger'
+        for _, out in refs.outputs.get(ent['targetname'].casefold(), ())
+    )
+
+
+def _refs_self(out: Output) -> bool:
+    """Check if this output depends on the entity firing it."""
+    return any(ref in out.target.casefold() or ref in out.params.casefold() for ref in SELF_REFS)
+
+
+def _outputs_ok(ent: Entity) -> bool:
+    """Check that firing the outputs of copies only once behaves the same.
+
+    Outputs which fire on their own, only fire a limited number of times or
+    refer to the entity itself all behave differently once merged.
+    """
+    return not any(
+        out.output.casefold().startswith(SELF_OUTPUTS)
+        or out.times != -1
+        or _refs_self(out)
+        for out in ent.outputs
+    )
+
+
+def _ent_key(classname: str, ent: Entity) -> tuple:
+    """Compute a key which is equal for functionally identical entities."""
+    return (
+        classname,
+        bool(ent['targetname']),
+        frozenset([
+            (key.casefold(), value)
+            for key, value in ent.items()
+            if key.casefold() not in IGNORED_KEYS
+        ]),
+        frozenset(ent.fixup.items()),
+        # Outputs are unordered.
+        frozenset([
+            (
+                out.output.casefold(), out.inst_out, out.target.casefold(),
+                out.input.casefold(), out.inst_in, out.params, out.delay, out.times,
+            )
+            for out in ent.outputs
+        ]),
+    )
+
+
+def _merge_duplicates(vmf: VMF, refs: _References) -> int:
+    """Merge identical entities together, returning the number removed."""
+    groups: Dict[tuple, List[Entity]] = defaultdict(list)
+    for ent in vmf.entities:
+        classname = ent['classname'].casefold()
+        if classname not in MERGEABLE_CLASSES and not classname.startswith('filter_'):
+            continue
+        if not _outputs_ok(ent):
+            continue
+        name = ent['targetname'].casefold()
+        if name:
+            if refs.is_protected(name) or not _input_ok(classname, ent, refs):
+                continue
+        elif classname not in IDEMPOTENT_CLASSES:
+            # Unnamed entities can only run once each, merging would change that.
+            continue
+        groups[_ent_key(classname, ent)].append(ent)
+
+    removed = 0
+    for ents in groups.values():
+        if len(ents) < 2:
+            continue
+        keep, *dups = ents
+        keep_name = keep['targetname']
+        for dup in dups:
+            dup_name = dup['targetname'].casefold()
+            if dup_name and dup_name != keep_name.casefold():
+                for ent, out in refs.outputs.pop(dup_name, ()):
+                    out.target = keep_name
+                    refs.outputs[keep_name.casefold()].append((ent, out))
+                for ent in vmf.entities:
+                    for key in FILTER_KEYS:
+                        if ent[key].casefold() == dup_name:
+                            ent[key] = keep_name
+            vmf.remove_ent(dup)
+            removed += 1
+    return removed
+
+
+def _collapse_relays(vmf: VMF, refs: _References) -> int:
+    """Remove relays with a single input, moving their outputs to the input."""
+    removed = 0
+    for relay in list(vmf.by_class['logic_relay']):
+        name = relay['targetname'].casefold()
+        if not name or refs.is_protected(name) or not _input_ok('logic_relay', relay, refs):
+            continue
+        if any(key.casefold() not in RELAY_KEYS for key in relay) or len(relay.fixup):
+            continue
+        incoming = refs.outputs.get(name, ())
+        if len(incoming) != 1:
+            continue
+        [(source, trigger)] = incoming
+        if (
+            source is relay or trigger.params or trigger.times != -1
+            or trigger.inst_in is not None
+        ):
+            continue
+        if not all(
+            out.output.casefold() == 'ontrigger' and out.inst_out is None
+            and not _refs_self(out)
+            for out in relay.outputs
+        ):
+            continue
+
+        source.outputs.remove(trigger)
+        del refs.outputs[name]
+        for out in relay.outputs:
+            new_out = Output(
+                trigger.output, out.target, out.input, out.params,
+                delay=trigger.delay + out.delay,
+                times=out.times,
+                inst_out=trigger.inst_out,
+                inst_in=out.inst_in,
+                comma_sep=out.comma_sep,
+            )
+            source.outputs.append(new_out)
+            targ_outs = refs.outputs[out.target.casefold()]
+            targ_outs[:] = [
+                (ent, targ_out) for ent, targ_out in targ_outs
+                if targ_out is not out
+            ]
+            targ_outs.append((source, new_out))
+        vmf.remove_ent(relay)
+        removed += 1
+    return removed
+
+
+def optimise_ents(vmf: VMF) -> None:
+    """Merge identical logic entities and collapse single-use relays."""
+    ent_count = len(vmf.entities)
+    refs = _find_references(vmf)
+    merged = _merge_duplicates(vmf, refs)
+    collapsed = _collapse_relays(vmf, refs)
+    LOGGER.info(
+        'Optimised entities: {} -> {} ({} merged, {} relays collapsed)',
+        ent_count, len(vmf.entities), merged, collapsed,
+    )
@@ -133,8 +133,8 @@ def associate_faith_plates(vmf: VMF) -> None:
             # Try both directions.
             try:
                 tile_or_pos = tiling.TILES[
-                    (origin - 64 * norm).as_tuple(),
-                    norm.as_tuple(),
+                    origin - 64 * norm,
+                    norm,
                 ]
                 break
             except KeyError:
@@ -154,7 +154,7 @@ def associate_faith_plates(vmf: VMF) -> None:
             origin = Vec.from_str(inst['origin'])
             norm = Vec(z=1) @ Angle.from_str(inst['angles'])
             try:
-                tdef = tiling.TILES[(origin - 128 * norm).as_tuple(), norm.as_tuple()]
+                tdef = tiling.TILES[origin - 128 * norm, norm]
             except KeyError:
                 LOGGER.warning('No tile for bullseye at {}!', origin - 64 * norm)
                 continue
@@ -462,8 +462,8 @@ class Fizzler:
                 return
 
             tile = tiling.TILES[
-                (origin - 64 * normal).as_tuple(),
-                normal.as_tuple()
+                origin - 64 * normal,
+                normal
             ]
 
             # Reversed?
@@ -551,8 +551,8 @@ class Fizzler:
             tile_cat = []
             try:
                 top_tile = tiling.TILES[
-                    (pos + 128 * up).as_tuple(),
-                    (-up).as_tuple()
+                    pos + 128 * up,
+                    -up
                 ]
             except KeyError:
                 pass
@@ -560,8 +560,8 @@ class Fizzler:
                 tile_cat.append((tiledefs_up, top_tile))
             try:
                 btm_tile = tiling.TILES[
-                    (pos - 128 * up).as_tuple(),
-                    up.as_tuple()
+                    pos - 128 * up,
+                    up
                 ]
             except KeyError:
                 pass
@@ -8,7 +8,7 @@ from typing import Mapping, Tuple, Iterator, TypeVar, Union, Any
 from plane import Plane
 
 
-__all__ = ['optimise']
+__all__ = ['optimise', 'optimise_dense']
 T = TypeVar('T')
 VOID: Any = object()  # Sentinel
 
@@ -80,3 +80,56 @@ def _do_cell(
             del grid[x, y]
 
     return min_x, min_y, max_x - 1, max_y - 1, value
+
+
+def optimise_dense(
+    cells: bytearray,
+    width: int,
+    height: int,
+) -> Iterator[Tuple[int, int, int, int]]:
+    """Like optimise(), but for a dense grid of boolean cells.
+
+    The grid is a width * height array of 0 or 1, with (x, y) at index x * height + y.
+    This yields (min_x, min_y, max_x, max_y) tuples covering all the set cells,
+    producing the same boxes as optimise() would for an equivalent dict.
+    The array is cleared in the process.
+    """
+    ind = cells.find(1)
+    while ind != -1:
+        min_x, min_y = divmod(ind, height)
+        # Extend in the x direction until we hit a boundary.
+        for x1 in range(min_x, width):
+            if not cells[x1 * height + min_y]:
+                break
+        else:
+            x1 = width
+        # Then in y until we hit a boundary.
+        for y1 in range(min_y, height):
+            if any(not cells[x * height + y1] for x in range(min_x, x1)):
+                break
+        else:
+            y1 = height
+
+        # Then do it again but the other order. Columns are contiguous, so we can search.
+        col_start = min_x * height
+        y2 = cells.find(0, col_start + min_y, col_start + height)
+        y2 = height if y2 == -1 else y2 - col_start
+        for x2 in range(min_x, width):
+            if cells.find(0, x2 * height + min_y, x2 * height + y2) != -1:
+                break
+        else:
+            x2 = width
+
+        # Check which has a larger area.
+        if (x1 - min_x) * (y1 - min_y) > (x2 - min_x) * (y2 - min_y):
+            max_x, max_y = x1, y1
+        else:
+            max_x, max_y = x2, y2
+
+        # Mark all spots as used.
+        blank = bytes(max_y - min_y)
+        for x in range(min_x, max_x):
+            cells[x * height + min_y:x * height + max_y] = blank
+
+        yield min_x, min_y, max_x - 1, max_y - 1
+        ind = cells.find(1, ind + 1)
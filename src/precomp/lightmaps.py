@@ -0,0 +1,118 @@
+"""Assign lightmap scales to faces, based on how visible they are.
+
+VRAD's time is roughly proportional to the number of luxels, so faces which
+the player won't look at closely are given coarser lightmaps. Faces near
+lights keep fine detail, since that's where shadows are sharpest, as do
+portalable surfaces since the player looks at those closely. Preview
+compiles use a coarser profile than publishing.
+"""
+from __future__ import annotations
+
+from typing import Iterator, List, Set
+
+import attrs
+from srctools import VMF, Vec, Side, logger
+
+from precomp import brushLoc, instanceLocs, tiling
+
+
+__all__ = ['Profile', 'PREVIEW', 'PUBLISH', 'assign_scales']
+LOGGER = logger.get_logger(__name__)
+
+# Hammer's default, faces with other values were set deliberately.
+DEFAULT_SCALE = 16
+# Faces within this distance of a light get the fine scale.
+LIGHT_RADIUS = 256.0
+# Entities which light the area around their origin. Others like
+# light_environment light the whole map.
+LIGHT_CLASSES = {'light', 'light_spot'}
+# Ceilings with more than this many air voxels below are far from the player.
+CEILING_HEIGHT = 2
+
+
+@attrs.frozen
+class Profile:
+    """The lightmap scales to use for each category of face."""
+    coarse: int
+    normal: int
+    fine: int
+
+
+PREVIEW = Profile(coarse=64, normal=32, fine=16)
+PUBLISH = Profile(coarse=32, normal=16, fine=8)
+
+
+def _light_positions(vmf: VMF) -> List[Vec]:
+    """Locate all the light sources in the map."""
+    light_files = set(instanceLocs.resolve('<ITEM_LIGHT_PANEL>', silent=True))
+    light_files.update(instanceLocs.resolve('<ITEM_POINT_LIGHT>', silent=True))
+    positions = []
+    for ent in vmf.entities:
+        classname = ent['classname'].casefold()
+        if classname in LIGHT_CLASSES or (
+            classname == 'func_instance' and ent['file'].casefold() in light_files
+        ):
+            positions.append(Vec.from_str(ent['origin']))
+    return positions
+
+
+def _iter_faces(vmf: VMF) -> Iterator[Side]:
+    """Yield all faces which could be adjusted."""
+    for solid in vmf.brushes:
+        yield from solid.sides
+    for ent in vmf.by_class['func_detail']:
+        for solid in ent.solids:
+            yield from solid.sides
+
+
+def _is_high_ceiling(grid: brushLoc.Grid, pos: Vec) -> bool:
+    """Check if there are several air voxels below this one."""
+    for offset in range(1, CEILING_HEIGHT + 1):
+        if not grid[pos.x, pos.y, pos.z - offset].traversable:
+            return False
+    return True
+
+
+def assign_scales(vmf: VMF, profile: Profile) -> None:
+    """Set the lightmap scale of faces with the default value."""
+    grid = brushLoc.POS
+    lights = _light_positions(vmf)
+    portal_faces: Set[int] = {
+        face.id
+        for tile in tiling.TILES.values()
+        if tile.base_type.is_white
+        for face in tile.brush_faces
+    }
+    counts = {'coarse': 0, 'normal': 0, 'fine': 0}
+
+    for face in _iter_faces(vmf):
+        if face.lightmap != DEFAULT_SCALE or face.is_disp:
+            continue
+        mat = face.mat.casefold()
+        if mat.startswith('tools/'):
+            continue
+        center = face.get_origin()
+        # The normal points into the brush.
+        front = brushLoc.world_to_grid(center - face.normal())
+        block = grid[front]
+
+        if face.id in portal_faces or any(
+            (light - center).mag_sq() < LIGHT_RADIUS ** 2 for light in lights
+        ):
+            category = 'fine'
+        elif not block.traversable or block.is_pit:
+            # Facing into a wall, or down a bottomless pit.
+            category = 'coarse'
+        elif face.normal().z > 0.99 and _is_high_ceiling(grid, front):
+            category = 'coarse'
+        else:
+            category = 'normal'
+        face.lightmap = getattr(profile, category)
+        counts[category] += 1
+
+    LOGGER.info(
+        'Lightmap scales: {} coarse ({}), {} normal ({}), {} fine ({})',
+        counts['coarse'], profile.coarse,
+        counts['normal'], profile.normal,
+        counts['fine'], profile.fine,
+    )
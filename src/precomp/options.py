@@ -323,6 +323,27 @@ DEFAULTS = [
 
         This makes EmbedFace textures contiguous, for irregular textures.
         """),
+    Opt('vis_optimise', False,
+        """Convert world brushes inside the map to detail, and add hints at openings.
+
+        This speeds up VVIS, since fewer visleaves are produced.
+        """),
+    Opt('optimise_logic_ents', False,
+        """Merge identical logic entities, and collapse relays with a single input.
+
+        This reduces the entity count, for large maps.
+        """),
+    Opt('merge_detail_brushes', False,
+        """Merge adjacent func_detail boxes with identical faces before saving.
+
+        This reduces the number of brushes VBSP needs to process.
+        """),
+    Opt('adaptive_lightmaps', False,
+        """Assign lightmap scales to faces based on how visible they are.
+
+        Faces near lights are made finer, while backfaces, pits and high
+        ceilings are made coarser. Preview compiles use coarser scales overall.
+        """),
 
     Opt('fizz_border_vertical', False,
         """For fizzler borders, indicate that the texture is vertical.
@@ -33,6 +33,10 @@ LOGGER = srctools.logger.get_logger(__name__, alias='template')
 # _SCALE_TEMP is converted from Template. The frozenset is the visgroups.
 _TEMPLATES: dict[str, Union[UnparsedTemplate, Template]] = {}
 _SCALE_TEMP: dict[tuple[str, frozenset[str]], ScalingTemplate] = {}
+# The number of get_template() calls which found an already parsed template,
+# or which had to parse it.
+CACHE_HITS = 0
+CACHE_MISSES = 0
 
 
 class InvalidTemplateName(LookupError):
@@ -438,20 +442,28 @@ def parse_temp_name(name) -> tuple[str, set[str]]:
         return name.casefold(), set()
 
 
-def load_templates(path: str) -> None:
-    """Load in the template file, used for import_template()."""
+def read_templates(path: str) -> list[UnparsedTemplate]:
+    """Read the template file, returning the location of each template."""
     with open(path, 'rb') as f:
         dmx, fmt_name, fmt_ver = DMElement.parse(f, unicode=True)
     if fmt_name != 'bee_templates' or fmt_ver not in [1]:
         raise ValueError(f'Invalid template file format "{fmt_name}" v{fmt_ver}')
+    templates = []
     for template in dmx['temp'].iter_elem():
         if template is None:
             raise ValueError('Null template!')
-        _TEMPLATES[template.name.casefold()] = UnparsedTemplate(
+        templates.append(UnparsedTemplate(
             template.name.upper(),
             template['package'].val_str,
             template['path'].val_str,
-        )
+        ))
+    return templates
+
+
+def load_templates(path: str) -> None:
+    """Load in the template file, used for import_template()."""
+    for template in read_templates(path):
+        _TEMPLATES[template.id.casefold()] = template
 
 
 def _parse_template(loc: UnparsedTemplate) -> Template:
@@ -655,16 +667,20 @@ def _parse_template(loc: UnparsedTemplate) -> Template:
 
 def get_template(temp_name: str) -> Template:
     """Get the data associated with a given template."""
+    global CACHE_HITS, CACHE_MISSES
     try:
         temp = _TEMPLATES[temp_name.casefold()]
     except KeyError:
         raise InvalidTemplateName(temp_name) from None
 
     if isinstance(temp, UnparsedTemplate):
+        CACHE_MISSES += 1
         LOGGER.debug('Parsing template {}', temp_name.upper())
         temp = _TEMPLATES[temp_name.casefold()] = _parse_template(temp)
         if temp.debug:
             LOGGER.info('Template {} in debug mode.', temp_name.upper())
+    else:
+        CACHE_HITS += 1
 
     return temp
 
@@ -846,7 +862,7 @@ def import_template(
                 if abs(tile_norm[axis]) < 1e-6:
                     tile_off[axis] = tile_off[axis] // 128 * 128 + 64
             try:
-                tile = tiling.TILES[tile_off.as_tuple(), tile_norm.as_tuple()]
+                tile = tiling.TILES[tile_off, tile_norm]
             except KeyError:
                 LOGGER.warning(
                     'No tile to bind at {} for "{}"!',
@@ -8,11 +8,11 @@ they were attached to the original brushes.
 """
 from __future__ import annotations
 
-from collections.abc import Iterator, MutableMapping
+from collections.abc import Iterator
 from collections import defaultdict, Counter
 import math
 from enum import Enum
-from typing import Optional, Union, cast, Tuple
+from typing import MutableMapping, Optional, Union, ValuesView, cast, Tuple
 from weakref import WeakKeyDictionary
 
 import attrs
@@ -21,7 +21,6 @@ from srctools.vmf import VMF, Entity, Side, Solid, Output, UVAxis
 import srctools.logger
 import srctools.vmf
 
-from plane import Plane
 from precomp.brushLoc import POS as BLOCK_POS, Block, grid_to_world
 from precomp.texturing import TileSize, Portalable
 from . import (
@@ -64,9 +63,111 @@ NORMAL_NAMES = dict(zip(
     map(Vec.as_tuple, NORMALS),
     ['east', 'west', 'north', 'south', 'up', 'down'],
 ))
+# Normal -> index used when packing tile keys, and the reverse.
+_NORMAL_TUPLES: list[tuple[float, float, float]] = [(norm.x, norm.y, norm.z) for norm in NORMALS]
+_NORMAL_INDEX: dict[tuple[float, float, float], int] = {
+    norm: ind for ind, norm in enumerate(_NORMAL_TUPLES)
+}
+# Added to grid positions when packing tile keys, so they're always positive.
+_GRID_OFFSET = 1 << 15
+_TileKey = Tuple[Union[Vec, Tuple[float, float, float]], Union[Vec, Tuple[float, float, float]]]
+
+
+def _pack_tile_key(pos: Vec | tuple[float, float, float], normal: Vec | tuple[float, float, float]) -> int:
+    """Pack a block center and normal into a single integer.
+
+    Each grid position gets 16 bits, and the normal 3 bits.
+    ValueError is raised if the position is not a block center, or the normal is not
+    axis-aligned.
+    """
+    x, y, z = pos
+    norm_x, norm_y, norm_z = normal
+    try:
+        norm_ind = _NORMAL_INDEX[norm_x, norm_y, norm_z]
+    except KeyError:
+        raise ValueError(f'Normal ({norm_x} {norm_y} {norm_z}) is not axis-aligned!') from None
+    grid_x, rem_x = divmod(x - 64, 128)
+    grid_y, rem_y = divmod(y - 64, 128)
+    grid_z, rem_z = divmod(z - 64, 128)
+    if rem_x or rem_y or rem_z:
+        raise ValueError(f'({x} {y} {z}) is not the center of a block!')
+    return (
+        (int(grid_x) + _GRID_OFFSET) << 35
+        | (int(grid_y) + _GRID_OFFSET) << 19
+        | (int(grid_z) + _GRID_OFFSET) << 3
+        | norm_ind
+    )
+
+
+def _unpack_tile_key(key: int) -> tuple[tuple[float, float, float], tuple[float, float, float]]:
+    """Reverse _pack_tile_key(), producing the block center and normal as tuples."""
+    return (
+        128.0 * ((key >> 35 & 0xFFFF) - _GRID_OFFSET) + 64.0,
+        128.0 * ((key >> 19 & 0xFFFF) - _GRID_OFFSET) + 64.0,
+        128.0 * ((key >> 3 & 0xFFFF) - _GRID_OFFSET) + 64.0,
+    ), _NORMAL_TUPLES[key & 0b111]
+
+
+class TileGrid(MutableMapping[_TileKey, 'TileDef']):
+    """Mapping for the tiledefs in the map.
+
+    Keys are (block center, normal) pairs, either as Vecs or tuples. These are
+    packed into a single integer, so lookups don't need to construct tuples.
+    """
+    def __init__(self) -> None:
+        self._tiles: dict[int, TileDef] = {}
+
+    def __getitem__(self, key: _TileKey) -> TileDef:
+        pos, normal = key
+        try:
+            packed = _pack_tile_key(pos, normal)
+        except ValueError:
+            raise KeyError(key) from None
+        try:
+            return self._tiles[packed]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: _TileKey, tile: TileDef) -> None:
+        pos, normal = key
+        self._tiles[_pack_tile_key(pos, normal)] = tile
+
+    def __delitem__(self, key: _TileKey) -> None:
+        pos, normal = key
+        try:
+            packed = _pack_tile_key(pos, normal)
+        except ValueError:
+            raise KeyError(key) from None
+        try:
+            del self._tiles[packed]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            pos, normal = key  # type: ignore
+            return _pack_tile_key(pos, normal) in self._tiles
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self) -> Iterator[tuple[tuple[float, float, float], tuple[float, float, float]]]:
+        return map(_unpack_tile_key, self._tiles)
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def values(self) -> ValuesView[TileDef]:
+        """Return a view over the tiledefs."""
+        return self._tiles.values()
+
+    def clear(self) -> None:
+        """Remove all tiledefs."""
+        self._tiles.clear()
+
+
 # All the tiledefs in the map.
 # Maps a block center, normal -> the tiledef on the side of that block.
-TILES: dict[tuple[tuple[float, float, float], tuple[float, float, float]], TileDef] = {}
+TILES = TileGrid()
 
 # Special key for TileDef.subtile - this is set to 'u' or 'v' to
 # indicate the center section should be nodrawed.
@@ -876,15 +977,19 @@ class TileDef:
         norm: Vec,
         tile_type: TileType=TileType.VOID,
     ) -> 'TileDef':
-        """Return a tiledef at a position, creating it with a type if not present."""
+        """Return a tiledef at a position, creating it with a type if not present.
+
+        If the position is not the center of a block or the normal is not
+        axis-aligned, KeyError is raised.
+        """
         try:
-            tile = TILES[grid_pos.as_tuple(), norm.as_tuple()]
+            tile = TILES[grid_pos, norm]
         except KeyError:
-            tile = TILES[grid_pos.as_tuple(), norm.as_tuple()] = cls(
-                grid_pos,
-                norm,
-                tile_type,
-            )
+            tile = cls(grid_pos, norm, tile_type)
+            try:
+                TILES[grid_pos, norm] = tile
+            except ValueError as exc:
+                raise KeyError(grid_pos, norm) from exc
         return tile
 
     def _get_subtiles(self) -> dict[tuple[int, int], TileType]:
@@ -1057,15 +1162,15 @@ class TileDef:
         side_norm = Vec.with_axes(u_ax, u, v_ax, v)
 
         try:
-            tiledef = TILES[self.pos.as_tuple(), side_norm.as_tuple()]
+            tiledef = TILES[self.pos, side_norm]
         except KeyError:
             # No tile. As a special case, if we're an EMBED and this side is
             # empty then embed so the instance can fit.
             if BLOCK_POS['world': self.pos] is Block.EMBED:
                 try:
                     tiledef = TILES[
-                        (self.pos + 128 * side_norm).as_tuple(),
-                        self.normal.as_tuple()
+                        self.pos + 128 * side_norm,
+                        self.normal
                     ]
                 except KeyError:
                     return True
@@ -1429,7 +1534,7 @@ def find_tile(origin: Vec, normal: Vec, force: bool=False) -> tuple[TileDef, int
     if force:
         tile = TileDef.ensure(grid_pos, normal)
     else:
-        tile = TILES[grid_pos.as_tuple(), normal.as_tuple()]
+        tile = TILES[grid_pos, normal]
         # except KeyError: raise
 
     return tile, int(u), int(v)
@@ -1714,7 +1819,7 @@ def analyse_map(vmf_file: VMF, side_to_ant_seg: dict[int, list[antlines.Segment]
             pos.localise(Vec.from_str(inst['origin']), angles)
             up = Matrix.from_angle(angles).up()
             try:
-                tile = TILES[pos.as_tuple(), up.as_tuple()]
+                tile = TILES[pos, up]
             except KeyError:
                 pass  # On goo or the like.
             else:
@@ -1792,7 +1897,7 @@ def analyse_map(vmf_file: VMF, side_to_ant_seg: dict[int, list[antlines.Segment]
             for norm in NORMALS:
                 grid_pos = grid_to_world(pos) - 128 * norm
                 try:
-                    tile = TILES[grid_pos.as_tuple(), norm.as_tuple()]
+                    tile = TILES[grid_pos, norm]
                 except KeyError:
                     continue
 
@@ -1826,7 +1931,7 @@ def tiledefs_from_cube(face_to_tile: dict[int, TileDef], brush: Solid, grid_pos:
             normal,
             base_type=tex_kind,
         )
-        TILES[grid_pos.as_tuple(), normal.as_tuple()] = tiledef
+        TILES[grid_pos, normal] = tiledef
         face_to_tile[face.id] = tiledef
     brush.remove()
 
@@ -1850,7 +1955,7 @@ def tiledefs_from_large_tile(
         norm,
         base_type=tex_kind,
     )
-    TILES[grid_pos.as_tuple(), norm.as_tuple()] = tiledef
+    TILES[grid_pos, norm] = tiledef
     brush.map.remove_brush(brush)
     face_to_tile[front_face.id] = tiledef
 
@@ -1866,7 +1971,7 @@ def tiledef_from_angled_panel(brush_ent: Entity, panel_ent: Entity) -> None:
 
     tex_kind, front_face = find_front_face(brush, grid_pos, norm)
 
-    TILES[grid_pos.as_tuple(), norm.as_tuple()] = tile = TileDef(
+    TILES[grid_pos, norm] = tile = TileDef(
         grid_pos,
         norm,
         base_type=tex_kind,
@@ -1892,7 +1997,7 @@ def tiledef_from_flip_panel(brush_ent: Entity, panel_ent: Entity) -> None:
     # To match the editor model, flip around the orientation.
     panel_ent['spawnflags'] = srctools.conv_int(panel_ent['spawnflags']) ^ 2
 
-    TILES[grid_pos.as_tuple(), norm.as_tuple()] = tile = TileDef(
+    TILES[grid_pos, norm] = tile = TileDef(
         grid_pos,
         norm,
         # It's always white in the forward direction
@@ -1981,30 +2086,35 @@ def inset_flip_panel(panel: list[Solid], pos: Vec, normal: Vec) -> None:
 
 
 def bevel_split(
-    rect_points: Plane[bool],
-    tile_pos: Plane[TileDef],
+    rect_points: bytearray,
+    tile_pos: list[Optional[TileDef]],
+    width: int,
+    height: int,
 ) -> Iterator[tuple[int, int, int, int, tuple[bool, bool, bool, bool]]]:
-    """Split the optimised segments to produce the correct bevelling."""
-    for min_u, min_v, max_u, max_v, _ in grid_optim.optimise(rect_points):
+    """Split the optimised segments to produce the correct bevelling.
+
+    rect_points and tile_pos are dense grids, with (u, v) at index u * height + v.
+    """
+    for min_u, min_v, max_u, max_v in grid_optim.optimise_dense(rect_points, width, height):
         u_range = range(min_u, max_u + 1)
         v_range = range(min_v, max_v + 1)
 
         # These are sort of reversed around, which is a little confusing.
         # Bevel U is facing in the U direction, running across the V.
         bevel_umins: list[bool] = [
-            tile_pos[min_u, v].should_bevel(-1, 0)
+            tile_pos[min_u * height + v].should_bevel(-1, 0)
             for v in v_range
         ]
         bevel_umaxes: list[bool] = [
-            tile_pos[max_u, v].should_bevel(1, 0)
+            tile_pos[max_u * height + v].should_bevel(1, 0)
             for v in v_range
         ]
         bevel_vmins: list[bool] = [
-            tile_pos[u, min_v].should_bevel(0, -1)
+            tile_pos[u * height + min_v].should_bevel(0, -1)
             for u in u_range
         ]
         bevel_vmaxes: list[bool] = [
-            tile_pos[u, max_v].should_bevel(0, 1)
+            tile_pos[u * height + max_v].should_bevel(0, 1)
             for u in u_range
         ]
 
@@ -2065,54 +2175,57 @@ def generate_brushes(vmf: VMF) -> None:
         norm_axis = normal.axis()
         u_axis, v_axis = Vec.INV_AXIS[norm_axis]
         bbox_min, bbox_max = Vec.bbox(tile.pos for tile in tiles)
+        u_min = bbox_min[u_axis]
+        v_min = bbox_min[v_axis]
+        width = int((bbox_max[u_axis] - u_min) // 128) + 1
+        height = int((bbox_max[v_axis] - v_min) // 128) + 1
+
+        # Every tile in the plane has the same type, so look up the generators once.
+        if tile_type is TileType.NODRAW:
+            tile_gen = None
+        elif tile_type is TileType.GOO_SIDE:
+            # This forces a specific size.
+            tile_gen = texturing.gen(texturing.GenCat.NORMAL, normal, Portalable.BLACK)
+        else:
+            tile_gen = texturing.gen(texturing.GenCat.NORMAL, normal, tile_type.color)
+        merge_gen = texturing.gen(texturing.GenCat.NORMAL, normal, tile_type.color)
+        can_double = TileSize.TILE_DOUBLE in merge_gen
 
-        # (type, is_antigel, texture) -> (u, v) -> present/absent
-        grid_pos: dict[tuple[TileType, bool, str], Plane[bool]] = defaultdict(Plane)
-
-        tile_pos: Plane[TileDef] = Plane()
+        # (is_antigel, texture) -> dense grid of present/absent.
+        grid_pos: dict[tuple[bool, str], bytearray] = {}
+        # The tile at each position, in the same layout.
+        tile_pos: list[Optional[TileDef]] = [None] * (width * height)
 
         for tile in tiles:
-            pos = tile.pos + 64 * tile.normal
-
-            if tile_type is TileType.GOO_SIDE:
-                # This forces a specific size.
-                tex = texturing.gen(
-                    texturing.GenCat.NORMAL,
-                    normal,
-                    Portalable.BLACK
-                ).get(pos, TileSize.GOO_SIDE, antigel=False)
-            elif tile_type is TileType.NODRAW:
+            if tile_gen is None:
                 tex = consts.Tools.NODRAW
+            elif tile_type is TileType.GOO_SIDE:
+                tex = tile_gen.get(tile.pos + 64 * normal, TileSize.GOO_SIDE, antigel=False)
             else:
-                tex = texturing.gen(
-                    texturing.GenCat.NORMAL,
-                    normal,
-                    tile.base_type.color
-                ).get(pos, tile.base_type.tile_size, antigel=tile.is_antigel)
+                tex = tile_gen.get(tile.pos + 64 * normal, tile_type.tile_size, antigel=tile.is_antigel)
 
-            u_pos = int((pos[u_axis] - bbox_min[u_axis]) // 128)
-            v_pos = int((pos[v_axis] - bbox_min[v_axis]) // 128)
-            grid_pos[tile.base_type, tile.is_antigel, tex][u_pos, v_pos] = True
-            tile_pos[u_pos, v_pos] = tile
+            # The normal axis is constant, so U/V are the same as the tile position.
+            ind = int((tile.pos[u_axis] - u_min) // 128) * height + int((tile.pos[v_axis] - v_min) // 128)
+            try:
+                cells = grid_pos[tile.is_antigel, tex]
+            except KeyError:
+                cells = grid_pos[tile.is_antigel, tex] = bytearray(width * height)
+            cells[ind] = 1
+            tile_pos[ind] = tile
 
-        for (subtile_type, is_antigel, tex), tex_pos in grid_pos.items():
-            for min_u, min_v, max_u, max_v, bevels in bevel_split(tex_pos, tile_pos):
+        for (is_antigel, tex), cells in grid_pos.items():
+            for min_u, min_v, max_u, max_v, bevels in bevel_split(cells, tile_pos, width, height):
                 center = Vec.with_axes(
                     norm_axis, plane_dist,
                     # Compute avg(128*min, 128*max)
                     # = (128 * min + 128 * max) / 2
                     # = (min + max) * 64
-                    u_axis, bbox_min[u_axis] + (min_u + max_u) * 64,
-                    v_axis, bbox_min[v_axis] + (min_v + max_v) * 64,
-                )
-                gen = texturing.gen(
-                    texturing.GenCat.NORMAL,
-                    normal,
-                    subtile_type.color
+                    u_axis, u_min + (min_u + max_u) * 64,
+                    v_axis, v_min + (min_v + max_v) * 64,
                 )
-                if TileSize.TILE_DOUBLE in gen and (1 + max_u - min_u) % 2 == 0 and (1 + max_v - min_v) % 2 == 0:
+                if can_double and (1 + max_u - min_u) % 2 == 0 and (1 + max_v - min_v) % 2 == 0:
                     is_double = True
-                    tex = gen.get(center, TileSize.TILE_DOUBLE, antigel=is_antigel)
+                    tex = merge_gen.get(center, TileSize.TILE_DOUBLE, antigel=is_antigel)
                 else:
                     is_double = False
 
@@ -2136,12 +2249,12 @@ def generate_brushes(vmf: VMF) -> None:
                     # We know the scale is 0.25, so don't bother looking that up.
                     tile_min = Vec.with_axes(
                         norm_axis, plane_dist,
-                        u_axis, bbox_min[u_axis] + 128 * min_u - 64,
-                        v_axis, bbox_min[v_axis] + 128 * min_v - 64,
+                        u_axis, u_min + 128 * min_u - 64,
+                        v_axis, v_min + 128 * min_v - 64,
                     )
                     front.uaxis.offset = (Vec.dot(tile_min, front.uaxis.vec()) / 0.25) % (256/0.25)
                     front.vaxis.offset = (Vec.dot(tile_min, front.vaxis.vec()) / 0.25) % (256/0.25)
-                    if gen.options['scaleup256']:
+                    if merge_gen.options['scaleup256']:
                         # It's actually a 128x128 tile, that we want to double scale for.
                         front.scale = 0.5
                         front.uaxis.offset /= 2
@@ -2149,7 +2262,7 @@ def generate_brushes(vmf: VMF) -> None:
 
                 for u in range(min_u, max_u + 1):
                     for v in range(min_v, max_v + 1):
-                        tile_pos[u, v].brush_faces.append(front)
+                        tile_pos[u * height + v].brush_faces.append(front)
 
     LOGGER.info('Generating goop...')
     generate_goo(vmf)
@@ -2221,7 +2334,7 @@ def generate_goo(vmf: VMF) -> None:
             for x, y in [(-1, 0), (0, -1), (1, 0), (0, 1)]:
                 norm = Vec(x, y)
                 try:
-                    tile = TILES[(voxel_center - 128*norm).as_tuple(), (x, y, 0)]
+                    tile = TILES[voxel_center - 128*norm, (x, y, 0)]
                 except KeyError:
                     continue
                 side = Vec.cross(norm, (0.0, 0.0, -1.0))
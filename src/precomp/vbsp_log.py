@@ -0,0 +1,132 @@
+"""Parses VBSP's output as it runs, extracting entity counts and leaks."""
+from typing import Optional
+import logging
+
+import srctools.logger
+from BEE2_config import ConfigFile
+from compile_metrics import CompileMetrics
+
+
+LOGGER = srctools.logger.get_logger(__name__)
+
+
+class VBSPLogParser(logging.Handler):
+    """Read through VBSP's log as it runs, extracting entity counts.
+
+    These are saved to the config as soon as they're found, so the
+    BEE2 application can display them.
+    """
+    # The output is something like this:
+    # nummapplanes:     (?? / 65536)
+    # nummapbrushes:    (?? / 8192)
+    # nummapbrushsides: (?? / 65536)
+    # num_map_overlays: (?? / 512)
+    # nummodels:        (?? / 1024)
+    # num_entities:     (?? / 16384)
+    DESIRED_VALS = [
+        # VBSP values -> config names
+        ('nummapbrushes:', 'brush'),
+        ('num_map_overlays:', 'overlay'),
+        ('num_entities:', 'entity'),
+    ]
+    # The other options rarely hit the limits, so we don't track them.
+
+    def __init__(self, config: ConfigFile) -> None:
+        super().__init__()
+        self.config = config
+        self.counts = {
+            'brush': ('0', '8192'),
+            'overlay': ('0', '512'),
+            'entity': ('0', '2048'),
+        }
+        # If VBSP reported exceeding a limit, the last line mentioning it.
+        self.limit_line: Optional[str] = None
+        self.leaked = False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Handle each line of output."""
+        try:
+            self.parse_line(record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+    def parse_line(self, line: str) -> None:
+        """Parse a single line of VBSP's output."""
+        if 'MAX_MAP_' in line:
+            for limit in ('MAX_MAP_OVERLAYS', 'MAX_MAP_BRUSHSIDES', 'MAX_MAP_PLANES', 'MAX_MAP_ENTITIES'):
+                if limit in line:
+                    LOGGER.warning('VBSP exceeded a limit: {}', line.strip())
+                    self.limit_line = line
+                    return
+        if 'leaked' in line.casefold() and not self.leaked:
+            LOGGER.warning('Map leaked!')
+            self.leaked = True
+            return
+
+        line = line.lstrip(' \t[|')
+        for name, conf in self.DESIRED_VALS:
+            if not line.startswith(name):
+                continue
+            # Grab the value from ( onwards
+            fraction = line.split('(', 1)[1]
+            # Grab the two numbers, convert to ascii and strip
+            # whitespace.
+            count_num, count_max = fraction.split('/')
+            value = self.counts[conf] = (
+                count_num.strip(' \t\n'),
+                # Strip the ending ) off the max. We have the value, so
+                # we might as well tell the BEE2 if it changes..
+                count_max.strip(') \t\n'),
+            )
+            count_section = self.config['Counts']
+            count_section[conf], count_section['max_' + conf] = value
+            self.config.save_check()
+            return
+
+    def add_metrics(self, metrics: CompileMetrics) -> None:
+        """Add the counts found to the compile metrics."""
+        for count_name, (value, limit) in self.counts.items():
+            metrics.counts['vbsp_' + count_name] = srctools.conv_int(value)
+            metrics.counts['vbsp_max_' + count_name] = srctools.conv_int(limit)
+        metrics.counts['leaked'] = self.leaked
+
+    def save_counts(self) -> None:
+        """Once VBSP succeeds, save all the counts."""
+        LOGGER.info('Retrieved counts: {}', self.counts)
+        count_section = self.config['Counts']
+        for count_name, (value, limit) in self.counts.items():
+            count_section[count_name] = value
+            count_section['max_' + count_name] = limit
+        self.config.save()
+
+    def save_failure(self) -> None:
+        """When VBSP fails, update the counts to show which limit was hit."""
+        # VBSP doesn't output the actual entity counts, so set the errorred
+        # one to max and the others to zero.
+        count_section = self.config['Counts']
+
+        count_section['max_brush'] = '8192'
+        count_section['max_entity'] = '2048'
+        count_section['max_overlay'] = '512'
+
+        line = self.limit_line
+        if line is None:
+            count_section['entity'] = '0'
+            count_section['overlay'] = '0'
+            count_section['brush'] = '0'
+        elif 'MAX_MAP_OVERLAYS' in line:
+            count_section['entity'] = '0'
+            count_section['brush'] = '0'
+            # The line is like 'MAX_MAP_OVER = 512', pull out the number from
+            # the end and decode it.
+            over_count = line.rsplit('=')[1].strip()
+            count_section['overlay'] = over_count
+            count_section['max_overlay'] = over_count
+        elif 'MAX_MAP_BRUSHSIDES' in line or 'MAX_MAP_PLANES' in line:
+            count_section['entity'] = '0'
+            count_section['overlay'] = '0'
+            count_section['brush'] = '8192'
+        else:  # MAX_MAP_ENTITIES
+            count_section['entity'] = count_section['overlay'] = '0'
+            count_section['brush'] = '8192'
+        self.config.save_check()
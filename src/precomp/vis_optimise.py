@@ -0,0 +1,111 @@
+"""Prepare the map for VVIS, so visibility is quicker to compute.
+
+World brushes which lie entirely inside the map's open space can't be part of
+the seal, so they are converted to func_detail. This stops them from splitting
+visleaves. Openings in the map shell - where corridors attach - get a hint
+brush, so the leaves are divided at the doorway.
+"""
+from __future__ import annotations
+
+from typing import List
+
+from srctools import VMF, Vec, Solid, logger
+
+from precomp import brushLoc, tiling
+import consts
+
+
+__all__ = ['prepare_vis']
+LOGGER = logger.get_logger(__name__)
+# Materials which are allowed in brushes converted to detail.
+DETAIL_TOOLS = {consts.Tools.NODRAW.value}
+# Blocks which would be sealed by a tile, if not for an opening.
+OPENING_BLOCKS = {brushLoc.Block.VOID, brushLoc.Block.SOLID}
+# Directions to check for openings.
+DIRECTIONS = [
+    Vec(x=1), Vec(x=-1),
+    Vec(y=1), Vec(y=-1),
+    Vec(z=1), Vec(z=-1),
+]
+
+
+def _in_open_space(grid: brushLoc.Grid, solid: Solid) -> bool:
+    """Check if the brush lies entirely in air voxels."""
+    bbox_min, bbox_max = solid.get_bbox()
+    # Shrink slightly, so brushes lying on the edge of a voxel don't count
+    # the next one.
+    grid_min = brushLoc.world_to_grid(bbox_min + 0.5)
+    grid_max = brushLoc.world_to_grid(bbox_max - 0.5)
+    for pos in Vec.iter_grid(grid_min, grid_max):
+        if grid[pos] is not brushLoc.Block.AIR:
+            return False
+    return True
+
+
+def _can_be_detail(solid: Solid) -> bool:
+    """Check if this brush's materials allow it to be detail."""
+    for side in solid.sides:
+        mat = side.mat.casefold()
+        if mat.startswith('tools/') and mat not in DETAIL_TOOLS:
+            return False
+    return True
+
+
+def make_detail(vmf: VMF, grid: brushLoc.Grid) -> List[Solid]:
+    """Convert world brushes which can't seal the map to func_detail."""
+    detail: List[Solid] = []
+    world: List[Solid] = []
+    for solid in vmf.brushes:
+        if _can_be_detail(solid) and _in_open_space(grid, solid):
+            detail.append(solid)
+        else:
+            world.append(solid)
+    if detail:
+        vmf.brushes[:] = world
+        vmf.create_ent('func_detail').solids = detail
+    return detail
+
+
+def add_hints(vmf: VMF, grid: brushLoc.Grid) -> int:
+    """Add hint brushes across openings in the map shell.
+
+    These are air voxels next to void or solid voxels, without a tile
+    between them - where corridors and similar instances attach.
+    """
+    count = 0
+    for pos, block in grid.items():
+        if block is not brushLoc.Block.AIR:
+            continue
+        center = brushLoc.grid_to_world(pos)
+        for normal in DIRECTIONS:
+            if grid[pos + normal] not in OPENING_BLOCKS:
+                continue
+            if (center + 128 * normal, -normal) in tiling.TILES:
+                continue
+            # A thin brush lying just inside the air voxel, with the hint on
+            # the face against the opening.
+            axis = normal.axis()
+            bound = center[axis] + 64 * normal[axis]
+            bbox_min = center - 64
+            bbox_max = center + 64
+            bbox_min[axis] = min(bound, bound - normal[axis])
+            bbox_max[axis] = max(bound, bound - normal[axis])
+            prism = vmf.make_prism(bbox_min, bbox_max, consts.Tools.SKIP)
+            for side in prism.solid:
+                if side.normal().dot(normal) < -0.99:
+                    side.mat = consts.Tools.HINT
+            vmf.add_brush(prism.solid)
+            count += 1
+    return count
+
+
+def prepare_vis(vmf: VMF) -> None:
+    """Classify detail brushes and add hints, logging the results."""
+    world_sides = sum(len(solid.sides) for solid in vmf.brushes)
+    detail = make_detail(vmf, brushLoc.POS)
+    hint_count = add_hints(vmf, brushLoc.POS)
+    detail_sides = sum(len(solid.sides) for solid in detail)
+    LOGGER.info(
+        'Vis preparation: {} world brushes made detail, structural faces {} -> {}, {} hints added.',
+        len(detail), world_sides, world_sides - detail_sides, hint_count,
+    )
@@ -0,0 +1,192 @@
+"""A faster VMF serialiser, used to write the converted map.
+
+This produces output identical to VMF.export(), but formats brushes directly.
+Coordinates in PeTI maps are nearly all on the grid, so the formatted floats
+are cached instead of being recomputed for every plane. This copies the
+format written by a specific version of srctools, with other versions
+VMF.export() is used instead.
+"""
+from __future__ import annotations
+
+from typing import IO, Dict
+
+import srctools
+from srctools.math import format_float
+from srctools.vmf import VMF, Entity, Solid, Side
+
+
+__all__ = ['export']
+# The srctools version this was checked against.
+SRCTOOLS_VERSION = '2.3.17'
+
+
+class _FloatCache(Dict[float, str]):
+    """Caches the VMF representation of each float."""
+    def __missing__(self, value: float) -> str:
+        text = self[value] = format_float(value)
+        return text
+
+
+def export(vmf: VMF, file: IO[str], inc_version: bool = True) -> None:
+    """Write the VMF to the file, identically to vmf.export()."""
+    if srctools.__version__ != SRCTOOLS_VERSION:
+        vmf.export(file, inc_version=inc_version)
+        return
+    write = file.write
+    fmt = _FloatCache()
+
+    if inc_version:
+        # Increment this to indicate the map was modified
+        vmf.map_ver += 1
+
+    write(
+        'versioninfo\n{\n'
+        f'\t"editorversion" "{vmf.hammer_ver}"\n'
+        f'\t"editorbuild" "{vmf.hammer_build}"\n'
+        f'\t"mapversion" "{vmf.map_ver}"\n'
+        f'\t"formatversion" "{vmf.format_ver}"\n'
+        f'\t"prefab" "{srctools.bool_as_int(vmf.is_prefab)}"\n}}\n'
+    )
+
+    write('visgroups\n{\n')
+    for vis in vmf.vis_tree:
+        vis.export(file, ind='\t')
+    write('}\n')
+
+    write(
+        'viewsettings\n{\n'
+        f'\t"bSnapToGrid" "{srctools.bool_as_int(vmf.snap_grid)}"\n'
+        f'\t"bShowGrid" "{srctools.bool_as_int(vmf.show_grid)}"\n'
+        f'\t"bShowLogicalGrid" "{srctools.bool_as_int(vmf.show_logic_grid)}"\n'
+        f'\t"nGridSpacing" "{vmf.grid_spacing}"\n'
+        f'\t"bShow3DGrid" "{srctools.bool_as_int(vmf.show_3d_grid)}"\n}}\n'
+    )
+
+    # The worldspawn version should always match the global value.
+    vmf.spawn['mapversion'] = str(vmf.map_ver)
+    vmf.spawn['classname'] = 'worldspawn'
+    _export_brush_ent(vmf.spawn, file, fmt, is_worldspawn=True)
+    del vmf.spawn['mapversion']
+
+    for ent in vmf.entities:
+        if ent.solids:
+            _export_brush_ent(ent, file, fmt, is_worldspawn=False)
+        else:
+            ent.export(file)
+
+    write('cameras\n{\n')
+    if len(vmf.cameras) == 0:
+        vmf.active_cam = -1
+    write(f'\t"activecamera" "{vmf.active_cam}"\n')
+    for cam in vmf.cameras:
+        cam.export(file, '\t')
+    write('}\n')
+
+    write('cordons\n{\n')
+    if len(vmf.cordons) > 0:
+        write(f'\t"active" "{srctools.bool_as_int(vmf.cordon_enabled)}"\n')
+        for cord in vmf.cordons:
+            cord.export(file, '\t')
+    else:
+        write('\t"active" "0"\n')
+    write('}\n')
+
+    if vmf.quickhide_count > 0:
+        write(f'quickhide\n{{\n\t"count" "{vmf.quickhide_count}"\n}}\n')
+
+
+def _export_brush_ent(ent: Entity, file: IO[str], fmt: _FloatCache, is_worldspawn: bool) -> None:
+    """Write out an entity with brushes."""
+    write = file.write
+    ind = ''
+    if ent.hidden:
+        write('hidden\n{\n')
+        ind = '\t'
+
+    write(f'{ind}{"world" if is_worldspawn else "entity"}\n{ind}{{\n{ind}\t"id" "{ent.id}"\n')
+    for key, value in sorted(ent.items()):
+        write(f'{ind}\t"{key}" "{value}"\n')
+    ent.fixup.export(file, ind)
+
+    for solid in ent.solids:
+        _export_solid(solid, file, fmt, ind + '\t', not is_worldspawn)
+
+    if len(ent.outputs) > 0:
+        write(ind + '\tconnections\n' + ind + '\t{\n')
+        for out in ent.outputs:
+            out.export(file, ind=ind + '\t\t')
+        write(ind + '\t}\n')
+
+    if is_worldspawn:
+        for group in ent.map.groups.values():
+            group.export(file, ind + '\t')
+
+    write(f'{ind}\teditor\n{ind}\t{{\n{ind}\t\t"color" "{ent.editor_color}"\n')
+    if not is_worldspawn:
+        for group_id in ent.groups:
+            write(f'{ind}\t\t"groupid" "{group_id}"\n')
+        for vis_id in ent.visgroup_ids:
+            write(f'{ind}\t\t"visgroupid" "{vis_id}"\n')
+        write(
+            f'{ind}\t\t"visgroupshown" "{srctools.bool_as_int(ent.vis_shown)}"\n'
+            f'{ind}\t\t"visgroupautoshown" "{srctools.bool_as_int(ent.vis_auto_shown)}"\n'
+            f'{ind}\t\t"logicalpos" "{ent.logical_pos}"\n'
+        )
+    if ent.comments:
+        write(f'{ind}\t\t"comments" "{ent.comments}"\n')
+    write(f'{ind}\t}}\n{ind}}}\n')
+    if ent.hidden:
+        write('}\n')
+
+
+def _export_solid(solid: Solid, file: IO[str], fmt: _FloatCache, ind: str, include_groups: bool) -> None:
+    """Write out a single brush."""
+    write = file.write
+    if solid.hidden:
+        write(ind + 'hidden\n' + ind + '{\n')
+        ind += '\t'
+    write(f'{ind}solid\n{ind}{{\n{ind}\t"id" "{solid.id}"\n')
+    side_ind = ind + '\t'
+    for side in solid.sides:
+        if side.disp_power > 0:
+            side.export(file, side_ind)
+        else:
+            write(_format_side(side, side_ind, fmt))
+
+    write(f'{ind}\teditor\n{ind}\t{{\n{ind}\t\t"color" "{solid.editor_color}"\n')
+    if include_groups:
+        if solid.group_id is not None:
+            write(f'{ind}\t\t"groupid" "{solid.group_id}"\n')
+        for group in solid.visgroup_ids:
+            write(f'{ind}\t\t"visgroupid" "{group}"\n')
+    write(
+        f'{ind}\t\t"visgroupshown" "{"1" if solid.vis_shown else "0"}"\n'
+        f'{ind}\t\t"visgroupautoshown" "{"1" if solid.vis_auto_shown else "0"}"\n'
+    )
+    if solid.cordon_solid is not None:
+        write(f'{ind}\t\t"cordonsolid" "{solid.cordon_solid}"\n')
+    write(f'{ind}\t}}\n{ind}}}\n')
+    if solid.hidden:
+        write(ind[:-1] + '}\n')
+
+
+def _format_side(side: Side, ind: str, fmt: _FloatCache) -> str:
+    """Produce the text for a non-displacement side."""
+    p1, p2, p3 = side.planes
+    u = side.uaxis
+    v = side.vaxis
+    return (
+        f'{ind}side\n{ind}{{\n'
+        f'{ind}\t"id" "{side.id}"\n'
+        f'{ind}\t"plane" "('
+        f'{fmt[p1.x]} {fmt[p1.y]} {fmt[p1.z]}) ('
+        f'{fmt[p2.x]} {fmt[p2.y]} {fmt[p2.z]}) ('
+        f'{fmt[p3.x]} {fmt[p3.y]} {fmt[p3.z]})"\n'
+        f'{ind}\t"material" "{side.mat}"\n'
+        f'{ind}\t"uaxis" "[{fmt[u.x]} {fmt[u.y]} {fmt[u.z]} {fmt[u.offset]}] {fmt[u.scale]}"\n'
+        f'{ind}\t"vaxis" "[{fmt[v.x]} {fmt[v.y]} {fmt[v.z]} {fmt[v.offset]}] {fmt[v.scale]}"\n'
+        f'{ind}\t"rotation" "{side.ham_rot:g}"\n'
+        f'{ind}\t"lightmapscale" "{side.lightmap}"\n'
+        f'{ind}\t"smoothing_groups" "{side.smooth}"\n'
+        f'{ind}}}\n'
+    )
@@ -0,0 +1,68 @@
+"""Test the summaries produced by the batch compiler."""
+from pathlib import Path
+
+from bench.batch_compile import compare, find_maps, summarise
+
+
+def make_result(name: str, time: float, success: bool = True, brushes: int = 10) -> dict:
+    """Produce a result for a single map."""
+    return {
+        'map': name,
+        'success': success,
+        'time': time,
+        'counts': {'brushes': brushes} if success else {},
+        'error': None if success else 'ValueError: Broken!',
+    }
+
+
+def test_find_maps(tmp_path: Path) -> None:
+    """Folders are searched recursively for maps."""
+    (tmp_path / 'sub').mkdir()
+    for name in ['b.vmf', 'a.vmf', 'sub/c.vmf', 'notes.txt']:
+        (tmp_path / name).touch()
+    extra = tmp_path / 'extra.vmf'
+    assert list(find_maps([tmp_path / 'sub', extra])) == [tmp_path / 'sub/c.vmf', extra]
+    assert [path.name for path in find_maps([tmp_path])] == ['a.vmf', 'b.vmf', 'c.vmf']
+
+
+def test_summarise() -> None:
+    """Failed maps are excluded from the timings."""
+    summary = summarise([
+        make_result('a', 1.0),
+        make_result('b', 3.0),
+        make_result('c', 100.0, success=False),
+    ], 5.0)
+    assert summary == {
+        'maps': 3,
+        'failed': 1,
+        'wall_time': 5.0,
+        'total_time': 4.0,
+        'median_time': 2.0,
+        'max_time': 3.0,
+    }
+
+
+def test_compare() -> None:
+    """Changes in status, counts and significant timings are reported."""
+    old = {'results': [
+        make_result('same', 1.0),
+        make_result('slower', 1.0),
+        make_result('broken', 1.0),
+        make_result('fixed', 1.0, success=False),
+        make_result('brushes', 1.0),
+        make_result('removed', 1.0),
+    ]}
+    new = {'results': [
+        make_result('same', 1.05),
+        make_result('slower', 2.0),
+        make_result('broken', 1.0, success=False),
+        make_result('fixed', 1.0),
+        make_result('brushes', 1.0, brushes=12),
+        make_result('added', 1.0),
+    ]}
+    assert compare(old, new) == [
+        'slower: time 1.000s -> 2.000s (+100.0%)',
+        'broken: now fails: ValueError: Broken!',
+        'fixed: now succeeds',
+        'brushes: brushes 10 -> 12',
+    ]
@@ -0,0 +1,36 @@
+"""Test the synthetic map generator used for benchmarks."""
+import pytest
+
+from bench.mapgen import MapParams, generate
+import consts
+
+
+def test_deterministic() -> None:
+    """The same parameters must produce the same map."""
+    params = MapParams(size=4, height=3, items=3, goo=2, panels=2, seed=42)
+    first, second = generate(params), generate(params)
+    assert len(first.brushes) == len(second.brushes)
+    assert [
+        (ent['classname'], ent['origin']) for ent in first.entities
+    ] == [
+        (ent['classname'], ent['origin']) for ent in second.entities
+    ]
+
+
+def test_contents() -> None:
+    """Check the requested number of each feature is generated."""
+    vmf = generate(MapParams(size=6, height=3, items=4, antline_length=2, goo=3, panels=5))
+    assert len(vmf.by_class['func_instance']) == 4
+    assert len(vmf.by_class['info_player_start']) == 1
+    for overlay in vmf.by_class['info_overlay']:
+        assert overlay['material'] == consts.Antlines.STRAIGHT
+    mats = [side.mat for solid in vmf.brushes for side in solid.sides]
+    assert mats.count(consts.Goo.REFLECTIVE) == 3 * 6
+    assert mats.count(consts.Special.BACKPANELS_CHEAP) == 5 * 5
+
+
+@pytest.mark.parametrize('size, height', [(0, 4), (25, 4), (8, 1), (8, 25)])
+def test_bounds(size: int, height: int) -> None:
+    """Maps must fit inside the puzzlemaker's bounds."""
+    with pytest.raises(ValueError):
+        MapParams(size=size, height=height)
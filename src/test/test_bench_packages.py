@@ -0,0 +1,51 @@
+"""Test the synthetic package generator used for benchmarks."""
+from pathlib import Path
+
+import pytest
+from srctools import Property
+
+from bench.package_load import PackageParams, generate
+from editoritems import Item
+
+
+def test_folders(tmp_path: Path) -> None:
+    """Check the generated folders contain valid definitions."""
+    generate(tmp_path, PackageParams(packages=3, items=6, styles=2, overrides=2, zipped=False))
+    infos = {}
+    for pak_folder in tmp_path.iterdir():
+        with (pak_folder / 'info.txt').open() as f:
+            info = Property.parse(f)
+        infos[info['id']] = info
+
+    assert sorted(infos) == ['BEE2_CLEAN_STYLE', 'BENCH_PAK_1', 'BENCH_PAK_2']
+    assert len(list(infos['BEE2_CLEAN_STYLE'].find_all('Style'))) == 2
+    items = [item for info in infos.values() for item in info.find_all('Item')]
+    assert len(items) == 6
+    overrides = [item for info in infos.values() for item in info.find_all('Overrides', 'Item')]
+    assert len(overrides) == 2
+
+    for item in items:
+        fold = item.find_key('Version').find_key('Styles')['BENCH_STYLE_0']
+        [pak_folder] = [
+            path for path in tmp_path.iterdir()
+            if (path / 'items' / fold).is_dir()
+        ]
+        with (pak_folder / 'items' / fold / 'editoritems.txt').open() as f:
+            [editor], _ = Item.parse(f)
+        assert editor.id == item['id']
+
+
+def test_zipped(tmp_path: Path) -> None:
+    """Zipped sets only produce the archives."""
+    generate(tmp_path, PackageParams(packages=2, zipped=True))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'bee2_clean_style.bee_pack', 'bench_pak_1.bee_pack',
+    ]
+
+
+def test_invalid() -> None:
+    """Overrides need a second style to add."""
+    with pytest.raises(ValueError):
+        PackageParams(styles=1, overrides=1)
+    with pytest.raises(ValueError):
+        PackageParams(items=2, overrides=3)
@@ -0,0 +1,69 @@
+"""Test merging detail brushes."""
+from srctools import VMF, Vec
+
+from precomp import brush_merge
+
+
+def make_detail(vmf: VMF, *boxes: tuple) -> None:
+    """Add a func_detail containing the given boxes."""
+    ent = vmf.create_ent('func_detail')
+    for mins, maxs, mat in boxes:
+        ent.solids.append(vmf.make_prism(Vec(mins), Vec(maxs), mat).solid)
+
+
+def brush_bboxes(vmf: VMF) -> list:
+    """Return the bounds of all detail brushes, in a consistent order."""
+    return sorted(
+        tuple(map(tuple, solid.get_bbox()))
+        for ent in vmf.by_class['func_detail']
+        for solid in ent.solids
+    )
+
+
+def test_merge_grid() -> None:
+    """Check a grid of boxes, split between entities, is merged into one."""
+    vmf = VMF()
+    for x in range(4):
+        make_detail(vmf, *[
+            ((x * 64, y * 64, 0), (x * 64 + 64, y * 64 + 64, 16), 'tools/toolsnodraw')
+            for y in range(3)
+        ])
+    brush_merge.merge_detail(vmf)
+    assert brush_bboxes(vmf) == [((0.0, 0.0, 0.0), (256.0, 192.0, 16.0))]
+    [ent] = vmf.by_class['func_detail']
+    [solid] = ent.solids
+    assert len(solid.sides) == 6
+
+
+def test_merge_blocked() -> None:
+    """Check brushes which would change appearance are left alone."""
+    vmf = VMF()
+    make_detail(
+        vmf,
+        # Different materials.
+        ((0, 0, 0), (64, 64, 64), 'metal/black_wall_metal_002a'),
+        ((64, 0, 0), (128, 64, 64), 'tile/white_wall_tile003a'),
+        # Different size.
+        ((0, 128, 0), (64, 192, 64), 'tools/toolsnodraw'),
+        ((64, 128, 0), (128, 184, 64), 'tools/toolsnodraw'),
+        # Gap between.
+        ((0, 256, 0), (64, 320, 64), 'tools/toolsnodraw'),
+        ((72, 256, 0), (128, 320, 64), 'tools/toolsnodraw'),
+    )
+    before = brush_bboxes(vmf)
+    brush_merge.merge_detail(vmf)
+    assert brush_bboxes(vmf) == before
+
+
+def test_merge_overlay_faces() -> None:
+    """Brushes with faces used by overlays must be kept."""
+    vmf = VMF()
+    make_detail(
+        vmf,
+        ((0, 0, 0), (64, 64, 64), 'tools/toolsnodraw'),
+        ((64, 0, 0), (128, 64, 64), 'tools/toolsnodraw'),
+    )
+    [ent] = vmf.by_class['func_detail']
+    vmf.create_ent('info_overlay', sides=str(ent.solids[1].sides[0].id))
+    brush_merge.merge_detail(vmf)
+    assert len(ent.solids) == 2
@@ -7,7 +7,7 @@ from pathlib import Path
 import pytest
 
 from srctools import Angle, Matrix, VMF, Vec, Property, Solid
-from collisions import BBox, CollideType
+from collisions import BBox, BBoxSet, CollideType
 
 tuple3 = Tuple[int, int, int]
 
@@ -339,3 +339,70 @@ def test_bbox_parse_plane(axis: str, mins: tuple3, maxes: tuple3) -> None:
     ent.solids.append(prism.solid)
     [bbox] = BBox.from_ent(ent)
     assert_bbox(bbox, mins, maxes, CollideType.SOLID, set())
+
+
+def test_bboxset_storage() -> None:
+    """Test the compact set produces the same bounding boxes."""
+    boxes = [
+        BBox(40, 60, 80, 120, 450, 730, contents=CollideType.ANTLINES, tags={'a', 'b'}, name='first'),
+        BBox(-50, 80, -60, 30, -40, 95, contents=CollideType.GLASS, tags='tag1'),
+        BBox(80, 90, 10, 80, 250, 40, contents=CollideType.GRATE | CollideType.SOLID, name='first'),
+    ]
+    bb_set = BBoxSet(boxes)
+    assert len(bb_set) == 3
+    assert list(bb_set) == boxes
+    assert bb_set[1] == boxes[1]
+    assert bb_set[-1] == boxes[2]
+    assert list(bb_set[1:]) == boxes[1:]
+    assert bb_set.names() == {'first', ''}
+    assert bb_set.indexes_for_name('first') == [0, 2]
+    assert bb_set.indexes_for_name('missing') == []
+    with pytest.raises(IndexError):
+        bb_set[3]
+
+
+@pytest.mark.parametrize('pitch', range(0, 360, 90))
+@pytest.mark.parametrize('yaw', range(0, 360, 90))
+@pytest.mark.parametrize('roll', range(0, 360, 90))
+def test_bboxset_transform(pitch: float, yaw: float, roll: float) -> None:
+    """Test transforming a whole set matches transforming each box."""
+    ang = Angle(pitch, yaw, roll)
+    offset = Vec(-128, 64, 385)
+    boxes = [
+        BBox(100, 200, 300, 300, 450, 600, contents=CollideType.ANTLINES, tags='blah'),
+        BBox(-64, -64, -64, 64, 64, -64, contents=CollideType.SOLID, name='item'),
+        BBox(0, 0, 0, 16, 128, 128, contents=CollideType.GLASS | CollideType.BRIDGE),
+    ]
+    result = BBoxSet(boxes).transformed(ang, offset, 'renamed')
+    assert list(result) == [
+        (bbox @ ang + offset).with_attrs(name='renamed')
+        for bbox in boxes
+    ]
+    # Without a name, the originals are kept.
+    assert list(BBoxSet(boxes).transformed(Matrix.from_angle(ang))) == [
+        bbox @ ang for bbox in boxes
+    ]
+
+
+def test_bboxset_intersections() -> None:
+    """Test the pairwise intersection tests match BBox.intersect()."""
+    first = [
+        BBox(-64, -64, -64, 64, 64, 64, contents=CollideType.SOLID, name='a'),
+        BBox(0, 0, 0, 128, 128, 128, contents=CollideType.GLASS, tags='t'),
+        BBox(512, 512, 512, 640, 640, 640, contents=CollideType.EVERYTHING),
+    ]
+    second = [
+        BBox(32, 32, 32, 96, 96, 96, contents=CollideType.SOLID | CollideType.GLASS),
+        BBox(64, -64, -64, 128, 64, 64, contents=CollideType.SOLID),  # Touching plane.
+        BBox(64, 64, -64, 128, 128, 64, contents=CollideType.SOLID),  # Touching edge.
+        BBox(-64, -64, -64, 64, 64, 64, contents=CollideType.DECORATION),
+    ]
+    expected = []
+    for i, bb_a in enumerate(first):
+        for j, bb_b in enumerate(second):
+            overlap = bb_a.intersect(bb_b)
+            if overlap is not None:
+                expected.append((i, j, overlap))
+    assert len(expected) == 3
+    assert list(BBoxSet(first).intersections(BBoxSet(second))) == expected
+    assert list(BBoxSet(first).intersections(BBoxSet())) == []
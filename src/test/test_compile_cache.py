@@ -0,0 +1,108 @@
+"""Test the converted map cache."""
+import os
+from pathlib import Path
+
+from srctools.dmx import Element, Attribute, ValueType
+
+from BEE2_config import ConfigFile
+from precomp import compile_cache
+
+
+def test_key_changes(tmp_path: Path, monkeypatch) -> None:
+    """Check the key depends on the map and exported configuration."""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('bee2')
+    map_path = tmp_path / 'preview.vmf'
+    map_path.write_text('world {}')
+    Path('bee2/vbsp_config.cfg').write_text('"Options" {}')
+    compile_conf = ConfigFile(None)
+    compile_conf['General']['spawn_elev'] = '1'
+    compile_conf['Counts']['brush'] = '42'
+    item_conf = ConfigFile(None)
+
+    key = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert compile_cache.compute_key(str(map_path), compile_conf, item_conf) == key
+
+    # Entity counts are written after every compile, ignore them.
+    compile_conf['Counts']['brush'] = '48'
+    assert compile_cache.compute_key(str(map_path), compile_conf, item_conf) == key
+
+    compile_conf['General']['spawn_elev'] = '0'
+    key_opt = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert key_opt != key
+
+    item_conf['ITEM_ID']['timer'] = '5'
+    key_item = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert key_item != key_opt
+
+    Path('bee2/vbsp_config.cfg').write_text('"Options" { "a" "b" }')
+    key_conf = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert key_conf != key_item
+
+    map_path.write_text('world { "id" "1" }')
+    assert compile_cache.compute_key(str(map_path), compile_conf, item_conf) != key_conf
+
+
+def test_key_templates(tmp_path: Path, monkeypatch) -> None:
+    """Check the key depends on the templates in packages."""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('bee2')
+    map_path = tmp_path / 'preview.vmf'
+    map_path.write_text('world {}')
+    compile_conf = ConfigFile(None)
+    item_conf = ConfigFile(None)
+
+    folder = tmp_path / 'folder_pack'
+    (folder / 'templates').mkdir(parents=True)
+    template = folder / 'templates' / 'temp.vmf'
+    template.write_text('world {}')
+    zip_pack = tmp_path / 'zip_pack.bee_pack'
+    zip_pack.write_bytes(b'zip')
+
+    root = Element('Templates', 'DMERoot')
+    temp_list = root['temp'] = Attribute.array('list', ValueType.ELEMENT)
+    for temp_id, pak_path in [('FOLDER', folder), ('ZIP', zip_pack)]:
+        temp_el = Element(temp_id, 'DMETemplate')
+        temp_el['package'] = str(pak_path)
+        temp_el['path'] = 'templates/temp.vmf'
+        temp_list.append(temp_el)
+    with open(compile_cache.TEMPLATE_LIST, 'wb') as f:
+        root.export_binary(f, fmt_name='bee_templates', unicode='format')
+
+    key = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert compile_cache.compute_key(str(map_path), compile_conf, item_conf) == key
+
+    # The list is unchanged, but the package contents change.
+    template.write_text('world { "id" "1" }')
+    key_folder = compile_cache.compute_key(str(map_path), compile_conf, item_conf)
+    assert key_folder != key
+
+    os.utime(zip_pack, ns=(0, 0))
+    assert compile_cache.compute_key(str(map_path), compile_conf, item_conf) != key_folder
+
+
+def test_store_fetch(tmp_path: Path, monkeypatch) -> None:
+    """Check maps can be retrieved, and the least recently used are evicted."""
+    monkeypatch.chdir(tmp_path)
+    styled = tmp_path / 'styled' / 'preview.vmf'
+    assert not compile_cache.fetch('a', str(styled))
+
+    src = tmp_path / 'converted.vmf'
+    for i, key in enumerate('abc'):
+        src.write_text(f'map {key}')
+        compile_cache.store(key, str(src), 2)
+        # Ensure the modification times differ.
+        os.utime(compile_cache.CACHE_DIR / f'{key}.vmf', (i, i))
+
+    assert sorted(path.name for path in compile_cache.CACHE_DIR.iterdir()) == ['b.vmf', 'c.vmf']
+    assert compile_cache.fetch('b', str(styled))
+    assert styled.read_text() == 'map b'
+
+    # 'b' was just used, so 'c' is evicted instead.
+    src.write_text('map d')
+    compile_cache.store('d', str(src), 2)
+    assert sorted(path.name for path in compile_cache.CACHE_DIR.iterdir()) == ['b.vmf', 'd.vmf']
+
+    # Zero disables the cache.
+    compile_cache.store('e', str(src), 0)
+    assert not compile_cache.fetch('e', str(styled))
@@ -0,0 +1,99 @@
+"""Test the compile metrics file."""
+import json
+from pathlib import Path
+
+import compile_metrics
+from compile_metrics import CompileMetrics
+
+
+def test_lap() -> None:
+    """Check repeated stages accumulate."""
+    metrics = CompileMetrics('vbsp')
+    metrics.lap('load')
+    metrics.lap('tiling')
+    first = metrics.stages['load']
+    metrics.lap('load')
+    assert metrics.stages['load'] >= first
+    assert sorted(metrics.stages) == ['load', 'tiling']
+    assert metrics.as_dict()['peak_memory'] > 0
+
+
+def test_merge(tmp_path: Path) -> None:
+    """VRAD adds to the record VBSP wrote for the same map."""
+    path = tmp_path / 'compile_metrics.json'
+    vbsp = CompileMetrics('vbsp', counts={'brushes': 12})
+    vbsp.success = True
+    compile_metrics.write(vbsp, 'preview', path=path)
+    compile_metrics.write(CompileMetrics('vrad', counts={'packed_files': 3}), 'preview', path=path)
+
+    record = json.loads(path.read_text())
+    assert record['format'] == compile_metrics.FORMAT_VERSION
+    assert record['map'] == 'preview'
+    assert record['vbsp']['counts'] == {'brushes': 12}
+    assert record['vbsp']['success'] is True
+    assert record['vrad']['counts'] == {'packed_files': 3}
+    assert not path.with_suffix('.jsonl').exists()
+
+    # Compiling again starts a new record.
+    compile_metrics.write(CompileMetrics('vbsp'), 'preview', path=path)
+    assert 'vrad' not in json.loads(path.read_text())
+    # As does compiling another map.
+    compile_metrics.write(CompileMetrics('vbsp'), 'preview', path=path)
+    compile_metrics.write(CompileMetrics('vrad'), 'other', path=path)
+    assert 'vbsp' not in json.loads(path.read_text())
+
+
+def test_history(tmp_path: Path) -> None:
+    """Complete records are appended to the history."""
+    path = tmp_path / 'compile_metrics.json'
+    path.write_text('not json')
+    for name in ['first', 'second']:
+        compile_metrics.write(CompileMetrics('vbsp'), name, path=path)
+        compile_metrics.write(CompileMetrics('vrad'), name, history=True, path=path)
+
+    lines = path.with_suffix('.jsonl').read_text().splitlines()
+    assert [json.loads(line)['map'] for line in lines] == ['first', 'second']
+    assert all('vbsp' in json.loads(line) for line in lines)
+
+
+def test_subsystem() -> None:
+    """Allocations are grouped by our module or the library package."""
+    src = compile_metrics.SRC_ROOT
+    assert compile_metrics.subsystem(str(src / 'precomp' / 'tiling.py')) == 'precomp.tiling'
+    assert compile_metrics.subsystem(str(src / 'precomp' / 'conditions' / '__init__.py')) == 'precomp.conditions'
+    assert compile_metrics.subsystem('/usr/lib/python3/site-packages/srctools/vmf.py') == 'srctools'
+    assert compile_metrics.subsystem('/usr/lib/python3/site-packages/attr/_make.py') == 'attr'
+    assert compile_metrics.subsystem('/usr/lib/python3/json/decoder.py') == '<python>'
+
+
+def test_retained_size() -> None:
+    """Shared objects are excluded from the size."""
+    class Shared:
+        """Something referenced by the contents of a cache."""
+        def __init__(self) -> None:
+            self.data = bytes(100_000)
+
+    shared = Shared()
+    cache = {'a': [shared, bytes(1000)]}
+    assert compile_metrics.retained_size(cache) > 100_000
+    size = compile_metrics.retained_size(cache, (Shared, ))
+    assert 1000 < size < 100_000
+
+
+def test_tracer() -> None:
+    """Memory is recorded for each stage when tracing."""
+    cache = []
+    tracer = compile_metrics.MemoryTracer(caches={'cache': lambda: cache}, top=3)
+    metrics = CompileMetrics('vbsp', tracer=tracer)
+    tracer.start()
+    try:
+        metrics.lap('first')
+        cache.extend(bytes(1000) for _ in range(1000))
+        metrics.lap('second')
+    finally:
+        tracer.stop()
+    memory = metrics.as_dict()['memory']
+    assert list(memory) == ['first', 'second']
+    assert memory['second']['caches']['cache'] > memory['first']['caches']['cache'] + 1_000_000
+    assert memory['second']['growth']['test.test_compile_metrics'] > 1_000_000
+    assert len(memory['second']['top_sites']) == 3
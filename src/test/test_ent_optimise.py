@@ -0,0 +1,127 @@
+"""Test the logic entity optimisation pass."""
+from srctools import VMF, Output
+
+from precomp import ent_optimise
+
+
+def test_merge_identical() -> None:
+    """Identical relays are merged, and outputs retargeted."""
+    vmf = VMF()
+    relays = []
+    for i in range(3):
+        relay = vmf.create_ent(
+            'logic_relay', targetname=f'relay_{i}', origin=f'{i * 16} 0 0', spawnflags=2,
+        )
+        relay.add_out(
+            Output('OnTrigger', 'door', 'Open'),
+            Output('OnTrigger', 'light', 'TurnOn', delay=0.5),
+        )
+        relays.append(relay)
+    # Each relay is triggered twice, so they aren't collapsed.
+    button = vmf.create_ent('func_button', targetname='button')
+    for i in range(3):
+        button.add_out(
+            Output('OnPressed', f'relay_{i}', 'Trigger'),
+            Output('OnDamaged', f'relay_{i}', 'Trigger', delay=1.0),
+        )
+    # Different outputs.
+    other = vmf.create_ent('logic_relay', targetname='other', spawnflags=2)
+    other.add_out(Output('OnTrigger', 'door', 'Close'))
+    button.add_out(Output('OnPressed', 'other', 'Trigger'), Output('OnOut', 'other', 'Trigger'))
+    # Outputs which behave differently once merged.
+    unmergeable = []
+    for i, out in enumerate([
+        Output('OnTrigger', '!self', 'Kill'),
+        Output('OnTrigger', 'door', 'Open', only_once=True),
+        Output('OnSpawn', 'door', 'Open'),
+        Output('OnUser1', 'door', 'Open'),
+    ]):
+        for j in range(2):
+            relay = vmf.create_ent('logic_relay', targetname=f'self_{i}_{j}', spawnflags=2)
+            relay.add_out(out.copy())
+            button.add_out(
+                Output('OnPressed', f'self_{i}_{j}', 'Trigger'),
+                Output('OnOut', f'self_{i}_{j}', 'Trigger'),
+            )
+            unmergeable.append(relay)
+
+    ent_optimise.optimise_ents(vmf)
+    assert vmf.by_class['logic_relay'] == {relays[0], other, *unmergeable}
+    assert sorted(
+        out.target for out in button.outputs
+        if not out.target.startswith('self_')
+    ) == ['other', 'other'] + ['relay_0'] * 6
+
+
+def test_stateful_relays() -> None:
+    """Relays which can be disabled or are referenced elsewhere must be kept."""
+    vmf = VMF()
+    for name in ['relay_a', 'relay_b', '@global_a', '@global_b', 'inst-a', 'inst-b']:
+        relay = vmf.create_ent('logic_relay', targetname=name, spawnflags=2)
+        relay.add_out(Output('OnTrigger', 'door', 'Open'))
+    vmf.create_ent('func_instance', targetname='inst', file='instances/x.vmf')
+    button = vmf.create_ent('func_button')
+    button.add_out(
+        Output('OnPressed', 'relay_a', 'Trigger'),
+        Output('OnPressed', 'relay_a', 'Disable'),
+        Output('OnPressed', 'relay_b', 'Trigger'),
+        Output('OnPressed', 'relay_b', 'Trigger'),
+    )
+    ent_optimise.optimise_ents(vmf)
+    assert len(vmf.by_class['logic_relay']) == 6
+
+
+def test_refire_relays() -> None:
+    """Relays which don't allow fast retrigger, or only fire once are kept."""
+    vmf = VMF()
+    button = vmf.create_ent('func_button', targetname='button')
+    for i, flags in enumerate(['0', '', '1', '3']):
+        for j in range(2):
+            relay = vmf.create_ent('logic_relay', targetname=f'relay_{i}_{j}', spawnflags=flags)
+            relay.add_out(Output('OnTrigger', 'door', 'Open', delay=1.0))
+            button.add_out(Output('OnPressed', f'relay_{i}_{j}', 'Trigger'))
+    ent_optimise.optimise_ents(vmf)
+    assert len(vmf.by_class['logic_relay']) == 8
+    assert sorted(out.target for out in button.outputs) == sorted(
+        f'relay_{i}_{j}' for i in range(4) for j in range(2)
+    )
+
+
+def test_collapse_chain() -> None:
+    """Relays with one input are collapsed into that output."""
+    vmf = VMF()
+    button = vmf.create_ent('func_button', targetname='button')
+    button.add_out(Output('OnPressed', 'relay_1', 'Trigger', delay=1.0))
+    relay_1 = vmf.create_ent('logic_relay', targetname='relay_1', spawnflags=2)
+    relay_1.add_out(
+        Output('OnTrigger', 'relay_2', 'Trigger', delay=0.5),
+        Output('OnTrigger', 'door', 'Open', only_once=True),
+    )
+    relay_2 = vmf.create_ent('logic_relay', targetname='relay_2', spawnflags=2)
+    relay_2.add_out(Output('OnTrigger', 'light', 'TurnOn', 'param', delay=0.25))
+    # Uses !self, so it can't be collapsed.
+    relay_3 = vmf.create_ent('logic_relay', targetname='relay_3', spawnflags=2)
+    relay_3.add_out(Output('OnTrigger', '!self', 'Kill'))
+    button.add_out(Output('OnPressed', 'relay_3', 'Trigger'))
+
+    ent_optimise.optimise_ents(vmf)
+    assert vmf.by_class['logic_relay'] == {relay_3}
+    assert sorted(
+        (out.output, out.target, out.input, out.params, out.delay, out.times)
+        for out in button.outputs
+    ) == [
+        ('OnPressed', 'door', 'Open', '', 1.0, 1),
+        ('OnPressed', 'light', 'TurnOn', 'param', 1.75, -1),
+        ('OnPressed', 'relay_3', 'Trigger', '', 0.0, -1),
+    ]
+
+
+def test_filter_references() -> None:
+    """Identical filters are merged, and filtername keyvalues updated."""
+    vmf = VMF()
+    vmf.create_ent('filter_activator_class', targetname='filt_1', filterclass='prop_weighted_cube')
+    vmf.create_ent('filter_activator_class', targetname='filt_2', filterclass='prop_weighted_cube')
+    trig = vmf.create_ent('trigger_multiple', filtername='filt_2')
+    ent_optimise.optimise_ents(vmf)
+    assert len(vmf.by_class['filter_activator_class']) == 1
+    assert trig['filtername'] == 'filt_1'
@@ -0,0 +1,81 @@
+"""Test exporting from the command line."""
+from pathlib import Path
+import functools
+import tkinter
+
+import pytest
+import trio
+
+try:
+    from app import export_cli
+    import packages
+except tkinter.TclError:  # The app creates the Tk root on import.
+    pytest.skip('A display is required to import the app.', allow_module_level=True)
+
+
+def test_parse_args() -> None:
+    """Check the defaults and validation of the arguments."""
+    args = export_cli.parse_args([])
+    assert args.games == []
+    assert not args.all_games
+    assert args.palette is None
+    assert args.refresh is None
+    assert args.jobs == 1
+
+    args = export_cli.parse_args([
+        '-g', 'Portal 2', '--game', 'Aperture Tag',
+        '-p', 'pal.bee2_palette', '--no-refresh', '-j', '2',
+    ])
+    assert args.games == ['Portal 2', 'Aperture Tag']
+    assert args.palette == Path('pal.bee2_palette')
+    assert args.refresh is False
+    assert args.jobs == 2
+    assert export_cli.parse_args(['--refresh']).refresh is True
+
+
+@pytest.mark.parametrize('argv', [
+    ['--all-games', '-g', 'Portal 2'],
+    ['--refresh', '--no-refresh'],
+    ['--jobs', '0'],
+    ['--unknown'],
+], ids=['games', 'refresh', 'jobs', 'unknown'])
+def test_parse_args_invalid(argv: list, capsys: pytest.CaptureFixture) -> None:
+    """Invalid arguments exit with the documented code."""
+    with pytest.raises(SystemExit) as exc:
+        export_cli.parse_args(argv)
+    assert exc.value.code == export_cli.EXIT_BAD_ARGS
+
+
+def test_console_screen(capsys: pytest.CaptureFixture) -> None:
+    """Progress is printed at each interval, instead of being shown in a window."""
+    screen = export_cli.ConsoleScreen(
+        ('EXP', 'Export Configuration'),
+        ('RES', ''),
+        title_text='Exporting',
+        prefix='Portal 2',
+    )
+    screen.set_length('EXP', 20)
+    for _ in range(4):
+        screen.step('EXP')
+    # Steps past the end are ignored.
+    screen.set_length('RES', 1)
+    screen.step('RES')
+    screen.step('RES')
+    screen.skip_stage('EXP')
+    assert capsys.readouterr().out.splitlines() == [
+        '[Portal 2] Export Configuration: 2/20 (10%)',
+        '[Portal 2] Export Configuration: 4/20 (20%)',
+        '[Portal 2] RES: 1/1 (100%)',
+        '[Portal 2] Export Configuration: skipped',
+    ]
+
+
+def test_no_packages(tmp_path: Path) -> None:
+    """Without packages, loading non-interactively raises instead of showing a messagebox."""
+    screen = export_cli.ConsoleScreen(('PAK', 'Packages'), ('OBJ', 'Objects'), title_text='Loading')
+    with pytest.raises(packages.NoPackagesError):
+        trio.run(functools.partial(
+            packages.load_packages,
+            packages.PackagesSet(), [tmp_path],
+            loader=screen, interactive=False,
+        ))
@@ -0,0 +1,35 @@
+"""Test the grid optimisation functions."""
+import random
+
+from precomp.grid_optim import optimise, optimise_dense
+import pytest
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('fill', [0.3, 0.7, 0.95])
+def test_dense_matches(seed: int, fill: float) -> None:
+    """Check the dense version produces the same boxes as the regular one."""
+    rand = random.Random(seed)
+    width = rand.randint(1, 24)
+    height = rand.randint(1, 24)
+    grid = {}
+    cells = bytearray(width * height)
+    for x in range(width):
+        for y in range(height):
+            if rand.random() < fill:
+                grid[x, y] = True
+                cells[x * height + y] = 1
+
+    expected = [
+        (min_x, min_y, max_x, max_y)
+        for min_x, min_y, max_x, max_y, _ in optimise(grid)
+    ]
+    assert list(optimise_dense(cells, width, height)) == expected
+    assert not any(cells)
+
+
+def test_dense_full() -> None:
+    """A completely filled grid produces a single box."""
+    cells = bytearray(b'\x01' * 12)
+    assert list(optimise_dense(cells, 3, 4)) == [(0, 0, 2, 3)]
+    assert list(optimise_dense(bytearray(12), 3, 4)) == []
@@ -0,0 +1,162 @@
+"""Test the image cache, and the cache of resized images on disk."""
+from typing import Optional, Set
+from pathlib import Path
+import os
+import tkinter
+
+from PIL import Image
+from srctools.filesys import RawFileSystem
+import pytest
+
+import utils
+
+try:
+    from app import img
+except tkinter.TclError:  # The app creates the Tk root on import.
+    pytest.skip('A display is required to import the app.', allow_module_level=True)
+
+
+class FakeTkImage:
+    """Just enough of a Tk image to be measured."""
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def width(self) -> int:
+        return self.size
+
+    def height(self) -> int:
+        return self.size
+
+
+class FakeHandle:
+    """Has the attributes of a handle the cache uses."""
+    def __init__(self, pil: bool = True, tk: bool = True, used: bool = False) -> None:
+        # 10x10 RGBA = 400 bytes for each.
+        self._cached_pil: Optional[Image.Image] = Image.new('RGBA', (10, 10)) if pil else None
+        self._cached_tk: Optional[FakeTkImage] = FakeTkImage(10) if tk else None
+        self._users: Set[object] = {object()} if used else set()
+        self._force_loaded = False
+        self._loading = False
+
+
+def make_cache(budget: int, *handles: FakeHandle) -> img.ImageCache:
+    """Create a cache with these handles loaded, in order of use."""
+    cache = img.ImageCache(budget)
+    for handle in handles:
+        cache.update(handle)
+    return cache
+
+
+def test_lru_order() -> None:
+    """The least recently used handles are evicted first, until under budget."""
+    handles = [FakeHandle() for _ in range(4)]
+    cache = make_cache(2000, *handles)
+    assert cache.loaded_bytes == 3200
+    cache.touch(handles[0])
+    cache.evict()
+    assert cache.loaded_bytes == 1600
+    assert cache.evictions == 2
+    assert [handle._cached_pil is not None for handle in handles] == [True, False, False, True]
+    assert [handle._cached_tk is not None for handle in handles] == [True, False, False, True]
+    # Under budget, nothing happens.
+    cache.budget = 1600
+    cache.evict()
+    assert cache.evictions == 2
+
+
+def test_in_use() -> None:
+    """Handles in use only lose their PIL image, force-loaded handles are never evicted."""
+    forced = FakeHandle()
+    forced._force_loaded = True
+    used = FakeHandle(used=True)
+    unused = FakeHandle()
+    cache = make_cache(0, forced, used, unused)
+    cache.evict()
+    assert forced._cached_pil is not None and forced._cached_tk is not None
+    assert used._cached_pil is None and used._cached_tk is not None
+    assert unused._cached_pil is None and unused._cached_tk is None
+    assert cache.loaded_bytes == 800 + 400
+    assert cache.stats()['handles'] == 2
+
+
+def test_set_aside() -> None:
+    """Handles with nothing to discard aren't checked again until they change."""
+    stuck = [FakeHandle(pil=False, used=True) for _ in range(3)]
+    cache = make_cache(0, *stuck)
+    cache.evict()
+    assert not cache._handles
+    assert cache.loaded_bytes == 1200
+
+    # Now unused, it can be evicted.
+    stuck[1]._users.clear()
+    cache.release(stuck[1])
+    cache.evict()
+    assert stuck[1]._cached_tk is None
+    assert cache.loaded_bytes == 800
+
+    # Reloading the PIL image makes it a candidate again.
+    stuck[2]._cached_pil = Image.new('RGBA', (10, 10))
+    cache.update(stuck[2])
+    cache.evict()
+    assert stuck[2]._cached_pil is None
+    assert stuck[2]._cached_tk is not None
+    assert cache.loaded_bytes == 800
+
+
+def test_rate_limit() -> None:
+    """Scans are skipped if the last was too recent."""
+    first, second = FakeHandle(), FakeHandle()
+    cache = make_cache(0, first)
+    cache.interval = 3600.0
+    cache.evict()
+    assert first._cached_pil is None
+    cache.update(second)
+    cache.evict()
+    assert second._cached_pil is not None
+
+
+def test_thumb_key(tmp_path: Path) -> None:
+    """The cached location changes if the file or resize parameters change."""
+    (tmp_path / 'item.png').write_bytes(b'image')
+    fsys = RawFileSystem(str(tmp_path))
+    uri = utils.PackagePath('pak', 'item.png')
+    path = img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.LANCZOS)
+    assert path is not None
+    assert img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.LANCZOS) == path
+
+    assert img._thumb_cache_path(fsys['item.png'], uri, 32, 64, Image.LANCZOS) != path
+    assert img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.NEAREST) != path
+    other_uri = utils.PackagePath('other', 'item.png')
+    assert img._thumb_cache_path(fsys['item.png'], other_uri, 64, 64, Image.LANCZOS) != path
+    # Not resized, so not cached.
+    assert img._thumb_cache_path(fsys['item.png'], uri, 0, 0, Image.LANCZOS) is None
+
+    # Modifying the file changes the key.
+    os.utime(tmp_path / 'item.png', (0, 0))
+    assert img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.LANCZOS) != path
+
+
+def test_thumb_version(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Changing the cache version invalidates all entries."""
+    (tmp_path / 'item.png').write_bytes(b'image')
+    fsys = RawFileSystem(str(tmp_path))
+    uri = utils.PackagePath('pak', 'item.png')
+    path = img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.LANCZOS)
+    monkeypatch.setattr(img, 'THUMB_CACHE_VERSION', img.THUMB_CACHE_VERSION + 1)
+    assert img._thumb_cache_path(fsys['item.png'], uri, 64, 64, Image.LANCZOS) != path
+
+
+def test_evict_thumbs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The least recently used images are removed once over the size."""
+    monkeypatch.setattr(img, 'THUMB_CACHE_DIR', tmp_path)
+    for i in range(4):
+        path = tmp_path / f'{i}.png'
+        path.write_bytes(bytes(100))
+        os.utime(path, (i, i))
+    # Fetching an image marks it as used.
+    Image.new('RGBA', (4, 4)).save(tmp_path / 'fetched.png')
+    os.utime(tmp_path / 'fetched.png', (0, 0))
+    assert img._fetch_thumb(tmp_path / 'fetched.png') is not None
+
+    img.evict_thumbs(250 + (tmp_path / 'fetched.png').stat().st_size)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['2.png', '3.png', 'fetched.png']
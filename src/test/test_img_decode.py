@@ -0,0 +1,35 @@
+"""Test decoding package images."""
+import io
+
+from PIL import Image
+from srctools.vtf import VTF, ImageFormats
+
+import img_decode
+
+
+def test_png() -> None:
+    """PNGs are converted to RGBA, and resized."""
+    buf = io.BytesIO()
+    Image.new('RGB', (128, 64), (255, 0, 0)).save(buf, 'png')
+    image = img_decode.decode(buf.getvalue(), 'png', 0, 0, Image.NEAREST)
+    assert image.mode == 'RGBA'
+    assert image.size == (128, 64)
+
+    image = img_decode.decode(buf.getvalue(), 'png', 32, 32, Image.NEAREST)
+    assert image.size == (32, 32)
+    assert image.getpixel((4, 4)) == (255, 0, 0, 255)
+
+
+def test_vtf_raw() -> None:
+    """VTFs are decoded, and can be reconstructed from the raw data."""
+    vtf = VTF(256, 256, fmt=ImageFormats.RGBA8888)
+    vtf.get().copy_from(Image.new('RGBA', (256, 256), (0, 255, 0, 128)).tobytes())
+    vtf.compute_mipmaps()
+    buf = io.BytesIO()
+    vtf.save(buf)
+
+    mode, size, pixels = img_decode.decode_raw(buf.getvalue(), 'vtf', 64, 64, Image.NEAREST)
+    assert mode == 'RGBA'
+    assert size == (64, 64)
+    image = Image.frombytes(mode, size, pixels)
+    assert image.getpixel((10, 10)) == (0, 255, 0, 128)
@@ -0,0 +1,88 @@
+"""Test assigning lightmap scales to faces."""
+import pytest
+from srctools import VMF, Vec
+
+# Import this first, to avoid circular imports.
+from precomp import template_brush  # noqa
+from precomp import brushLoc, lightmaps, tiling
+
+
+PROFILE = lightmaps.Profile(coarse=64, normal=32, fine=8)
+
+
+@pytest.fixture
+def grid(monkeypatch: pytest.MonkeyPatch) -> brushLoc.Grid:
+    """Produce a 1x1x4 shaft of air surrounded by solid, with a pit at the bottom.
+
+    In world coordinates, the air spans from (0, 0, 0) to (128, 128, 512).
+    """
+    grid = brushLoc.Grid()
+    for pos in Vec.iter_grid(Vec(-1, -1, -1), Vec(1, 1, 4)):
+        grid[pos] = brushLoc.Block.SOLID
+    grid[0, 0, 0] = brushLoc.Block.PIT_SINGLE
+    for z in range(1, 4):
+        grid[0, 0, z] = brushLoc.Block.AIR
+    monkeypatch.setattr(brushLoc, 'POS', grid)
+    monkeypatch.setattr(tiling, 'TILES', tiling.TileGrid())
+    return grid
+
+
+def faces_by_normal(vmf: VMF, mins: Vec, maxs: Vec) -> dict:
+    """Add a brush, and return its sides indexed by the outward normal."""
+    solid = vmf.make_prism(mins, maxs, 'metal/black_wall_metal_002a').solid
+    vmf.add_brush(solid)
+    return {tuple(-side.normal()): side for side in solid}
+
+
+def test_categories(grid: brushLoc.Grid) -> None:
+    """Faces are categorised by what is in front of them."""
+    vmf = VMF()
+    # A wall brush on the +X side of the shaft, at the height of the pit.
+    pit_wall = faces_by_normal(vmf, Vec(128, 0, 0), Vec(256, 128, 128))
+    # A floor brush at z=1.
+    floor = faces_by_normal(vmf, Vec(0, 0, 112), Vec(128, 128, 128))
+    # The ceiling at the top of the shaft.
+    ceiling = faces_by_normal(vmf, Vec(0, 0, 512), Vec(128, 128, 640))
+
+    lightmaps.assign_scales(vmf, PROFILE)
+
+    assert pit_wall[-1, 0, 0].lightmap == PROFILE.coarse
+    # Facing into the solid block.
+    assert pit_wall[1, 0, 0].lightmap == PROFILE.coarse
+    assert floor[0, 0, 1].lightmap == PROFILE.normal
+    # Faces into the pit below.
+    assert floor[0, 0, -1].lightmap == PROFILE.coarse
+    assert ceiling[0, 0, -1].lightmap == PROFILE.coarse
+
+
+def test_lights_and_portal_surfaces(grid: brushLoc.Grid) -> None:
+    """Faces near lights and portalable faces are fine."""
+    vmf = VMF()
+    ceiling = faces_by_normal(vmf, Vec(0, 0, 512), Vec(128, 128, 640))
+    floor = faces_by_normal(vmf, Vec(0, 0, 112), Vec(128, 128, 128))
+    vmf.create_ent('light', origin='64 64 192')
+    # These light the whole map, so their position doesn't matter.
+    vmf.create_ent('light_environment', origin='64 64 500')
+
+    tile = tiling.TileDef.ensure(Vec(64, 64, 576), Vec(0, 0, -1), tiling.TileType.WHITE)
+    tile.brush_faces.append(ceiling[0, 0, -1])
+
+    lightmaps.assign_scales(vmf, PROFILE)
+
+    assert floor[0, 0, 1].lightmap == PROFILE.fine
+    assert ceiling[0, 0, -1].lightmap == PROFILE.fine
+    # Inside the brush, but not portalable.
+    assert ceiling[0, 0, 1].lightmap == PROFILE.coarse
+
+
+def test_explicit_scales_kept(grid: brushLoc.Grid) -> None:
+    """Faces with a non-default scale or tool textures are left alone."""
+    vmf = VMF()
+    floor = faces_by_normal(vmf, Vec(0, 0, 112), Vec(128, 128, 128))
+    floor[0, 0, 1].lightmap = 4
+    floor[0, 0, -1].mat = 'tools/toolsnodraw'
+
+    lightmaps.assign_scales(vmf, PROFILE)
+
+    assert floor[0, 0, 1].lightmap == 4
+    assert floor[0, 0, -1].lightmap == 16
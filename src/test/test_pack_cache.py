@@ -0,0 +1,45 @@
+"""Test caching packed file dependencies."""
+from pathlib import Path
+import os
+
+from srctools.filesys import FileSystemChain, RawFileSystem
+from srctools.packlist import FileType
+
+from postcomp.pack_cache import CachedPackList
+
+
+def make_packlist(root: Path) -> CachedPackList:
+    """Create a packlist, evaluating a material."""
+    packlist = CachedPackList(FileSystemChain(RawFileSystem(str(root / 'game'))))
+    packlist.load_dep_cache(root / 'cache.bin')
+    packlist.pack_file('materials/test/wall.vmt', FileType.MATERIAL)
+    packlist.eval_dependencies()
+    packlist.save_dep_cache(root / 'cache.bin')
+    return packlist
+
+
+def test_cache_replay(tmp_path: Path) -> None:
+    """Unchanged files reuse the cached dependencies, changed ones are re-parsed."""
+    mat_folder = tmp_path / 'game' / 'materials' / 'test'
+    mat_folder.mkdir(parents=True)
+    vmt = mat_folder / 'wall.vmt'
+    vmt.write_text('LightmappedGeneric\n{\n"$basetexture" "test/wall"\n}\n')
+    (mat_folder / 'wall.vtf').write_bytes(b'')
+    (mat_folder / 'other.vtf').write_bytes(b'')
+
+    first = make_packlist(tmp_path)
+    assert (first.cache_hits, first.cache_misses) == (0, 1)
+    assert 'materials/test/wall.vtf' in first
+
+    second = make_packlist(tmp_path)
+    assert (second.cache_hits, second.cache_misses) == (1, 0)
+    assert sorted(second.filenames()) == sorted(first.filenames())
+
+    vmt.write_text('LightmappedGeneric\n{\n"$basetexture" "test/other"\n}\n')
+    # Ensure the modification time changes.
+    stat = vmt.stat()
+    os.utime(vmt, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = make_packlist(tmp_path)
+    assert (third.cache_hits, third.cache_misses) == (0, 1)
+    assert 'materials/test/other.vtf' in third
+    assert 'materials/test/wall.vtf' not in third
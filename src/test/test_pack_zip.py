@@ -0,0 +1,41 @@
+"""Test packing files into the BSP in parallel."""
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from zipfile import ZipFile
+
+from srctools.filesys import FileSystemChain, RawFileSystem
+from srctools.packlist import PackList, FileType
+
+from postcomp import pack_zip
+
+
+def make_bsp() -> SimpleNamespace:
+    """Make a stand-in for a BSP, with an existing pakfile."""
+    pakfile = ZipFile(BytesIO(), 'w')
+    pakfile.writestr('materials/maps/cubemap.vtf', b'cubemap')
+    return SimpleNamespace(filename='test.bsp', pakfile=pakfile)
+
+
+def test_matches_serial(tmp_path: Path) -> None:
+    """The result is identical to PackList.pack_into_zip()."""
+    for i in range(20):
+        file = tmp_path / 'materials' / f'tex_{i}.vtf'
+        file.parent.mkdir(exist_ok=True)
+        file.write_bytes(bytes([i]) * (i * 100))
+    fsys = FileSystemChain(RawFileSystem(str(tmp_path)))
+    packlist = PackList(fsys)
+    for i in reversed(range(20)):
+        packlist.pack_file(f'materials/tex_{i}.vtf', FileType.TEXTURE)
+    packlist.pack_file('scripts/generated.txt', data=b'generated')
+    packlist.pack_file('materials/missing.vtf', FileType.TEXTURE, optional=True)
+
+    serial = make_bsp()
+    packlist.pack_into_zip(serial, ignore_vpk=True)  # type: ignore
+    parallel = make_bsp()
+    pack_zip.pack_into_zip(packlist, parallel, workers=4)  # type: ignore
+
+    assert parallel.pakfile.namelist() == serial.pakfile.namelist()
+    assert len(parallel.pakfile.namelist()) == 22
+    for name in serial.pakfile.namelist():
+        assert parallel.pakfile.read(name) == serial.pakfile.read(name)
@@ -0,0 +1,28 @@
+"""Test the batch noise functions."""
+import random
+
+from perlin import SimplexNoise
+import pytest
+
+
+@pytest.mark.parametrize('period', [None, 160])
+def test_noise_array_matches(period) -> None:
+    """Check evaluating arrays of points matches the individual functions exactly."""
+    rand = random.Random(48)
+    noise = SimplexNoise() if period is None else SimplexNoise(period=period)
+    points = [
+        (rand.uniform(-500, 500), rand.uniform(-500, 500), rand.uniform(-500, 500))
+        for _ in range(500)
+    ]
+    # Include integer points, these land exactly on simplex corners.
+    points += [
+        (float(x), float(y), float(z))
+        for x in range(-3, 4)
+        for y in range(-3, 4)
+        for z in range(-3, 4)
+    ]
+    xs, ys, zs = zip(*points)
+
+    assert noise.noise2_array(xs, ys) == [noise.noise2(x, y) for x, y in zip(xs, ys)]
+    assert noise.noise3_array(xs, ys, zs) == [noise.noise3(x, y, z) for x, y, z in points]
+    assert noise.noise3_array([], [], []) == []
@@ -0,0 +1,95 @@
+"""Test the tiledef grid."""
+import pytest
+from srctools import Vec
+
+# Import this first, to avoid circular imports.
+from precomp import template_brush  # noqa
+from precomp import tiling
+
+
+@pytest.mark.parametrize('pos', [
+    (64, 64, 64),
+    (-64, 64, 192),
+    (-1984, -4032, -64),
+    (1984, -64, 4032),
+])
+@pytest.mark.parametrize('normal', tiling.NORMALS, ids=tiling.NORMAL_NAMES.values())
+def test_pack_round_trip(pos: tuple, normal: Vec) -> None:
+    """Positions and normals are recovered exactly, including negative coordinates."""
+    key = tiling._pack_tile_key(pos, normal)
+    assert key >= 0
+    assert tiling._unpack_tile_key(key) == (tuple(map(float, pos)), normal.as_tuple())
+    assert tiling._pack_tile_key(Vec(pos), normal.as_tuple()) == key
+
+
+def test_pack_unique() -> None:
+    """Every position and normal produces a different key."""
+    keys = {
+        tiling._pack_tile_key(Vec(x, y, z) * 128 + 64, normal)
+        for x in range(-2, 2)
+        for y in range(-2, 2)
+        for z in range(-2, 2)
+        for normal in tiling.NORMALS
+    }
+    assert len(keys) == 4 * 4 * 4 * 6
+
+
+@pytest.mark.parametrize('pos', [
+    (0, 64, 64),
+    (64, 65, 64),
+    (64, 64, -64.5),
+    (64, 64, 128),
+])
+def test_pack_off_grid(pos: tuple) -> None:
+    """Positions which aren't block centers can't be packed."""
+    with pytest.raises(ValueError):
+        tiling._pack_tile_key(pos, (0, 0, 1))
+
+
+@pytest.mark.parametrize('normal', [
+    (0, 0, 0),
+    (0, 0, 2),
+    (1, 1, 0),
+    (0.5, 0, 0),
+])
+def test_pack_bad_normal(normal: tuple) -> None:
+    """Normals which aren't axis-aligned can't be packed."""
+    with pytest.raises(ValueError):
+        tiling._pack_tile_key((64, 64, 64), normal)
+
+
+def test_grid() -> None:
+    """The grid behaves like a dict keyed by position and normal."""
+    grid = tiling.TileGrid()
+    tile = tiling.TileDef(Vec(64, -64, 64), Vec(0, 0, 1), tiling.TileType.WHITE)
+    grid[Vec(64, -64, 64), Vec(0, 0, 1)] = tile
+    assert grid[(64.0, -64.0, 64.0), (0.0, 0.0, 1.0)] is tile
+    assert (Vec(64, -64, 64), Vec(0, 0, 1)) in grid
+    assert (Vec(64, -64, 64), Vec(0, 0, -1)) not in grid
+    assert list(grid) == [((64.0, -64.0, 64.0), (0.0, 0.0, 1.0))]
+    assert list(grid.values()) == [tile]
+    assert len(grid) == 1
+
+    # Invalid keys are never present.
+    assert (Vec(0, 0, 0), Vec(0, 0, 1)) not in grid
+    assert 'not a key' not in grid
+    with pytest.raises(KeyError):
+        grid[Vec(0, 0, 0), Vec(0, 0, 1)]
+    with pytest.raises(KeyError):
+        del grid[Vec(64, -64, 64), Vec(1, 1, 0)]
+    with pytest.raises(ValueError):
+        grid[Vec(0, 0, 0), Vec(0, 0, 1)] = tile
+
+    del grid[Vec(64, -64, 64), Vec(0, 0, 1)]
+    assert len(grid) == 0
+
+
+def test_ensure(monkeypatch: pytest.MonkeyPatch) -> None:
+    """ensure() creates tiles, and raises KeyError for invalid positions."""
+    monkeypatch.setattr(tiling, 'TILES', tiling.TileGrid())
+    tile = tiling.TileDef.ensure(Vec(64, 64, 64), Vec(0, 0, 1), tiling.TileType.BLACK)
+    assert tile.base_type is tiling.TileType.BLACK
+    assert tiling.TileDef.ensure(Vec(64, 64, 64), Vec(0, 0, 1)) is tile
+    with pytest.raises(KeyError):
+        tiling.TileDef.ensure(Vec(64, 64, 60), Vec(0, 0, 1))
+    assert len(tiling.TILES) == 1
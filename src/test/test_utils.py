@@ -0,0 +1,37 @@
+"""Test the shared utilities."""
+from typing import Dict
+
+import pytest
+
+import utils
+
+
+def test_priority_queue() -> None:
+    """Items are popped in order of priority, then the order they were added."""
+    priorities: Dict[str, int] = {'a': 2, 'b': 1, 'c': 2, 'd': 0}
+    queue = utils.PriorityQueue(priorities.__getitem__)
+    for item in 'abcd':
+        queue.push(item)
+    assert len(queue) == 4
+    assert [queue.pop() for _ in range(4)] == ['d', 'b', 'a', 'c']
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_priority_queue_rerank() -> None:
+    """Priorities which change while queued are used."""
+    # Like images queued before their window is shown.
+    priorities = dict.fromkeys('abcd', 2)
+    queue = utils.PriorityQueue(priorities.__getitem__)
+    for item in 'abcd':
+        queue.push(item)
+    priorities['c'] = priorities['d'] = 0
+    # Not noticed until reprioritised.
+    assert queue.pop() == 'a'
+    queue.reprioritise()
+    assert queue.pop() == 'c'
+
+    # Items which get worse are moved back when popped.
+    priorities['d'] = 3
+    assert [queue.pop() for _ in range(2)] == ['b', 'd']
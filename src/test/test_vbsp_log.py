@@ -0,0 +1,96 @@
+"""Test reading entity counts from VBSP's output."""
+from pathlib import Path
+import logging
+
+from BEE2_config import ConfigFile
+from compile_metrics import CompileMetrics
+from precomp.vbsp_log import VBSPLogParser
+
+
+SAMPLE_OUTPUT = '''\
+Valve Software - vbsp.exe (Sep 20 2022)
+4 threads
+Loading preview.vmf
+fixing up env_cubemap materials on brush sides...
+ProcessBlock_Thread: 0...1...2...3...4...5...6...7...8...9...10 (0)
+Processing areas...done (0)
+Building Faces...done (0)
+Chop Details...done (0)
+Find Visible Detail Sides...done (0)
+Merge Faces...done (0)
+Writing preview.bsp
+Patching WVT-based physics collisions...done (0)
+nummapplanes:      (1234 / 65536)
+nummapbrushes:     (567 / 8192)
+nummapbrushsides:  (4321 / 65536)
+num_map_overlays:  (42 / 512)
+nummodels:         (12 / 1024)
+num_entities:      (890 / 16384)
+'''
+
+
+def make_parser(tmp_path: Path) -> VBSPLogParser:
+    """Create a parser which saves to a temporary config."""
+    return VBSPLogParser(ConfigFile(str(tmp_path / 'compile.cfg'), in_conf_folder=False))
+
+
+def test_counts(tmp_path: Path) -> None:
+    """Counts are found in the log, and saved to the config as they're read."""
+    parser = make_parser(tmp_path)
+    logger = logging.getLogger('test.vbsp_output')
+    logger.propagate = False
+    logger.addHandler(parser)
+    try:
+        for line in SAMPLE_OUTPUT.splitlines():
+            logger.info(line)
+    finally:
+        logger.removeHandler(parser)
+
+    assert parser.counts == {
+        'brush': ('567', '8192'),
+        'overlay': ('42', '512'),
+        'entity': ('890', '16384'),
+    }
+    assert not parser.leaked
+    assert parser.limit_line is None
+    assert parser.config['Counts']['entity'] == '890'
+
+    metrics = CompileMetrics('vbsp')
+    parser.add_metrics(metrics)
+    assert metrics.counts['vbsp_brush'] == 567
+    assert metrics.counts['vbsp_max_entity'] == 16384
+    assert metrics.counts['leaked'] is False
+
+    parser.save_counts()
+    saved = ConfigFile(str(tmp_path / 'compile.cfg'), in_conf_folder=False)
+    assert dict(saved['Counts']) == {
+        'brush': '567', 'max_brush': '8192',
+        'overlay': '42', 'max_overlay': '512',
+        'entity': '890', 'max_entity': '16384',
+    }
+
+
+def test_leak(tmp_path: Path) -> None:
+    """Leaks are detected, while other counts keep their defaults."""
+    parser = make_parser(tmp_path)
+    parser.parse_line('Processing areas...done (0)')
+    parser.parse_line('**** leaked ****')
+    parser.parse_line('Entity info_player_start (-64.00 0.00 64.00) leaked!')
+    parser.parse_line('  [| num_map_overlays:  (3 / 512)')
+    assert parser.leaked
+    assert parser.counts == {
+        'brush': ('0', '8192'),
+        'overlay': ('3', '512'),
+        'entity': ('0', '2048'),
+    }
+
+
+def test_limit(tmp_path: Path) -> None:
+    """If a limit is exceeded, the failure shows that count at the maximum."""
+    parser = make_parser(tmp_path)
+    parser.parse_line('Error: MAX_MAP_OVERLAYS = 513')
+    assert parser.limit_line == 'Error: MAX_MAP_OVERLAYS = 513'
+    parser.save_failure()
+    counts = parser.config['Counts']
+    assert counts['overlay'] == '513'
+    assert counts['brush'] == counts['entity'] == '0'
@@ -0,0 +1,68 @@
+"""Test preparing maps for VVIS."""
+from srctools import VMF, Vec
+
+# Import this first, to avoid circular imports.
+from precomp import template_brush  # noqa
+from precomp import brushLoc, tiling, vis_optimise
+import consts
+
+
+def make_room() -> brushLoc.Grid:
+    """Produce a 3x3x3 room of air, surrounded by solid.
+
+    In world coordinates, the air spans from -128 to 256.
+    """
+    grid = brushLoc.Grid()
+    for pos in Vec.iter_grid(Vec(-2, -2, -2), Vec(2, 2, 2)):
+        grid[pos] = brushLoc.Block.SOLID
+    for pos in Vec.iter_grid(Vec(-1, -1, -1), Vec(1, 1, 1)):
+        grid[pos] = brushLoc.Block.AIR
+    return grid
+
+
+def test_make_detail() -> None:
+    """Brushes floating in the room become detail, others stay as world."""
+    vmf = VMF()
+    grid = make_room()
+    floating = vmf.make_prism(Vec(32, 32, 32), Vec(96, 96, 96), 'metal/black_wall_metal_002a').solid
+    # Crosses multiple voxels, still in the room.
+    long = vmf.make_prism(Vec(-128, 56, 56), Vec(256, 72, 72), consts.Tools.NODRAW).solid
+    # Touches the walls exactly.
+    edge = vmf.make_prism(Vec(-128, -128, -128), Vec(256, 256, -120), 'metal/black_floor_metal_001c').solid
+    # Into the wall.
+    wall = vmf.make_prism(Vec(-256, 32, 32), Vec(-96, 96, 96), 'metal/black_wall_metal_002a').solid
+    # Tool brushes can't be detail.
+    clip = vmf.make_prism(Vec(32, 32, 160), Vec(96, 96, 192), consts.Tools.PLAYER_CLIP).solid
+    for solid in [floating, long, edge, wall, clip]:
+        vmf.add_brush(solid)
+
+    detail = vis_optimise.make_detail(vmf, grid)
+    assert detail == [floating, long, edge]
+    assert vmf.brushes == [wall, clip]
+    [ent] = vmf.by_class['func_detail']
+    assert ent.solids == detail
+
+
+def test_add_hints() -> None:
+    """Openings in the shell without tiles get hints."""
+    vmf = VMF()
+    grid = make_room()
+    tiling.TILES.clear()
+    try:
+        for pos, block in grid.items():
+            if block is not brushLoc.Block.AIR:
+                continue
+            for normal in vis_optimise.DIRECTIONS:
+                if grid[pos + normal] is brushLoc.Block.SOLID:
+                    tiling.TileDef.ensure(brushLoc.grid_to_world(pos + normal), -normal)
+        # Remove the tile for a doorway.
+        del tiling.TILES[brushLoc.grid_to_world(Vec(2, 0, 0)), Vec(-1, 0, 0)]
+
+        assert vis_optimise.add_hints(vmf, grid) == 1
+    finally:
+        tiling.TILES.clear()
+    [hint] = vmf.brushes
+    assert tuple(hint.get_bbox()) == (Vec(255, 0, 0), Vec(256, 128, 128))
+    assert sorted(side.mat for side in hint) == [consts.Tools.HINT] + [consts.Tools.SKIP] * 5
+    [hint_face] = [side for side in hint if side.mat == consts.Tools.HINT]
+    assert hint_face.normal() == Vec(-1, 0, 0)
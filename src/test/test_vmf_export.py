@@ -0,0 +1,67 @@
+"""Test the fast VMF serialiser."""
+import io
+from pathlib import Path
+
+import pytest
+from srctools import VMF, Vec, Output, Property
+from precomp import vmf_export
+
+
+def check_export(vmf: VMF) -> None:
+    """Check the output is identical to VMF.export()."""
+    expected = vmf.export(inc_version=False)
+    buf = io.StringIO()
+    vmf_export.export(vmf, buf, inc_version=False)
+    assert buf.getvalue() == expected
+
+
+def test_sample_map() -> None:
+    """Check a map made in Hammer is reproduced exactly."""
+    with Path(__file__, '..', 'bbox_samples.vmf').resolve().open() as f:
+        vmf = VMF.parse(Property.parse(f))
+    check_export(vmf)
+
+
+def test_generated_map() -> None:
+    """Check all the variations of entities and brushes."""
+    vmf = VMF()
+    vmf.spawn['skyname'] = 'sky_black_nofog'
+    vmf.add_brush(vmf.make_prism(Vec(0, 0, 0), Vec(128, 128, 64), 'tile/white').solid)
+    # Off-grid coordinates and scales.
+    prism = vmf.make_prism(Vec(-0.5, 3.25, -1e-7), Vec(12.125, 64.0001, 128))
+    for side in prism.solid:
+        side.uaxis.offset = -48.5
+        side.vaxis.scale = 0.125
+        side.ham_rot = 90.0
+    prism.solid.hidden = True
+    vmf.add_brush(prism.solid)
+
+    point = vmf.create_ent('func_instance', origin=Vec(1, 2, 3), targetname='inst', file='x.vmf')
+    point.fixup['$var'] = 'value'
+    point.add_out(Output('OnUser1', 'target', 'Trigger', delay=0.5))
+
+    brush_ent = vmf.create_ent('func_brush', targetname='brush', Solidity='1')
+    brush_ent.solids.append(vmf.make_prism(Vec(64, 64, 64), Vec(128, 128, 128)).solid)
+    brush_ent.fixup['$hidden'] = '1'
+    brush_ent.add_out(Output('OnUser2', '!self', 'Kill'))
+    brush_ent.visgroup_ids.add(4)
+    brush_ent.comments = 'A comment'
+
+    hidden_ent = vmf.create_ent('func_detail')
+    hidden_ent.solids.append(vmf.make_prism(Vec(-64, -64, 0), Vec(0, 0, 8)).solid)
+    hidden_ent.hidden = True
+    hidden_ent.vis_shown = False
+
+    check_export(vmf)
+
+
+def test_other_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    """With a different srctools version, VMF.export() is used."""
+    monkeypatch.setattr(vmf_export, 'SRCTOOLS_VERSION', '0.0')
+    vmf = VMF()
+    vmf.add_brush(vmf.make_prism(Vec(0, 0, 0), Vec(128, 128, 64), 'tile/white').solid)
+    vmf.create_ent('info_target', origin=Vec(1, 2, 3.5))
+    check_export(vmf)
+    buf = io.StringIO()
+    vmf_export.export(vmf, buf, inc_version=True)
+    assert vmf.map_ver == 1
@@ -8,6 +8,8 @@ from typing import (
     KeysView, ValuesView, ItemsView,
 )
 from typing_extensions import TypeVarTuple, Unpack
+import heapq
+import itertools
 import logging
 import os
 import stat
@@ -510,6 +512,54 @@ class Result(Generic[ResultT]):
         return self._result
 
 
+QueueT = TypeVar('QueueT')
+
+
+class PriorityQueue(Generic[QueueT]):
+    """A queue of items, where the priority of each can change while it waits.
+
+    Priorities are computed by the provided function, lower values are popped
+    first. Items with the same priority are popped in the order they were
+    added. When an item is popped its priority is checked again, and if it is
+    no longer the most urgent it is moved back into the queue. Priorities
+    which improve are only noticed when reprioritise() is called.
+    """
+    def __init__(self, priority: Callable[[QueueT], int]) -> None:
+        self._priority = priority
+        self._heap: list[tuple[int, int, QueueT]] = []
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: QueueT) -> None:
+        """Add an item to the queue."""
+        heapq.heappush(self._heap, (self._priority(item), next(self._order), item))
+
+    def pop(self) -> QueueT:
+        """Remove and return the item with the lowest priority.
+
+        Raises IndexError if the queue is empty.
+        """
+        while True:
+            old, order, item = heapq.heappop(self._heap)
+            if not self._heap:
+                return item
+            new = self._priority(item)
+            # Priorities stored in the queue only get worse, so this finishes.
+            if new <= old or (new, order) < self._heap[0][:2]:
+                return item
+            heapq.heappush(self._heap, (new, order, item))
+
+    def reprioritise(self) -> None:
+        """Recompute the priority of all items in the queue."""
+        self._heap[:] = [
+            (self._priority(item), order, item)
+            for _, order, item in self._heap
+        ]
+        heapq.heapify(self._heap)
+
+
 def get_indent(line: str) -> str:
     """Return the whitespace which this line starts with.
 
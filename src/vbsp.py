@@ -7,9 +7,7 @@ LOGGER = init_logging('bee2/vbsp.log')
 import os
 import sys
 import shutil
-import logging
 import pickle
-from io import StringIO
 from collections import defaultdict, namedtuple, Counter
 from atomicwrites import atomic_write
 
@@ -17,11 +15,14 @@ from srctools import Property, Vec, Vec_tuple, Angle, Matrix
 from srctools.vmf import VMF, Entity, Output
 from srctools.game import Game
 from BEE2_config import ConfigFile
+from compile_metrics import CompileMetrics, MemoryTracer
+import compile_metrics
 import utils
 import srctools
 import srctools.run
 import srctools.logger
 from precomp.collisions import Collisions
+from precomp.vbsp_log import VBSPLogParser
 from precomp import (
     instance_traits,
     brushLoc,
@@ -43,6 +44,12 @@ from precomp import (
     voice_line,
     music,
     rand,
+    compile_cache,
+    vmf_export,
+    brush_merge,
+    ent_optimise,
+    vis_optimise,
+    lightmaps,
 )
 import consts
 import editoritems
@@ -76,6 +83,8 @@ settings: _Settings = {
 }
 
 COND_MOD_NAME = 'VBSP'
+# Write the styled map in large chunks, it's often tens of megabytes.
+SAVE_BUFFER_SIZE = 1024 * 1024
 BEE2_config = ConfigFile('compile.cfg')
 
 # These are overlays which have been modified by
@@ -1285,18 +1294,21 @@ def save(vmf: VMF, path: str) -> None:
     """
     LOGGER.info("Saving New Map...")
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with atomic_write(path, overwrite=True, encoding='utf8') as f:
-        vmf.export(dest_file=f, inc_version=True)
+    # The temporary file is in the same folder, so this is just renamed
+    # into place for VBSP to read.
+    with atomic_write(path, overwrite=True, encoding='utf8', buffering=SAVE_BUFFER_SIZE) as f:
+        vmf_export.export(vmf, f, inc_version=True)
     LOGGER.info("Complete!")
 
 
-def run_vbsp(vbsp_args, path, new_path=None) -> None:
+def run_vbsp(vbsp_args, path, new_path=None, metrics: Optional[CompileMetrics]=None) -> None:
     """Execute the original VBSP, copying files around so it works correctly.
 
     vbsp_args are the arguments to pass.
     path is the original .vmf, new_path is the styled/ name.
     If new_path is passed VBSP will be run on the map in styled/, and we'll
-    read through the output to find the entity counts.
+    read through the output to find the entity counts. These are also added
+    to the metrics if passed.
     """
 
     is_peti = new_path is not None
@@ -1321,18 +1333,26 @@ def run_vbsp(vbsp_args, path, new_path=None) -> None:
     # Use a special name for VBSP's output..
     vbsp_logger = srctools.logger.get_logger('valve.VBSP', alias='<Valve>')
 
-    # And also save a copy for us to analyse.
-    buff = StringIO()
-    vbsp_logger.addHandler(logging.StreamHandler(buff))
+    # And also parse it as it runs, so counts are available immediately.
+    parser = VBSPLogParser(BEE2_config)
+    if is_peti:  # Ignore Hammer maps
+        vbsp_logger.addHandler(parser)
+
+    try:
+        code = srctools.run.run_compiler(
+            'linux32/vbsp' if utils.LINUX else 'vbsp',
+            vbsp_args, vbsp_logger,
+        )
+    finally:
+        vbsp_logger.removeHandler(parser)
+        if is_peti and metrics is not None:
+            metrics.lap('vbsp')
+            parser.add_metrics(metrics)
 
-    code = srctools.run.run_compiler(
-        'linux32/vbsp' if utils.LINUX else 'vbsp',
-        vbsp_args, vbsp_logger,
-    )
     if code != 0:
         # VBSP didn't succeed.
         if is_peti:  # Ignore Hammer maps
-            process_vbsp_fail(buff.getvalue())
+            parser.save_failure()
 
         # Propagate the fail code to Portal 2, and quit.
         sys.exit(code)
@@ -1341,104 +1361,168 @@ def run_vbsp(vbsp_args, path, new_path=None) -> None:
     LOGGER.info("VBSP Done!")
 
     if is_peti:  # Ignore Hammer maps
-        process_vbsp_log(buff.getvalue())
+        parser.save_counts()
 
-    # Copy over the real files so vvis/vrad can read them
+    # Move over the real files so vvis/vrad can read them
         for ext in (".bsp", ".log", ".prt"):
-            if os.path.isfile(new_path.replace(".vmf", ext)):
-                shutil.copy(
-                    new_path.replace(".vmf", ext),
-                    path.replace(".vmf", ext),
-                )
+            move_output(
+                new_path.replace(".vmf", ext),
+                path.replace(".vmf", ext),
+            )
 
 
-def process_vbsp_log(output: str) -> None:
-    """Read through VBSP's log, extracting entity counts.
+def move_output(src: str, dest: str) -> None:
+    """Move a compiled file from styled/ back to the original location.
 
-    This is then passed back to the main BEE2 application for display.
+    These are usually on the same drive, so this is just a rename. Otherwise,
+    fall back to copying.
     """
+    try:
+        os.replace(src, dest)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        if os.path.isfile(src):
+            shutil.copy(src, dest)
+
+
+def convert_map(game: Game, path: str, new_path: str, metrics: Optional[CompileMetrics]=None) -> VMF:
+    """Convert the PeTI map at path, saving the result to new_path."""
+    LOGGER.info("Loading settings...")
+    ant_floor, ant_wall, id_to_item, corridor_conf = load_settings()
+    if metrics is not None:
+        metrics.lap('settings')
+    return convert_loaded(
+        game, path, new_path,
+        ant_floor, ant_wall, id_to_item, corridor_conf,
+        metrics,
+    )
+
 
-    # The output is something like this:
-    # nummapplanes:     (?? / 65536)
-    # nummapbrushes:    (?? / 8192)
-    # nummapbrushsides: (?? / 65536)
-    # num_map_overlays: (?? / 512)
-    # nummodels:        (?? / 1024)
-    # num_entities:     (?? / 16384)
-
-    desired_vals = [
-        # VBSP values -> config names
-        ('nummapbrushes:', 'brush'),
-        ('num_map_overlays:', 'overlay'),
-        ('num_entities:', 'entity'),
+def count_map(vmf: VMF, metrics: CompileMetrics) -> None:
+    """Record the contents of the converted map in the metrics."""
+    solids = [
+        solid
+        for ent in vmf.entities
+        for solid in ent.solids
     ]
-    # The other options rarely hit the limits, so we don't track them.
+    solids += vmf.brushes
+    metrics.counts.update(
+        entities=len(vmf.entities),
+        brushes=len(solids),
+        sides=sum(len(solid.sides) for solid in solids),
+        instances=len(vmf.by_class['func_instance']),
+        overlays=len(vmf.by_class['info_overlay']),
+        conditions=len(conditions.conditions),
+        tiles=len(tiling.TILES),
+        template_hits=template_brush.CACHE_HITS,
+        template_misses=template_brush.CACHE_MISSES,
+    )
 
-    counts = {
-        'brush': ('0', '8192'),
-        'overlay': ('0', '512'),
-        'entity': ('0', '2048'),
-    }
 
-    for line in output.splitlines():
-        line = line.lstrip(' \t[|')
-        for name, conf in desired_vals:
-            if not line.startswith(name):
-                continue
-            # Grab the value from ( onwards
-            fraction = line.split('(', 1)[1]
-            # Grab the two numbers, convert to ascii and strip
-            # whitespace.
-            count_num, count_max = fraction.split('/')
-            counts[conf] = (
-                count_num.strip(' \t\n'),
-                # Strip the ending ) off the max. We have the value, so
-                # we might as well tell the BEE2 if it changes..
-                count_max.strip(') \t\n'),
-            )
+def convert_loaded(
+    game: Game,
+    path: str,
+    new_path: str,
+    ant_floor: antlines.AntType,
+    ant_wall: antlines.AntType,
+    id_to_item: Dict[str, editoritems.Item],
+    corridor_conf: corridor.ExportedConf,
+    metrics: Optional[CompileMetrics]=None,
+) -> VMF:
+    """Convert a map, after load_settings() has been called.
+
+    This modifies global state, so it can only be done once per process.
+    The converted map is returned. If passed, the duration of each stage and
+    the contents of the map are recorded in the metrics.
+    """
+    if metrics is None:
+        metrics = CompileMetrics('vbsp')
+    vmf = load_map(path)
+    coll = Collisions()
+    metrics.lap('load')
+
+    instance_traits.set_traits(vmf, id_to_item, coll)
+    # Must be before corridors!
+    brushLoc.POS.read_from_map(vmf, settings['has_attr'], id_to_item)
+
+    rand.init_seed(vmf)
+
+    info = corridor.analyse_and_modify(
+        vmf, corridor_conf,
+        elev_override=BEE2_config.get_bool('General', 'spawn_elev'),
+        voice_attrs=settings['has_attr'],
+    )
 
-    LOGGER.info('Retrieved counts: {}', counts)
-    count_section = BEE2_config['Counts']
-    for count_name, (value, limit) in counts.items():
-        count_section[count_name] = value
-        count_section['max_' + count_name] = limit
-    BEE2_config.save()
-
-
-def process_vbsp_fail(output: str) -> None:
-    """Read through VBSP's logs when failing, to update counts."""
-    # VBSP doesn't output the actual entity counts, so set the errorred
-    # one to max and the others to zero.
-    count_section = BEE2_config['Counts']
-
-    count_section['max_brush'] = '8192'
-    count_section['max_entity'] = '2048'
-    count_section['max_overlay'] = '512'
-
-    for line in reversed(output.splitlines()):
-        if 'MAX_MAP_OVERLAYS' in line:
-            count_section['entity'] = '0'
-            count_section['brush'] = '0'
-            # The line is like 'MAX_MAP_OVER = 512', pull out the number from
-            # the end and decode it.
-            over_count = line.rsplit('=')[1].strip()
-            count_section['overlay'] = over_count
-            count_section['max_overlay'] = over_count
-            break
-        if 'MAX_MAP_BRUSHSIDES' in line or 'MAX_MAP_PLANES' in line:
-            count_section['entity'] = '0'
-            count_section['overlay'] = '0'
-            count_section['brush'] = '8192'
-            break
-        if 'MAX_MAP_ENTITIES' in line:
-            count_section['entity'] = count_section['overlay'] = '0'
-            count_section['brush'] = '8192'
-            break
-    else:
-        count_section['entity'] = '0'
-        count_section['overlay'] = '0'
-        count_section['brush'] = '0'
-    BEE2_config.save_check()
+    ant, side_to_antline = antlines.parse_antlines(vmf)
+
+    # Requires instance traits!
+    connections.calc_connections(
+        vmf,
+        ant,
+        texturing.OVERLAYS.get_all('shapeframe'),
+        settings['style_vars']['enableshapesignageframe'],
+        antline_wall=ant_wall,
+        antline_floor=ant_floor,
+    )
+    change_ents(vmf)
+
+    fizzler.parse_map(vmf, info)
+    barriers.parse_map(vmf, info)
+    metrics.lap('analyse')
+
+    tiling.gen_tile_temp()
+    tiling.analyse_map(vmf, side_to_antline)
+
+    del side_to_antline
+
+    texturing.setup(game, vmf, list(tiling.TILES.values()))
+    metrics.lap('tiling')
+
+    conditions.check_all(vmf, coll, info)
+    metrics.lap('conditions')
+    add_extra_ents(vmf, info)
+
+    tiling.generate_brushes(vmf)
+    if options.get(bool, 'vis_optimise'):
+        vis_optimise.prepare_vis(vmf)
+    faithplate.gen_faithplates(vmf)
+    change_overlays(vmf)
+    fix_worldspawn(vmf)
+
+    if utils.DEV_MODE:
+        coll.dump(vmf, vis_name='collisions')
+    metrics.lap('brushes')
+
+    if options.get(bool, 'optimise_logic_ents'):
+        ent_optimise.optimise_ents(vmf)
+    if options.get(bool, 'merge_detail_brushes'):
+        brush_merge.merge_detail(vmf)
+    if options.get(bool, 'adaptive_lightmaps'):
+        # Publishing, or forcing full lighting uses the higher quality profile.
+        if not info.is_preview or BEE2_config.get_val(
+            'General', 'vrad_compile_type', 'FAST',
+        ).upper() == 'FULL':
+            lightmaps.assign_scales(vmf, lightmaps.PUBLISH)
+        else:
+            lightmaps.assign_scales(vmf, lightmaps.PREVIEW)
+
+    # Ensure all VMF outputs use the correct separator.
+    for ent in vmf.entities:
+        for out in ent.outputs:
+            out.comma_sep = False
+
+    # Ensure VRAD knows that the map is PeTI, it can't figure that out
+    # from parameters.
+    vmf.spawn['BEE2_is_peti'] = True
+    # Set this so VRAD can know.
+    vmf.spawn['BEE2_is_preview'] = info.is_preview
+    metrics.lap('optimise')
+
+    save(vmf, new_path)
+    metrics.lap('save')
+    count_map(vmf, metrics)
+    return vmf
 
 
 def main() -> None:
@@ -1485,6 +1569,8 @@ def main() -> None:
             '-verbose: A default VBSP command, has the same effect as above.\n'
             '-force_peti: Force enabling map conversion. \n'
             "-force_hammer: Don't convert the map at all.\n"
+            "-no_compile_cache: Always convert the map, ignoring previous results.\n"
+            '-trace_memory: Log memory usage after each stage. This is slow!\n'
             '-entity_limit: A default VBSP command, this is inspected to'
             'determine if the map is PeTI or not.'
         )
@@ -1503,6 +1589,8 @@ def main() -> None:
     game_dir = ''
 
     skip_vbsp = False
+    skip_cache = False
+    trace_memory = False
     for i, a in enumerate(new_args):
         # We need to strip these out, otherwise VBSP will get confused.
         if a == '-force_peti' or a == '-force_hammer':
@@ -1510,6 +1598,14 @@ def main() -> None:
             old_args[i] = ''
         elif a == '-skip_vbsp':  # Debug command, for skipping.
             skip_vbsp = True
+        elif a == '-no_compile_cache':
+            new_args[i] = ''
+            old_args[i] = ''
+            skip_cache = True
+        elif a == '-trace_memory':
+            new_args[i] = ''
+            old_args[i] = ''
+            trace_memory = True
         # Strip the entity limit, and the following number
         elif a == '-entity_limit':
             new_args[i] = ''
@@ -1548,77 +1644,54 @@ def main() -> None:
         )
     else:
         LOGGER.info("PeTI map detected!")
-
-        LOGGER.info("Loading settings...")
-        ant_floor, ant_wall, id_to_item, corridor_conf = load_settings()
-
-        vmf = load_map(path)
-        coll = Collisions()
-
-        instance_traits.set_traits(vmf, id_to_item, coll)
-        # Must be before corridors!
-        brushLoc.POS.read_from_map(vmf, settings['has_attr'], id_to_item)
-
-        rand.init_seed(vmf)
-
-        info = corridor.analyse_and_modify(
-            vmf, corridor_conf,
-            elev_override=BEE2_config.get_bool('General', 'spawn_elev'),
-            voice_attrs=settings['has_attr'],
-        )
-
-        ant, side_to_antline = antlines.parse_antlines(vmf)
-
-        # Requires instance traits!
-        connections.calc_connections(
-            vmf,
-            ant,
-            texturing.OVERLAYS.get_all('shapeframe'),
-            settings['style_vars']['enableshapesignageframe'],
-            antline_wall=ant_wall,
-            antline_floor=ant_floor,
-        )
-        change_ents(vmf)
-
-        fizzler.parse_map(vmf, info)
-        barriers.parse_map(vmf, info)
-
-        tiling.gen_tile_temp()
-        tiling.analyse_map(vmf, side_to_antline)
-
-        del side_to_antline
-
-        texturing.setup(game, vmf, list(tiling.TILES.values()))
-
-        conditions.check_all(vmf, coll, info)
-        add_extra_ents(vmf, info)
-
-        tiling.generate_brushes(vmf)
-        faithplate.gen_faithplates(vmf)
-        change_overlays(vmf)
-        fix_worldspawn(vmf)
-
-        if utils.DEV_MODE:
-            coll.dump(vmf, vis_name='collisions')
-
-        # Ensure all VMF outputs use the correct separator.
-        for ent in vmf.entities:
-            for out in ent.outputs:
-                out.comma_sep = False
-
-        # Ensure VRAD knows that the map is PeTI, it can't figure that out
-        # from parameters.
-        vmf.spawn['BEE2_is_peti'] = True
-        # Set this so VRAD can know.
-        vmf.spawn['BEE2_is_preview'] = info.is_preview
-
-        save(vmf, new_path)
-        if not skip_vbsp:
-            run_vbsp(
-                vbsp_args=new_args,
-                path=path,
-                new_path=new_path,
+        if trace_memory or BEE2_config.get_bool('General', 'trace_memory'):
+            tracer = MemoryTracer(caches={
+                'TILES': lambda: tiling.TILES,
+                'OVERLAY_BINDS': lambda: tiling.OVERLAY_BINDS,
+                '_TEMPLATES': lambda: template_brush._TEMPLATES,
+                'ITEMS': lambda: connections.ITEMS,
+                'conditions': lambda: conditions.conditions,
+                'settings': lambda: settings,
+            }, shared=(VMF, ))
+            tracer.start()
+        else:
+            tracer = None
+        metrics = CompileMetrics('vbsp', tracer=tracer)
+        try:
+            cache_size = BEE2_config.get_int('General', 'compile_cache_size', compile_cache.DEFAULT_SIZE)
+            if cache_size > 0 and not skip_cache:
+                cache_key = compile_cache.compute_key(path, BEE2_config, options.ITEM_CONFIG)
+                metrics.lap('cache')
+            else:
+                cache_key = None
+
+            if cache_key is not None and compile_cache.fetch(cache_key, new_path):
+                LOGGER.info('Map and configuration unchanged, skipping conversion!')
+                metrics.counts['cache_hit'] = True
+                metrics.lap('cache')
+            else:
+                convert_map(game, path, new_path, metrics)
+                if cache_key is not None:
+                    compile_cache.store(cache_key, new_path, cache_size)
+                    metrics.lap('cache')
+
+            if not skip_vbsp:
+                run_vbsp(
+                    vbsp_args=new_args,
+                    path=path,
+                    new_path=new_path,
+                    metrics=metrics,
+                )
+            metrics.success = True
+        finally:
+            # VRAD only runs if we succeed, so add failures to the history now.
+            compile_metrics.write(
+                metrics,
+                os.path.splitext(path_file)[0],
+                history=not metrics.success and BEE2_config.get_bool('General', 'compile_metrics_history'),
             )
+            if tracer is not None:
+                tracer.stop()
 
     LOGGER.info("BEE2 VBSP hook finished!")
 
@@ -7,19 +7,17 @@ edit the BSP after instances are collapsed, and pack files.
 from srctools.logger import init_logging
 LOGGER = init_logging('bee2/vrad.log')
 
+import gc
 import os
 import sys
-from io import BytesIO
-from zipfile import ZipFile
 from typing import List
 from pathlib import Path
 
 
 import srctools.run
-from srctools import FGD
-from srctools.bsp import BSP, BSP_LUMPS
-from srctools.filesys import RawFileSystem, ZipFileSystem, FileSystem
-from srctools.packlist import PackList
+from srctools.bsp import BSP
+from srctools.filesys import RawFileSystem, ZipFileSystem, FileSystem, FileSystemChain
+from srctools.packlist import FileMode
 from srctools.game import find_gameinfo
 
 from hammeraddons.bsp_transform import run_transformations
@@ -29,7 +27,10 @@ from hammeraddons import __version__ as version_haddons
 import trio
 
 from BEE2_config import ConfigFile
-from postcomp import music, screenshot
+from compile_metrics import CompileMetrics
+import compile_metrics
+from postcomp import music, screenshot, pack_zip
+from postcomp.pack_cache import CachedPackList
 # Load our BSP transforms.
 # noinspection PyUnresolvedReferences
 from postcomp import coop_responses, filter
@@ -63,6 +64,31 @@ def load_transforms() -> None:
         finder.load_all()
 
 
+def load_packlist(fsys: FileSystemChain, root_folder: Path) -> CachedPackList:
+    """Read the soundscripts and particles which can be packed.
+
+    The identifiers in each file are stored in cache files in bin/bee2/. Files
+    are only parsed if they have changed since the previous compile, otherwise
+    they are parsed only when actually packed.
+    """
+    packlist = CachedPackList(fsys)
+    packlist.load_dep_cache(root_folder / 'bin/bee2/pack_deps.bin')
+    LOGGER.info('Reading soundscripts...')
+    sndscript_cache = root_folder / 'bin/bee2/sndscript_cache.dmx'
+    packlist.load_soundscript_manifest(sndscript_cache)
+
+    # We need to add all soundscripts in scripts/bee2_snd/
+    # This way we can pack those, if required. These go in the same cache.
+    for soundscript in fsys.walk_folder('scripts/bee2_snd/'):
+        if soundscript.path.endswith('.txt'):
+            packlist.soundscript.add_cached_file(soundscript.path, soundscript, FileMode.UNKNOWN)
+    packlist.soundscript.save_cache(sndscript_cache)
+
+    LOGGER.info('Reading particles....')
+    packlist.load_particle_manifest(root_folder / 'bin/bee2/particle_cache.dmx')
+    return packlist
+
+
 def run_vrad(args: List[str]) -> None:
     """Execute the original VRAD."""
     code = srctools.run.run_compiler(
@@ -147,6 +173,7 @@ async def main(argv: List[str]) -> None:
     if not os.path.isfile(path):
         raise ValueError('"{}" is not a file!'.format(path))
 
+    metrics = CompileMetrics('vrad')
     LOGGER.info('Reading BSP')
     bsp_file = BSP(path)
 
@@ -195,124 +222,138 @@ async def main(argv: List[str]) -> None:
         run_vrad(full_args)
         return
 
-    # Grab the currently mounted filesystems in P2.
-    game = find_gameinfo(argv)
-    root_folder = game.path.parent
-    fsys = game.get_filesystem()
-
-    # Special case - move the BEE2 filesystem FIRST, so we always pack files found there.
-    for child_sys in fsys.systems[:]:
-        if 'bee2' in child_sys[0].path.casefold():
-            fsys.systems.remove(child_sys)
-            fsys.systems.insert(0, child_sys)
-
-    zip_data = BytesIO()
-    zip_data.write(bsp_file.get_lump(BSP_LUMPS.PAKFILE))
-    zipfile = ZipFile(zip_data)
-
-    # Mount the existing packfile, so the cubemap files are recognised.
-    fsys.add_sys(ZipFileSystem('<BSP pakfile>', zipfile))
-
-    LOGGER.info('Done!')
+    try:
+        # Grab the currently mounted filesystems in P2.
+        game = find_gameinfo(argv)
+        root_folder = game.path.parent
+        fsys = game.get_filesystem()
 
-    LOGGER.debug('Filesystems:')
-    for child_sys in fsys.systems[:]:
-        LOGGER.debug('- {}: {!r}', child_sys[1], child_sys[0])
+        # Special case - move the BEE2 filesystem FIRST, so we always pack files found there.
+        for child_sys in fsys.systems[:]:
+            if 'bee2' in child_sys[0].path.casefold():
+                fsys.systems.remove(child_sys)
+                fsys.systems.insert(0, child_sys)
 
-    LOGGER.info('Reading our FGD files...')
-    fgd = FGD.engine_dbase()
+        # Mount the existing packfile, so the cubemap files are recognised.
+        # The parsed pakfile shares the lump's buffer, so this doesn't copy it.
+        fsys.add_sys(ZipFileSystem('<BSP pakfile>', bsp_file.pakfile))
 
-    packlist = PackList(fsys)
-    LOGGER.info('Reading soundscripts...')
-    packlist.load_soundscript_manifest(root_folder / 'bin/bee2/sndscript_cache.dmx')
-
-    # We need to add all soundscripts in scripts/bee2_snd/
-    # This way we can pack those, if required.
-    for soundscript in fsys.walk_folder('scripts/bee2_snd/'):
-        if soundscript.path.endswith('.txt'):
-            packlist.load_soundscript(soundscript, always_include=False)
-
-    LOGGER.info('Reading particles....')
-    packlist.load_particle_manifest(root_folder / 'bin/bee2/particle_cache.dmx')
-
-    LOGGER.info('Loading transforms...')
-    load_transforms()
-
-    LOGGER.info('Checking for music:')
-    music.generate(bsp_file.ents, packlist)
-
-    LOGGER.info('Run transformations...')
-    await run_transformations(bsp_file.ents, fsys, packlist, bsp_file, game)
-
-    enable_packing = not is_preview or config.getboolean("General", "packfile_auto_enable", True)
-    if enable_packing:
-        LOGGER.info('Scanning map for files to pack:')
-        packlist.pack_from_bsp(bsp_file)
-        packlist.pack_fgd(bsp_file.ents, fgd)
-        packlist.eval_dependencies()
         LOGGER.info('Done!')
+        metrics.lap('load')
+
+        LOGGER.debug('Filesystems:')
+        for child_sys in fsys.systems[:]:
+            LOGGER.debug('- {}: {!r}', child_sys[1], child_sys[0])
+
+        packlist = load_packlist(fsys, root_folder)
+        metrics.lap('packlist')
+
+        LOGGER.info('Loading transforms...')
+        load_transforms()
+
+        LOGGER.info('Checking for music:')
+        music.generate(bsp_file.ents, packlist)
+
+        LOGGER.info('Run transformations...')
+        await run_transformations(bsp_file.ents, fsys, packlist, bsp_file, game)
+        metrics.lap('transforms')
+
+        enable_packing = not is_preview or config.getboolean("General", "packfile_auto_enable", True)
+        if enable_packing:
+            LOGGER.info('Scanning map for files to pack:')
+            packlist.pack_from_bsp(bsp_file)
+            # Entity definitions are looked up lazily from srctools' database,
+            # so only the classes actually used are parsed.
+            packlist.pack_from_ents(bsp_file.ents)
+            packlist.eval_dependencies()
+            packlist.save_dep_cache(root_folder / 'bin/bee2/pack_deps.bin')
+            LOGGER.info(
+                'Done! ({} dependencies cached, {} evaluated)',
+                packlist.cache_hits, packlist.cache_misses,
+            )
+            metrics.counts['dependency_hits'] = packlist.cache_hits
+            metrics.counts['dependency_misses'] = packlist.cache_misses
 
-        packlist.write_soundscript_manifest()
-        packlist.write_particles_manifest(f'maps/{Path(path).stem}_particles.txt')
-    else:
-        LOGGER.warning('Packing disabled!')
-
-    # We need to disallow Valve folders.
-    pack_whitelist: set[FileSystem] = set()
-    pack_blacklist: set[FileSystem] = set()
-
-    # Exclude absolutely everything except our folder.
-    for child_sys, _ in fsys.systems:
-        # Add 'bee2/' and 'bee2_dev/' only.
-        if (
-            isinstance(child_sys, RawFileSystem) and
-            'bee2' in os.path.basename(child_sys.path).casefold()
-        ):
-            pack_whitelist.add(child_sys)
+            packlist.write_soundscript_manifest()
+            packlist.write_particles_manifest(f'maps/{Path(path).stem}_particles.txt')
+            metrics.lap('pack_scan')
         else:
-            pack_blacklist.add(child_sys)
-
-    if config.get_bool('General', 'packfile_dump_enable'):
-        dump_loc = Path(config.get_val(
-            'General',
-            'packfile_dump_dir',
-            '../dump/'
-        )).absolute()
-    else:
-        dump_loc = None
-
-    if '-no_pack' not in args and enable_packing:
-        # Cubemap files packed into the map already.
-        existing = set(bsp_file.pakfile.namelist())
-
-        LOGGER.info('Writing to BSP...')
-        packlist.pack_into_zip(
-            bsp_file,
-            ignore_vpk=True,
-            whitelist=pack_whitelist,
-            blacklist=pack_blacklist,
-            dump_loc=dump_loc,
-        )
-
-        LOGGER.info('Packed files:\n{}', '\n'.join(
-            set(bsp_file.pakfile.namelist()) - existing
-        ))
-
-    LOGGER.info('Writing BSP...')
-    bsp_file.save()
-    LOGGER.info(' - BSP written!')
-
-    screenshot.modify(config, game.path)
+            LOGGER.warning('Packing disabled!')
+
+        # We need to disallow Valve folders.
+        pack_whitelist: set[FileSystem] = set()
+        pack_blacklist: set[FileSystem] = set()
+
+        # Exclude absolutely everything except our folder.
+        for child_sys, _ in fsys.systems:
+            # Add 'bee2/' and 'bee2_dev/' only.
+            if (
+                isinstance(child_sys, RawFileSystem) and
+                'bee2' in os.path.basename(child_sys.path).casefold()
+            ):
+                pack_whitelist.add(child_sys)
+            else:
+                pack_blacklist.add(child_sys)
+
+        if config.get_bool('General', 'packfile_dump_enable'):
+            dump_loc = Path(config.get_val(
+                'General',
+                'packfile_dump_dir',
+                '../dump/'
+            )).absolute()
+        else:
+            dump_loc = None
+
+        if '-no_pack' not in args and enable_packing:
+            # Cubemap files packed into the map already.
+            existing = set(bsp_file.pakfile.namelist())
+
+            LOGGER.info('Writing to BSP...')
+            pack_zip.pack_into_zip(
+                packlist,
+                bsp_file,
+                ignore_vpk=True,
+                whitelist=pack_whitelist,
+                blacklist=pack_blacklist,
+                dump_loc=dump_loc,
+            )
 
-    # VRAD only runs if light_args is not set to "NONE"
-    if light_args == 'FAST':
-        LOGGER.info("Forcing Cheap Lighting!")
-        run_vrad(fast_args)
-    elif light_args == 'FULL':
-        LOGGER.info("Publishing - Full lighting enabled! (or forced to do so)")
-        run_vrad(full_args)
-    else:
-        LOGGER.info("Forcing to skip VRAD!")
+            packed = [
+                info for info in bsp_file.pakfile.infolist()
+                if info.filename not in existing
+            ]
+            LOGGER.info('Packed files:\n{}', '\n'.join([info.filename for info in packed]))
+            metrics.counts['packed_files'] = len(packed)
+            metrics.counts['packed_bytes'] = sum(info.file_size for info in packed)
+            metrics.lap('pack')
+
+        LOGGER.info('Writing BSP...')
+        bsp_file.save()
+        LOGGER.info(' - BSP written!')
+        # VRAD reads the BSP itself, don't keep our copy in memory while it runs.
+        del bsp_file, packlist, fsys, child_sys, pack_whitelist, pack_blacklist
+        gc.collect()
+
+        screenshot.modify(config, game.path)
+        metrics.lap('save')
+
+        # VRAD only runs if light_args is not set to "NONE"
+        if light_args == 'FAST':
+            LOGGER.info("Forcing Cheap Lighting!")
+            run_vrad(fast_args)
+        elif light_args == 'FULL':
+            LOGGER.info("Publishing - Full lighting enabled! (or forced to do so)")
+            run_vrad(full_args)
+        else:
+            LOGGER.info("Forcing to skip VRAD!")
+        metrics.lap('vrad')
+        metrics.success = True
+    finally:
+        compile_metrics.write(
+            metrics,
+            Path(path).stem,
+            history=config.get_bool('General', 'compile_metrics_history'),
+        )
 
     LOGGER.info("BEE2 VRAD hook finished!")
 